@@ -24,6 +24,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # La primera para medir al resto; inactiva salvo con PROFILING_ENABLED
+    'entries.middleware.ServerTimingMiddleware',
+    'entries.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -53,16 +56,57 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'config.wsgi.application'
+ASGI_APPLICATION = 'config.asgi.application'
+
+# Modo de despliegue: 'wsgi' (workers síncronos de gunicorn) o 'asgi'
+# (gunicorn con workers de uvicorn, ver gunicorn.conf.py). Decide también cómo
+# reutilizan conexiones las llamadas async a proveedores (entries/transport.py)
+SERVER_MODE = config('SERVER_MODE', default='wsgi')
 
 # DATABASE
 DATABASES = {
     'default': dj_database_url.config(
         default=config('DATABASE_URL', default=f'sqlite:///{BASE_DIR / "db.sqlite3"}'),
-        conn_max_age=600,
+        # Bajo ASGI cada petición usa su propio hilo para el ORM y las
+        # conexiones persistentes se acumularían: mejor cerrarlas al acabar.
+        conn_max_age=0 if SERVER_MODE == 'asgi' else 600,
         conn_health_checks=True,
     )
 }
 
+# CACHE
+PROVIDER_CACHE_BACKEND = config('PROVIDER_CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Resultados de AniList/TVMaze (entries/provider_cache.py). LocMemCache
+    # expulsa en orden LRU al superar MAX_ENTRIES (un 1/CULL_FREQUENCY cada vez).
+    # Con un backend compartido (p. ej. PROVIDER_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+    # y la URL en PROVIDER_CACHE_LOCATION) los workers se reparten resultados y el bloqueo de
+    # PROVIDER_SINGLE_FLIGHT['CROSS_WORKER'].
+    'providers': {
+        'BACKEND': PROVIDER_CACHE_BACKEND,
+        'LOCATION': config('PROVIDER_CACHE_LOCATION', default='providers'),
+        'TIMEOUT': None,
+        # Opciones de LocMemCache; otros backends (Redis) las pasarían a su cliente
+        'OPTIONS': {
+            'MAX_ENTRIES': config('PROVIDER_CACHE_MAX_ENTRIES', default=2000, cast=int),
+            'CULL_FREQUENCY': 10,
+        } if PROVIDER_CACHE_BACKEND.endswith('.LocMemCache') else {},
+    },
+    # Tarjetas y rejillas renderizadas de la lista (entries/fragments.py). Las
+    # claves llevan la versión de la biblioteca, así que nunca sirven HTML viejo.
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'fragments',
+        'OPTIONS': {
+            'MAX_ENTRIES': config('FRAGMENT_CACHE_MAX_ENTRIES', default=5000, cast=int),
+            'CULL_FREQUENCY': 10,
+        },
+    },
+}
+
 # PASSWORD VALIDATION
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -85,6 +129,10 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 # but some deployments can fail if manifest is missing; use CompressedStaticFilesStorage as a safe default.
 STATICFILES_STORAGE = config('STATICFILES_STORAGE', default='whitenoise.storage.CompressedStaticFilesStorage')
 
+# MEDIA (portadas cacheadas, entries/covers.py)
+MEDIA_URL = 'media/'
+MEDIA_ROOT = config('MEDIA_ROOT', default=str(BASE_DIR / 'media'))
+
 # DEFAULT PRIMARY KEY
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -96,5 +144,115 @@ LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'entry_list'
 LOGOUT_REDIRECT_URL = 'login'
 
+# ENTRIES
+# Leer los totales del dashboard de la tabla desnormalizada LibrarySummary
+# en lugar de agregarlos sobre Entry en cada petición.
+ENTRIES_DENORMALIZED_STATS = config('ENTRIES_DENORMALIZED_STATS', default=True, cast=bool)
+# Segundos que se guardan las tarjetas y rejillas renderizadas de la lista
+ENTRIES_FRAGMENT_CACHE_TIMEOUT = config('ENTRIES_FRAGMENT_CACHE_TIMEOUT', default=24 * 60 * 60, cast=int)
+
+# PROFILING
+# Server-Timing y log JSON por petición (entries/middleware.py) con el tiempo
+# en SQL, proveedores y plantillas, para una fracción de las peticiones.
+PROFILING = {
+    'ENABLED': config('PROFILING_ENABLED', default=False, cast=bool),
+    'SAMPLE_RATE': config('PROFILING_SAMPLE_RATE', default=0.05, cast=float),
+}
+
+# METRICS
+# Métricas Prometheus en /metrics/ (entries/metrics.py), para staff o con
+# 'Authorization: Bearer $METRICS_TOKEN'
+METRICS_ENABLED = config('METRICS_ENABLED', default=True, cast=bool)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'entries.profiling': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+# PROVIDERS
+# Segundos que un resultado de proveedor se considera fresco...
+PROVIDER_CACHE_TTLS = {
+    'anilist': config('ANILIST_CACHE_TTL', default=6 * 60 * 60, cast=int),
+    'tvmaze': config('TVMAZE_CACHE_TTL', default=60 * 60, cast=int),
+}
+# ...y cuánto más se sirve caducado mientras se refresca o si el proveedor falla
+PROVIDER_CACHE_STALE_SECONDS = config('PROVIDER_CACHE_STALE_SECONDS', default=24 * 60 * 60, cast=int)
+# Segundos que una búsqueda guardada en el catálogo local (entries/catalog.py) se
+# responde desde la BD antes de volver a preguntar al proveedor
+MEDIA_CATALOG_TTLS = {
+    'anilist': config('ANILIST_CATALOG_TTL', default=7 * 24 * 60 * 60, cast=int),
+    'tvmaze': config('TVMAZE_CATALOG_TTL', default=24 * 60 * 60, cast=int),
+}
+# Peticiones idénticas simultáneas a un proveedor comparten una sola llamada en cada
+# proceso. Con CROSS_WORKER (solo útil con una caché 'providers' compartida) además
+# un único worker la hace: el resto espera hasta WAIT_SECONDS a que aparezca el
+# resultado en la caché; LOCK_SECONDS acota el bloqueo si el worker muere a medias.
+PROVIDER_SINGLE_FLIGHT = {
+    'CROSS_WORKER': config('PROVIDER_SINGLE_FLIGHT_CROSS_WORKER', default=False, cast=bool),
+    'LOCK_SECONDS': config('PROVIDER_SINGLE_FLIGHT_LOCK_SECONDS', default=30, cast=int),
+    'WAIT_SECONDS': config('PROVIDER_SINGLE_FLIGHT_WAIT_SECONDS', default=10, cast=float),
+    'POLL_INTERVAL': config('PROVIDER_SINGLE_FLIGHT_POLL_INTERVAL', default=0.05, cast=float),
+}
+# Conexiones a AniList/TVMaze (entries/transport.py): pool keep-alive por
+# proceso, timeouts de conexión/lectura y reintentos de llamadas idempotentes
+PROVIDER_HTTP = {
+    'POOL_SIZE': config('PROVIDER_POOL_SIZE', default=10, cast=int),
+    'CONNECT_TIMEOUT': config('PROVIDER_CONNECT_TIMEOUT', default=3.05, cast=float),
+    'READ_TIMEOUT': config('PROVIDER_READ_TIMEOUT', default=10, cast=float),
+    'RETRIES': config('PROVIDER_RETRIES', default=2, cast=int),
+    'BACKOFF': config('PROVIDER_RETRY_BACKOFF', default=0.25, cast=float),
+}
+# Cortacircuitos por proveedor (entries/circuit.py): se abre si en WINDOW_SECONDS hay al
+# menos MIN_CALLS peticiones y fallan en proporción ERROR_RATE; abierto, falla al instante
+# durante OPEN_SECONDS y después deja pasar HALF_OPEN_CALLS de prueba
+PROVIDER_CIRCUIT = {
+    'WINDOW_SECONDS': config('PROVIDER_CIRCUIT_WINDOW_SECONDS', default=60, cast=float),
+    'MIN_CALLS': config('PROVIDER_CIRCUIT_MIN_CALLS', default=5, cast=int),
+    'ERROR_RATE': config('PROVIDER_CIRCUIT_ERROR_RATE', default=0.5, cast=float),
+    'OPEN_SECONDS': config('PROVIDER_CIRCUIT_OPEN_SECONDS', default=30, cast=float),
+    'HALF_OPEN_CALLS': config('PROVIDER_CIRCUIT_HALF_OPEN_CALLS', default=1, cast=int),
+}
+# Segundos que search_anime espera en total a los proveedores, y como mucho a cada uno;
+# lo que no llega a tiempo se omite de la respuesta (skipped_sources)
+PROVIDER_SEARCH_DEADLINE = config('PROVIDER_SEARCH_DEADLINE', default=4.0, cast=float)
+PROVIDER_SEARCH_BUDGETS = {
+    'anilist': config('ANILIST_SEARCH_BUDGET', default=3.5, cast=float),
+    'tvmaze': config('TVMAZE_SEARCH_BUDGET', default=3.0, cast=float),
+}
+# URLs base de los proveedores; se cambian para usar provider_stub_server
+PROVIDER_BASE_URLS = {
+    'anilist': config('ANILIST_BASE_URL', default='https://graphql.anilist.co'),
+    'tvmaze': config('TVMAZE_BASE_URL', default='https://api.tvmaze.com'),
+}
+# Grabación/reproducción de respuestas para benchmarks sin red (entries/provider_fixtures.py):
+# MODE live|record|replay; en replay se añade LATENCY_MS ± JITTER_MS y un 503 con
+# probabilidad ERROR_RATE, con una secuencia reproducible a partir de SEED
+PROVIDER_TRANSPORT = {
+    'MODE': config('PROVIDER_TRANSPORT_MODE', default='live'),
+    'FIXTURES_DIR': config('PROVIDER_FIXTURES_DIR', default=str(BASE_DIR / 'fixtures' / 'providers')),
+    'LATENCY_MS': config('PROVIDER_REPLAY_LATENCY_MS', default=0, cast=float),
+    'JITTER_MS': config('PROVIDER_REPLAY_JITTER_MS', default=0, cast=float),
+    'ERROR_RATE': config('PROVIDER_REPLAY_ERROR_RATE', default=0, cast=float),
+    'SEED': config('PROVIDER_REPLAY_SEED', default=0, cast=int),
+}
+# Portadas descargadas una vez y servidas en WebP desde MEDIA_ROOT (entries/covers.py)
+COVER_CACHE = {
+    'ENABLED': config('COVER_CACHE_ENABLED', default=True, cast=bool),
+    'ALLOWED_HOSTS': config(
+        'COVER_CACHE_ALLOWED_HOSTS', default='s4.anilist.co,static.tvmaze.com', cast=Csv()
+    ),
+    'MAX_BYTES': config('COVER_CACHE_MAX_BYTES', default=8 * 1024 * 1024, cast=int),
+}
 
 TVMAZE_API_KEY = os.environ.get('TVMAZE_API_KEY', 'kevOTunTC78GYY3b01mRZHDprP0sSPyC')
\ No newline at end of file
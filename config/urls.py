@@ -18,9 +18,12 @@ from django.contrib import admin
 from django.urls import path, include
 from django.views.generic import TemplateView
 
+from entries.metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', TemplateView.as_view(template_name='home.html'), name='home'),
     path('accounts/', include('users.urls')),
     path('entries/', include('entries.urls')),
+    path('metrics/', metrics_view, name='metrics'),
 ]
\ No newline at end of file
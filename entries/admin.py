@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Entry, Tag
+from .models import Entry, Media, Tag
 
 
 @admin.register(Entry)
@@ -13,4 +13,10 @@ class EntryAdmin(admin.ModelAdmin):
 class TagAdmin(admin.ModelAdmin):
     list_display = ['name', 'user', 'color', 'created_at']
     list_filter = ['created_at']
-    search_fields = ['name', 'user__username']
\ No newline at end of file
+    search_fields = ['name', 'user__username']
+
+@admin.register(Media)
+class MediaAdmin(admin.ModelAdmin):
+    list_display = ['title', 'source', 'external_id', 'episodes', 'fetched_at']
+    list_filter = ['source']
+    search_fields = ['title', 'title_english', 'external_id']
@@ -1,173 +1,296 @@
+import logging
+
+import httpx
 import requests
 from typing import List, Dict, Optional
 from django.conf import settings
 
+from . import metrics, transport
+from .provider_cache import acached_call, cached_call, normalize_query
+
+logger = logging.getLogger(__name__)
+
+
+def _observe_results(provider, operation, results):
+    metrics.PROVIDER_RESULTS.labels(provider, operation).observe(len(results))
+    return results
+
 
 class AniListAPI:
     """Servicio para interactuar con la API de AniList"""
-    
-    BASE_URL = 'https://graphql.anilist.co'
-    
+
+    @staticmethod
+    def base_url() -> str:
+        # Configurable para apuntar a provider_stub_server en benchmarks
+        return settings.PROVIDER_BASE_URLS['anilist']
+
+    SEARCH_QUERY = '''
+    query ($search: String, $perPage: Int) {
+      Page(page: 1, perPage: $perPage) {
+        media(search: $search, type: ANIME, sort: POPULARITY_DESC) {
+          id
+          title {
+            romaji
+            english
+            native
+          }
+          description
+          coverImage {
+            large
+            medium
+          }
+          bannerImage
+          format
+          status
+          episodes
+          duration
+          genres
+          averageScore
+          popularity
+          season
+          seasonYear
+          studios {
+            nodes {
+              name
+            }
+          }
+          siteUrl
+        }
+      }
+    }
+    '''
+
+    BY_ID_QUERY = '''
+    query ($id: Int) {
+      Media(id: $id, type: ANIME) {
+        id
+        title {
+          romaji
+          english
+          native
+        }
+        description
+        coverImage {
+          large
+        }
+        bannerImage
+        format
+        status
+        episodes
+        duration
+        genres
+        averageScore
+        popularity
+        season
+        seasonYear
+        studios {
+          nodes {
+            name
+          }
+        }
+        siteUrl
+      }
+    }
+    '''
+
+    # Página de medios por id para los refrescos en lote; AniList admite hasta 50 por página
+    BY_IDS_QUERY = '''
+    query ($ids: [Int], $perPage: Int) {
+      Page(page: 1, perPage: $perPage) {
+        media(id_in: $ids, type: ANIME) {
+          id
+          episodes
+          coverImage {
+            large
+          }
+        }
+      }
+    }
+    '''
+    MAX_IDS_PER_QUERY = 50
+
     @staticmethod
     def search_anime(query: str, limit: int = 20) -> List[Dict]:
         """
         Busca animes por título
-        
+
         Args:
             query: Término de búsqueda
             limit: Número máximo de resultados
-            
+
         Returns:
             Lista de animes con su información
         """
-        graphql_query = '''
-        query ($search: String, $perPage: Int) {
-          Page(page: 1, perPage: $perPage) {
-            media(search: $search, type: ANIME, sort: POPULARITY_DESC) {
-              id
-              title {
-                romaji
-                english
-                native
-              }
-              description
-              coverImage {
-                large
-                medium
-              }
-              bannerImage
-              format
-              status
-              episodes
-              duration
-              genres
-              averageScore
-              popularity
-              season
-              seasonYear
-              studios {
-                nodes {
-                  name
-                }
-              }
-              siteUrl
-            }
-          }
+        try:
+            return cached_call(
+                'anilist', 'search', (normalize_query(query), limit),
+                lambda: AniListAPI._fetch_search(normalize_query(query), limit)
+            )
+        except requests.exceptions.RequestException as e:
+            logger.warning('Error al buscar en AniList: %s', e)
+            return []
+
+    @staticmethod
+    async def asearch_anime(query: str, limit: int = 20) -> List[Dict]:
+        """Versión asíncrona de search_anime"""
+        try:
+            return await acached_call(
+                'anilist', 'search', (normalize_query(query), limit),
+                lambda: AniListAPI._afetch_search(normalize_query(query), limit)
+            )
+        except (httpx.HTTPError, ValueError) as e:
+            logger.warning('Error al buscar en AniList: %s', e)
+            return []
+
+    @staticmethod
+    def _fetch_search(query: str, limit: int) -> List[Dict]:
+        variables = {
+            'search': query,
+            'perPage': limit
         }
-        '''
-        
+        # Las consultas GraphQL (no mutaciones) son idempotentes
+        response = transport.request(
+            'anilist', 'POST', AniListAPI.base_url(), idempotent=True,
+            json={'query': AniListAPI.SEARCH_QUERY, 'variables': variables},
+        )
+        return _observe_results('anilist', 'search', AniListAPI._parse_search(response.json()))
+
+    @staticmethod
+    async def _afetch_search(query: str, limit: int) -> List[Dict]:
         variables = {
             'search': query,
             'perPage': limit
         }
-        
+        response = await transport.arequest(
+            'anilist', 'POST', AniListAPI.base_url(), idempotent=True,
+            json={'query': AniListAPI.SEARCH_QUERY, 'variables': variables},
+        )
+        return _observe_results('anilist', 'search', AniListAPI._parse_search(response.json()))
+
+    @staticmethod
+    def get_anime_by_id(anime_id: str) -> Optional[Dict]:
+        """Obtiene información detallada de un anime por ID"""
+        anime_id = int(anime_id)
+
         try:
-            response = requests.post(
-                AniListAPI.BASE_URL,
-                json={'query': graphql_query, 'variables': variables},
-                timeout=10
+            return cached_call(
+                'anilist', 'media', (anime_id,),
+                lambda: AniListAPI._fetch_by_id(anime_id)
             )
-            response.raise_for_status()
-            data = response.json()
-            
-            results = []
-            for media in data.get('data', {}).get('Page', {}).get('media', []):
-                results.append({
-                    'external_id': str(media['id']),
-                    'title': media['title']['romaji'] or media['title']['english'] or media['title']['native'],
-                    'title_english': media['title'].get('english', ''),
-                    'title_native': media['title'].get('native', ''),
-                    'description': AniListAPI._clean_description(media.get('description', '')),
-                    'cover_image': media['coverImage'].get('large', ''),
-                    'banner_image': media.get('bannerImage', ''),
-                    'format': media.get('format', ''),
-                    'status': media.get('status', ''),
-                    'episodes': media.get('episodes', 0),
-                    'duration': media.get('duration', 0),
-                    'genres': media.get('genres', []),
-                    'score': media.get('averageScore', 0),
-                    'popularity': media.get('popularity', 0),
-                    'season': media.get('season', ''),
-                    'year': media.get('seasonYear', 0),
-                    'studios': [studio['name'] for studio in media.get('studios', {}).get('nodes', [])],
-                    'url': media.get('siteUrl', ''),
-                    'source': 'anilist'
-                })
-            
-            return results
-            
         except requests.exceptions.RequestException as e:
-            print(f"Error al buscar en AniList: {e}")
-            return []
-    
+            logger.warning('Error al obtener anime de AniList: %s', e)
+            return None
+
     @staticmethod
-    def get_anime_by_id(anime_id: str) -> Optional[Dict]:
-        """Obtiene información detallada de un anime por ID"""
-        graphql_query = '''
-        query ($id: Int) {
-          Media(id: $id, type: ANIME) {
-            id
-            title {
-              romaji
-              english
-              native
-            }
-            description
-            coverImage {
-              large
-            }
-            bannerImage
-            format
-            status
-            episodes
-            duration
-            genres
-            averageScore
-            popularity
-            season
-            seasonYear
-            studios {
-              nodes {
-                name
-              }
-            }
-            siteUrl
-          }
-        }
-        '''
-        
-        variables = {'id': int(anime_id)}
-        
+    async def aget_anime_by_id(anime_id: str) -> Optional[Dict]:
+        """Versión asíncrona de get_anime_by_id"""
+        anime_id = int(anime_id)
+
         try:
-            response = requests.post(
-                AniListAPI.BASE_URL,
-                json={'query': graphql_query, 'variables': variables},
-                timeout=10
+            return await acached_call(
+                'anilist', 'media', (anime_id,),
+                lambda: AniListAPI._afetch_by_id(anime_id)
             )
-            response.raise_for_status()
-            data = response.json()
-            media = data.get('data', {}).get('Media', {})
-            
-            if not media:
-                return None
-            
-            return {
+        except (httpx.HTTPError, ValueError) as e:
+            logger.warning('Error al obtener anime de AniList: %s', e)
+            return None
+
+    @staticmethod
+    def _fetch_by_id(anime_id: int) -> Optional[Dict]:
+        response = transport.request(
+            'anilist', 'POST', AniListAPI.base_url(), idempotent=True,
+            json={'query': AniListAPI.BY_ID_QUERY, 'variables': {'id': anime_id}},
+        )
+        return AniListAPI._parse_detail(response.json())
+
+    @staticmethod
+    async def _afetch_by_id(anime_id: int) -> Optional[Dict]:
+        response = await transport.arequest(
+            'anilist', 'POST', AniListAPI.base_url(), idempotent=True,
+            json={'query': AniListAPI.BY_ID_QUERY, 'variables': {'id': anime_id}},
+        )
+        return AniListAPI._parse_detail(response.json())
+
+    @staticmethod
+    def fetch_media_batch(anime_ids: List[int]) -> Dict[str, Dict]:
+        """
+        Datos actualizables (episodios y portada) de hasta 50 animes en una petición.
+
+        No pasa por la caché: se usa para refrescar lo guardado.
+
+        Returns:
+            Dict external_id -> {'episodes', 'cover_image'}; los ids que
+            AniList no devuelve no aparecen
+
+        Raises:
+            requests.exceptions.RequestException si falla la petición
+        """
+        if len(anime_ids) > AniListAPI.MAX_IDS_PER_QUERY:
+            raise ValueError(f'Como mucho {AniListAPI.MAX_IDS_PER_QUERY} ids por consulta')
+        response = transport.request(
+            'anilist', 'POST', AniListAPI.base_url(), idempotent=True,
+            json={
+                'query': AniListAPI.BY_IDS_QUERY,
+                'variables': {'ids': list(anime_ids), 'perPage': AniListAPI.MAX_IDS_PER_QUERY},
+            },
+        )
+        results = {}
+        for media in (response.json().get('data') or {}).get('Page', {}).get('media', []):
+            results[str(media['id'])] = {
+                'episodes': media.get('episodes'),
+                'cover_image': (media.get('coverImage') or {}).get('large') or '',
+            }
+        return _observe_results('anilist', 'media_batch', results)
+
+    @staticmethod
+    def _parse_search(data: Dict) -> List[Dict]:
+        """Convierte la respuesta de búsqueda al formato común de resultados"""
+        results = []
+        for media in data.get('data', {}).get('Page', {}).get('media', []):
+            results.append({
                 'external_id': str(media['id']),
-                'title': media['title']['romaji'] or media['title']['english'],
+                'title': media['title']['romaji'] or media['title']['english'] or media['title']['native'],
                 'title_english': media['title'].get('english', ''),
+                'title_native': media['title'].get('native', ''),
                 'description': AniListAPI._clean_description(media.get('description', '')),
                 'cover_image': media['coverImage'].get('large', ''),
+                'banner_image': media.get('bannerImage', ''),
+                'format': media.get('format', ''),
+                'status': media.get('status', ''),
                 'episodes': media.get('episodes', 0),
+                'duration': media.get('duration', 0),
                 'genres': media.get('genres', []),
                 'score': media.get('averageScore', 0),
+                'popularity': media.get('popularity', 0),
+                'season': media.get('season', ''),
+                'year': media.get('seasonYear', 0),
+                'studios': [studio['name'] for studio in media.get('studios', {}).get('nodes', [])],
                 'url': media.get('siteUrl', ''),
                 'source': 'anilist'
-            }
-            
-        except requests.exceptions.RequestException as e:
-            print(f"Error al obtener anime de AniList: {e}")
+            })
+        return results
+
+    @staticmethod
+    def _parse_detail(data: Dict) -> Optional[Dict]:
+        """Convierte la respuesta de Media(id) al formato común"""
+        media = data.get('data', {}).get('Media', {})
+
+        if not media:
             return None
-    
+
+        return {
+            'external_id': str(media['id']),
+            'title': media['title']['romaji'] or media['title']['english'],
+            'title_english': media['title'].get('english', ''),
+            'description': AniListAPI._clean_description(media.get('description', '')),
+            'cover_image': media['coverImage'].get('large', ''),
+            'episodes': media.get('episodes', 0),
+            'genres': media.get('genres', []),
+            'score': media.get('averageScore', 0),
+            'url': media.get('siteUrl', ''),
+            'source': 'anilist'
+        }
+
     @staticmethod
     def _clean_description(description: str) -> str:
         """Limpia las etiquetas HTML de la descripción"""
@@ -182,50 +305,88 @@ class AniListAPI:
 
 class TVMazeAPI:
     """Servicio para interactuar con TVMaze"""
-    BASE_URL = 'https://api.tvmaze.com'
+
+    @staticmethod
+    def base_url() -> str:
+        return settings.PROVIDER_BASE_URLS['tvmaze'].rstrip('/')
 
     @staticmethod
     def _get_key() -> Optional[str]:
         return getattr(settings, 'TVMAZE_API_KEY', None)
 
     @staticmethod
-    def search_shows(query: str, limit: int = 20) -> List[Dict]:
-        """Busca shows en TVMaze usando /search/shows"""
-        params = {'q': query}
+    def _headers() -> Dict:
         headers = {}
         key = TVMazeAPI._get_key()
         # TVMaze no requiere API key por defecto, pero si se proporciona la incluimos en headers
         if key:
             headers['Authorization'] = f'Bearer {key}'
+        return headers
 
+    @staticmethod
+    def search_shows(query: str, limit: int = 20) -> List[Dict]:
+        """Busca shows en TVMaze usando /search/shows"""
         try:
-            resp = requests.get(f"{TVMazeAPI.BASE_URL}/search/shows", params=params, headers=headers, timeout=10)
-            resp.raise_for_status()
-            data = resp.json()
-            results = []
-            for item in data[:limit]:
-                show = item.get('show', {})
-                image = show.get('image') or {}
-                cover = image.get('original') or image.get('medium') or ''
-                premiered = show.get('premiered') or ''
-                year = premiered.split('-')[0] if premiered else ''
-
-                results.append({
-                    'external_id': str(show.get('id', '')),
-                    'title': show.get('name', ''),
-          'description': (show.get('summary') or '')[:500],
-          'cover_image': cover,
-          'duration': show.get('runtime'),
-          'episodes': show.get('_links', {}).get('episodes', None),
-                    'media_type': 'show',
-                    'year': year,
-                    'score': show.get('rating', {}).get('average', 0),
-                    'popularity': show.get('weight', 0),
-                    'url': show.get('url', ''),
-                    'source': 'tvmaze'
-                })
-
-            return results
+            return cached_call(
+                'tvmaze', 'search', (normalize_query(query), limit),
+                lambda: TVMazeAPI._fetch_search(normalize_query(query), limit)
+            )
         except requests.exceptions.RequestException as e:
-            print(f"Error al buscar en TVMaze: {e}")
-            return []
\ No newline at end of file
+            logger.warning('Error al buscar en TVMaze: %s', e)
+            return []
+
+    @staticmethod
+    async def asearch_shows(query: str, limit: int = 20) -> List[Dict]:
+        """Versión asíncrona de search_shows"""
+        try:
+            return await acached_call(
+                'tvmaze', 'search', (normalize_query(query), limit),
+                lambda: TVMazeAPI._afetch_search(normalize_query(query), limit)
+            )
+        except (httpx.HTTPError, ValueError) as e:
+            logger.warning('Error al buscar en TVMaze: %s', e)
+            return []
+
+    @staticmethod
+    def _fetch_search(query: str, limit: int) -> List[Dict]:
+        resp = transport.request(
+            'tvmaze', 'GET', f"{TVMazeAPI.base_url()}/search/shows", idempotent=True,
+            params={'q': query}, headers=TVMazeAPI._headers(),
+        )
+        return _observe_results('tvmaze', 'search', TVMazeAPI._parse_search(resp.json(), limit))
+
+    @staticmethod
+    async def _afetch_search(query: str, limit: int) -> List[Dict]:
+        resp = await transport.arequest(
+            'tvmaze', 'GET', f"{TVMazeAPI.base_url()}/search/shows", idempotent=True,
+            params={'q': query}, headers=TVMazeAPI._headers(),
+        )
+        return _observe_results('tvmaze', 'search', TVMazeAPI._parse_search(resp.json(), limit))
+
+    @staticmethod
+    def _parse_search(data: List[Dict], limit: int) -> List[Dict]:
+        """Convierte la respuesta de /search/shows al formato común de resultados"""
+        results = []
+        for item in data[:limit]:
+            show = item.get('show', {})
+            image = show.get('image') or {}
+            cover = image.get('original') or image.get('medium') or ''
+            premiered = show.get('premiered') or ''
+            year = premiered.split('-')[0] if premiered else ''
+
+            results.append({
+                'external_id': str(show.get('id', '')),
+                'title': show.get('name', ''),
+                'description': (show.get('summary') or '')[:500],
+                'cover_image': cover,
+                'duration': show.get('runtime'),
+                'episodes': show.get('_links', {}).get('episodes', None),
+                'media_type': 'show',
+                'year': year,
+                'score': show.get('rating', {}).get('average', 0),
+                'popularity': show.get('weight', 0),
+                'url': show.get('url', ''),
+                'source': 'tvmaze'
+            })
+
+        return results
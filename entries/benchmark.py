@@ -0,0 +1,253 @@
+"""
+Benchmark de extremo a extremo de las vistas principales.
+
+Cada escenario lanza peticiones contra la lista (con filtros y búsqueda),
+el detalle JSON, la edición JSON, la importación y la búsqueda en los
+proveedores, bien con el cliente de
+test de Django dentro del proceso (cuenta también las consultas SQL por
+petición) o contra un servidor local por HTTP. El resultado es un dict
+serializable a JSON con p50/p95/p99, media, throughput y errores por
+escenario, para comparar ejecuciones.
+
+Los escenarios que llaman a AniList/TVMaze solo son reproducibles con
+PROVIDER_TRANSPORT_MODE=replay (o contra provider_stub_server); por
+defecto no se ejecutan en modo ``live``.
+"""
+import json
+import math
+import random
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .models import Entry
+from .seeding import SEED_PASSWORD
+
+SEARCH_TERMS = ('sombra', 'dragon', 'tokyo', 'fuego', 'reino', 'noche')
+
+
+@dataclass
+class Call:
+    method: str
+    path: str
+    payload: Optional[dict] = None
+
+
+@dataclass
+class Scenario:
+    name: str
+    # (rng, user, entry_ids del usuario, índice de la petición) -> Call
+    build: Callable
+    # Llama a los proveedores externos
+    providers: bool = False
+
+
+def _list(rng, user, entry_ids, n):
+    return Call('get', '/entries/')
+
+
+def _list_filtered(rng, user, entry_ids, n):
+    status = rng.choice([value for value, _ in Entry.STATUS_CHOICES])
+    category = rng.choice(('anime', 'serie', 'pelicula'))
+    return Call('get', f'/entries/?status={status}&category={category}')
+
+
+def _list_search(rng, user, entry_ids, n):
+    return Call('get', f'/entries/?search={rng.choice(SEARCH_TERMS)}')
+
+
+def _detail_json(rng, user, entry_ids, n):
+    return Call('get', f'/entries/{rng.choice(entry_ids)}/detail-json/')
+
+
+def _update_json(rng, user, entry_ids, n):
+    return Call('post', f'/entries/{rng.choice(entry_ids)}/update-json/', {
+        'progress_current': rng.randint(0, 24),
+        'status': rng.choice([value for value, _ in Entry.STATUS_CHOICES]),
+    })
+
+
+def _import(rng, user, entry_ids, n):
+    # Ids que no existen: cada petición crea una entrada
+    external_id = f'{9000000 + user.pk * 100000 + n}'
+    return Call('post', '/entries/api/import-anime/', {'anime': {
+        'external_id': external_id,
+        'title': f'Benchmark {external_id}',
+        'episodes': rng.choice((12, 24)),
+        'source': 'anilist',
+    }})
+
+
+def _search(rng, user, entry_ids, n):
+    return Call('get', f'/entries/api/search-anime/?q={rng.choice(SEARCH_TERMS)}')
+
+
+SCENARIOS = {
+    scenario.name: scenario for scenario in (
+        Scenario('entry_list', _list),
+        Scenario('entry_list_filtered', _list_filtered),
+        Scenario('entry_list_search', _list_search),
+        Scenario('entry_detail_json', _detail_json),
+        Scenario('entry_update_json', _update_json),
+        Scenario('import_anime', _import),
+        Scenario('search_anime', _search, providers=True),
+    )
+}
+
+
+def default_scenarios(provider_mode: str) -> List[str]:
+    return [name for name, scenario in SCENARIOS.items() if provider_mode == 'replay' or not scenario.providers]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Percentil por rango más cercano"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(latencies_ms: List[float], queries: List[int], errors: int, elapsed: float) -> Dict:
+    count = len(latencies_ms)
+    return {
+        'requests': count,
+        'errors': errors,
+        'p50_ms': round(percentile(latencies_ms, 50), 3),
+        'p95_ms': round(percentile(latencies_ms, 95), 3),
+        'p99_ms': round(percentile(latencies_ms, 99), 3),
+        'mean_ms': round(sum(latencies_ms) / count, 3) if count else 0.0,
+        'max_ms': round(max(latencies_ms), 3) if count else 0.0,
+        'throughput_rps': round(count / elapsed, 2) if elapsed else 0.0,
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+    }
+
+
+class TestClientDriver:
+    """Peticiones dentro del proceso con el cliente de test; cuenta consultas"""
+
+    counts_queries = True
+
+    def __init__(self):
+        from django.test import Client
+        self._client_class = Client
+        self._clients = {}
+
+    def _client(self, user):
+        if user.pk not in self._clients:
+            client = self._client_class()
+            client.force_login(user)
+            self._clients[user.pk] = client
+        return self._clients[user.pk]
+
+    def send(self, user, call: Call):
+        client = self._client(user)
+        with CaptureQueriesContext(connection) as context:
+            if call.method == 'post':
+                response = client.post(call.path, json.dumps(call.payload), content_type='application/json')
+            else:
+                response = client.get(call.path)
+        return response.status_code, len(context.captured_queries)
+
+
+class HTTPDriver:
+    """Peticiones a un servidor en marcha (``runserver``, gunicorn...) con login real"""
+
+    counts_queries = False
+
+    def __init__(self, base_url: str):
+        import requests
+        self._requests = requests
+        self.base_url = base_url.rstrip('/')
+        self._sessions = {}
+
+    def _session(self, user):
+        if user.pk not in self._sessions:
+            session = self._requests.Session()
+            login_url = f'{self.base_url}/accounts/login/'
+            session.get(login_url, timeout=10)
+            response = session.post(login_url, timeout=10, allow_redirects=False, data={
+                'username': user.username,
+                'password': SEED_PASSWORD,
+                'csrfmiddlewaretoken': session.cookies.get('csrftoken', ''),
+            }, headers={'Referer': login_url})
+            if response.status_code != 302:
+                raise RuntimeError(f'No se pudo iniciar sesión como {user.username} ({response.status_code})')
+            self._sessions[user.pk] = session
+        return self._sessions[user.pk]
+
+    def send(self, user, call: Call):
+        session = self._session(user)
+        url = f'{self.base_url}{call.path}'
+        if call.method == 'post':
+            response = session.post(url, json=call.payload, timeout=30, headers={
+                'X-CSRFToken': session.cookies.get('csrftoken', ''), 'Referer': url,
+            })
+        else:
+            response = session.get(url, timeout=30)
+        return response.status_code, None
+
+
+def run_benchmark(driver, users, scenarios, requests_per_scenario=200, warmup=10, seed=0, on_request=None):
+    """
+    Ejecuta los escenarios uno tras otro y devuelve el informe.
+
+    Args:
+        driver: TestClientDriver o HTTPDriver
+        users: Usuarios entre los que se reparten las peticiones
+        scenarios: Nombres de SCENARIOS a ejecutar
+        on_request: Callable opcional llamado antes de cada petición (p. ej. vaciar cachés)
+    """
+    rng = random.Random(seed)
+    entry_ids = {
+        user.pk: list(Entry.objects.filter(user=user).values_list('pk', flat=True))
+        for user in users
+    }
+    users = [user for user in users if entry_ids[user.pk]]
+    if not users:
+        raise ValueError('Ningún usuario tiene entradas: sembrar antes con seed_library')
+
+    report = {
+        'driver': type(driver).__name__,
+        'users': len(users),
+        'requests_per_scenario': requests_per_scenario,
+        'warmup': warmup,
+        'seed': seed,
+        'scenarios': {},
+    }
+    all_latencies, all_queries, all_errors, all_elapsed = [], [], 0, 0.0
+    counter = 0
+    for name in scenarios:
+        scenario = SCENARIOS[name]
+        latencies, queries, errors = [], [], 0
+        started = None
+        for index in range(warmup + requests_per_scenario):
+            if index == warmup:
+                started = time.perf_counter()
+            user = rng.choice(users)
+            counter += 1
+            call = scenario.build(rng, user, entry_ids[user.pk], counter)
+            if on_request:
+                on_request()
+            t0 = time.perf_counter()
+            status, query_count = driver.send(user, call)
+            elapsed_ms = (time.perf_counter() - t0) * 1000
+            if index < warmup:
+                continue
+            latencies.append(elapsed_ms)
+            if query_count is not None:
+                queries.append(query_count)
+            if status >= 400:
+                errors += 1
+        elapsed = time.perf_counter() - started if started is not None else 0.0
+        report['scenarios'][name] = summarize(latencies, queries, errors, elapsed)
+        all_latencies += latencies
+        all_queries += queries
+        all_errors += errors
+        all_elapsed += elapsed
+
+    report['total'] = summarize(all_latencies, all_queries, all_errors, all_elapsed)
+    return report
@@ -0,0 +1,168 @@
+"""
+Acciones sobre varias entradas del usuario en una sola petición.
+
+Cada acción es una transacción con un número fijo de consultas, sea cual
+sea el número de entradas: una lectura de las filas afectadas (bloqueadas
+con SELECT ... FOR UPDATE en Postgres), un único UPDATE o DELETE y el
+mantenimiento de LibrarySummary (una lectura y un único UPDATE) y
+de la versión de la biblioteca. El índice de texto completo lo mantienen
+los triggers / la columna generada de la propia BD.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List
+
+from django.db import transaction
+from django.utils import timezone
+
+from .fragments import bump_library_version
+from .models import Entry
+from .stats import add_entry_delta, apply_summary_deltas, summary_deltas
+
+BULK_ACTION_MAX_IDS = 500
+
+_STATUSES = {value for value, _ in Entry.STATUS_CHOICES}
+_CATEGORIES = {value for value, _ in Entry.CATEGORY_CHOICES}
+
+_signals_suspended = ContextVar('entries_bulk_signals_suspended', default=False)
+
+
+class InvalidBulkAction(ValueError):
+    """Ids o cambios no válidos"""
+
+
+@contextmanager
+def summary_signals_suspended():
+    """
+    Desactiva en este contexto las señales por instancia de entries.signals.
+
+    El borrado en bloque pasa por el Collector de Django, que envía un
+    post_delete por entrada; quien lo usa aplica el resumen y la versión
+    una sola vez al final.
+    """
+    token = _signals_suspended.set(True)
+    try:
+        yield
+    finally:
+        _signals_suspended.reset(token)
+
+
+def signals_suspended() -> bool:
+    return _signals_suspended.get()
+
+
+def clean_ids(ids) -> List[int]:
+    if not isinstance(ids, list) or not ids:
+        raise InvalidBulkAction('Se necesita una lista de ids')
+    if len(ids) > BULK_ACTION_MAX_IDS:
+        raise InvalidBulkAction(f'Máximo {BULK_ACTION_MAX_IDS} entradas por petición')
+    try:
+        return sorted({int(pk) for pk in ids})
+    except (TypeError, ValueError):
+        raise InvalidBulkAction('Ids inválidos')
+
+
+def _int_or_none(value, field, minimum, maximum=None):
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        raise InvalidBulkAction(f'{field} inválido')
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise InvalidBulkAction(f'{field} inválido')
+    if value < minimum or (maximum is not None and value > maximum):
+        raise InvalidBulkAction(f'{field} fuera de rango')
+    return value
+
+
+def clean_patch(patch) -> Dict:
+    """Cambios permitidos en bloque, validados: status, category, rating, progress_current"""
+    if not isinstance(patch, dict) or not patch:
+        raise InvalidBulkAction('No hay cambios')
+    clean = {}
+    for field, value in patch.items():
+        if field == 'status':
+            if value not in _STATUSES:
+                raise InvalidBulkAction('Estado inválido')
+            clean[field] = value
+        elif field == 'category':
+            if value not in _CATEGORIES:
+                raise InvalidBulkAction('Categoría inválida')
+            clean[field] = value
+        elif field == 'rating':
+            clean[field] = _int_or_none(value, 'rating', 1, 10)
+        elif field == 'progress_current':
+            if value is None:
+                raise InvalidBulkAction('progress_current inválido')
+            clean[field] = _int_or_none(value, 'progress_current', 0)
+        else:
+            raise InvalidBulkAction(f'El campo {field} no se puede editar en bloque')
+    return clean
+
+
+def _locked_rows(user, ids):
+    """Filas (id, user_id y campos del resumen) del usuario entre ``ids``, bloqueadas hasta el commit"""
+    return list(
+        Entry.objects.select_for_update()
+        .filter(user=user, pk__in=ids)
+        .order_by('pk')
+        .values('id', 'user_id', *Entry.SUMMARY_FIELDS)
+    )
+
+
+def _result(ids, rows, count_key):
+    found = {row['id'] for row in rows}
+    return {count_key: len(found), 'missing': [pk for pk in ids if pk not in found]}
+
+
+def bulk_update_entries(user, ids, patch) -> Dict:
+    """
+    Aplica ``patch`` a las entradas ``ids`` del usuario con un único UPDATE.
+
+    Returns:
+        ``{'updated': n, 'missing': [ids que no existen o no son suyos]}``
+
+    Raises:
+        InvalidBulkAction
+    """
+    ids = clean_ids(ids)
+    patch = clean_patch(patch)
+    with transaction.atomic():
+        rows = _locked_rows(user, ids)
+        if rows:
+            # update() no pasa por auto_now; updated_at invalida las tarjetas cacheadas
+            Entry.objects.filter(pk__in=[row['id'] for row in rows]).update(**patch, updated_at=timezone.now())
+            if patch.keys() & set(Entry.SUMMARY_FIELDS):
+                deltas = summary_deltas()
+                for row in rows:
+                    add_entry_delta(deltas, row['user_id'], row, sign=-1)
+                    add_entry_delta(deltas, row['user_id'], {**row, **patch})
+                apply_summary_deltas(deltas)
+            bump_library_version([user.pk])
+    return _result(ids, rows, 'updated')
+
+
+def bulk_delete_entries(user, ids) -> Dict:
+    """
+    Elimina las entradas ``ids`` del usuario (y sus filas de etiquetas) en una transacción.
+
+    Returns:
+        ``{'deleted': n, 'missing': [...]}``
+
+    Raises:
+        InvalidBulkAction
+    """
+    ids = clean_ids(ids)
+    with transaction.atomic():
+        rows = _locked_rows(user, ids)
+        if rows:
+            with summary_signals_suspended():
+                Entry.objects.filter(pk__in=[row['id'] for row in rows]).delete()
+            deltas = summary_deltas()
+            for row in rows:
+                add_entry_delta(deltas, row['user_id'], row, sign=-1)
+            apply_summary_deltas(deltas)
+            bump_library_version([user.pk])
+    return _result(ids, rows, 'deleted')
+
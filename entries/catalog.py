@@ -0,0 +1,216 @@
+"""
+Catálogo local de títulos de AniList/TVMaze compartido por todos los usuarios.
+
+Cada respuesta de búsqueda de un proveedor se guarda en ``Media`` (una fila
+por ``(source, external_id)``, que se actualiza con cada respuesta nueva) y
+en ``MediaQuery`` (los ids en el orden en que llegaron). Mientras la
+búsqueda guardada siga fresca (``MEDIA_CATALOG_TTLS``) se responde solo
+desde la BD; al caducar se vuelve a preguntar al proveedor y, si falla o no
+devuelve nada, se sirve lo guardado.
+
+Las entradas importadas se enlazan con su ficha por ``Entry.media``.
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, Iterable, List
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+# importers también importa este módulo: se usa como módulo, no sus nombres
+from . import importers, metrics
+from .models import Entry, Media, MediaQuery
+from .provider_cache import normalize_query
+
+MEDIA_UPDATE_FIELDS = (
+    'title', 'title_english', 'title_native', 'description', 'cover_image', 'banner_image', 'format',
+    'airing_status', 'episodes', 'duration', 'genres', 'studios', 'score', 'popularity', 'season',
+    'year', 'url', 'fetched_at',
+)
+_MAX_QUERY_LENGTH = MediaQuery._meta.get_field('query').max_length
+
+
+def _ttl(source: str) -> int:
+    return settings.MEDIA_CATALOG_TTLS.get(source, settings.MEDIA_CATALOG_TTLS.get('default', 24 * 60 * 60))
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def media_from_result(result: Dict, fetched_at) -> Media:
+    """Media (sin guardar) de un resultado en el formato común de api_services"""
+    return Media(
+        source=result['source'][:50],
+        external_id=str(result['external_id'])[:100],
+        title=(result.get('title') or '')[:255],
+        title_english=(result.get('title_english') or '')[:255],
+        title_native=(result.get('title_native') or '')[:255],
+        description=result.get('description') or '',
+        cover_image=(result.get('cover_image') or '')[:500],
+        banner_image=(result.get('banner_image') or '')[:500],
+        format=(result.get('format') or '')[:30],
+        airing_status=(result.get('status') or '')[:30],
+        episodes=importers._positive_int(result.get('episodes')),
+        duration=importers._positive_int(result.get('duration')),
+        genres=list(result.get('genres') or []),
+        studios=list(result.get('studios') or []),
+        score=_number(result.get('score')),
+        popularity=_number(result.get('popularity')),
+        season=(result.get('season') or '')[:20],
+        year=importers._positive_int(result.get('year')),
+        url=(result.get('url') or '')[:500],
+        fetched_at=fetched_at,
+    )
+
+
+def result_from_media(media: Media) -> Dict:
+    """La ficha en el mismo formato que devuelven AniListAPI/TVMazeAPI"""
+    result = {
+        'external_id': media.external_id,
+        'title': media.title,
+        'title_english': media.title_english,
+        'title_native': media.title_native,
+        'description': media.description,
+        'cover_image': media.cover_image,
+        'banner_image': media.banner_image,
+        'format': media.format,
+        'status': media.airing_status,
+        'episodes': media.episodes,
+        'duration': media.duration,
+        'genres': media.genres,
+        'score': media.score,
+        'popularity': media.popularity,
+        'season': media.season,
+        'year': media.year,
+        'studios': media.studios,
+        'url': media.url,
+        'source': media.source,
+    }
+    if media.source == 'tvmaze':
+        result['media_type'] = 'show'
+    return result
+
+
+def _load(queries: Iterable[MediaQuery]) -> Dict[str, List[Dict]]:
+    """Resultados de varias búsquedas guardadas, en su orden, con una consulta"""
+    queries = list(queries)
+    condition = Q()
+    for saved in queries:
+        condition |= Q(source=saved.source, external_id__in=saved.external_ids)
+    media = {}
+    if condition:
+        media = {(row.source, row.external_id): row for row in Media.objects.filter(condition)}
+    return {
+        saved.source: [
+            result_from_media(media[(saved.source, external_id)])
+            for external_id in saved.external_ids
+            if (saved.source, external_id) in media
+        ]
+        for saved in queries
+    }
+
+
+def _store(fetched: Dict[str, List[Dict]], query: str, limit: int, fetched_at):
+    """Guarda (o actualiza) las fichas y el orden de cada búsqueda: dos consultas en total"""
+    media = {}
+    searches = []
+    for source, results in fetched.items():
+        external_ids = []
+        for result in results:
+            if not result.get('external_id') or not result.get('title'):
+                continue
+            row = media_from_result({**result, 'source': source}, fetched_at)
+            media[(row.source, row.external_id)] = row
+            external_ids.append(row.external_id)
+        searches.append(MediaQuery(
+            source=source, query=query, limit=limit, external_ids=external_ids, fetched_at=fetched_at,
+        ))
+    with transaction.atomic():
+        Media.objects.bulk_create(
+            list(media.values()), update_conflicts=True,
+            unique_fields=['source', 'external_id'], update_fields=MEDIA_UPDATE_FIELDS,
+        )
+        MediaQuery.objects.bulk_create(
+            searches, update_conflicts=True,
+            unique_fields=['source', 'query', 'limit'], update_fields=['external_ids', 'fetched_at'],
+        )
+
+
+async def asearch(query: str, limit: int, fetchers: Dict[str, Callable[[], Awaitable[List[Dict]]]]) -> Dict[str, List[Dict]]:
+    """
+    Resultados de búsqueda de cada proveedor, desde el catálogo si es posible.
+
+    Args:
+        query: Texto buscado (se normaliza igual que en provider_cache)
+        limit: Máximo de resultados por proveedor
+        fetchers: source -> corrutina sin argumentos que consulta al proveedor;
+            devuelve [] si falla, como AniListAPI.asearch_anime
+
+    Returns:
+        source -> lista de resultados en el formato común
+    """
+    query = normalize_query(query)
+    if len(query) > _MAX_QUERY_LENGTH:
+        results = await asyncio.gather(*(fetch() for fetch in fetchers.values()))
+        return dict(zip(fetchers, results))
+
+    now = timezone.now()
+    saved = {
+        search.source: search
+        async for search in MediaQuery.objects.filter(source__in=list(fetchers), query=query, limit=limit)
+    }
+    fresh = [
+        source for source, search in saved.items()
+        if (now - search.fetched_at).total_seconds() < _ttl(source)
+    ]
+    missing = [source for source in fetchers if source not in fresh]
+    for source in fetchers:
+        metrics.record_cache(
+            f'catalog:{source}',
+            hits=int(source in fresh), stale=int(source in saved and source not in fresh),
+            misses=int(source not in saved),
+        )
+
+    fetched = dict(zip(missing, await asyncio.gather(*(fetchers[source]() for source in missing))))
+    found = {source: results for source, results in fetched.items() if results}
+    # Proveedor caído o sin resultados: lo guardado, aunque esté caducado, es mejor que nada
+    from_catalog = [saved[source] for source in fetchers if source not in found and source in saved]
+
+    results = await sync_to_async(_load)(from_catalog) if from_catalog else {}
+    if found:
+        await sync_to_async(_store)(found, query, limit, now)
+    results.update(found)
+    return {source: results.get(source, []) for source in fetchers}
+
+
+def link_media(entries: List[Entry]):
+    """Rellena ``media`` de las entradas (sin guardar) cuya ficha esté en el catálogo, con una consulta"""
+    by_source = {}
+    for entry in entries:
+        if entry.external_id:
+            by_source.setdefault(entry.external_source, set()).add(entry.external_id)
+    if not by_source:
+        return
+    condition = Q()
+    for source, external_ids in by_source.items():
+        condition |= Q(source=source, external_id__in=external_ids)
+    ids = {
+        (source, external_id): pk
+        for pk, source, external_id in Media.objects.filter(condition).values_list('id', 'source', 'external_id')
+    }
+    for entry in entries:
+        entry.media_id = ids.get((entry.external_source, entry.external_id))
+
+
+async def alink_media(entry: Entry):
+    """Versión asíncrona de ``link_media`` para una sola entrada"""
+    if entry.external_id:
+        entry.media_id = await Media.objects.filter(
+            source=entry.external_source, external_id=entry.external_id,
+        ).values_list('id', flat=True).afirst()
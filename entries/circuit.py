@@ -0,0 +1,131 @@
+"""
+Cortacircuitos por proveedor externo.
+
+Cada proceso lleva, por proveedor, una ventana deslizante con el resultado
+de las últimas peticiones (``WINDOW_SECONDS``). Si en la ventana hay al
+menos ``MIN_CALLS`` y la proporción de fallos llega a ``ERROR_RATE``, el
+circuito se abre: durante ``OPEN_SECONDS`` las peticiones fallan al
+instante sin salir a la red. Después pasa a semiabierto y deja pasar
+``HALF_OPEN_CALLS`` peticiones de prueba: si salen bien se cierra, si
+fallan vuelve a abrirse.
+
+Cuentan como fallo los timeouts, los errores de conexión y las respuestas
+429/5xx, una vez agotados los reintentos; un 4xx es culpa de la petición,
+no del proveedor. Una petición cancelada antes de terminar (el plazo de
+la búsqueda en search_anime) no cuenta ni en un sentido ni en otro.
+"""
+import threading
+import time
+from collections import deque
+
+import httpx
+import requests
+from django.conf import settings
+
+from . import metrics
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+class CircuitOpen(Exception):
+    """El circuito del proveedor está abierto: la petición no se ha hecho"""
+
+
+class CircuitOpenError(CircuitOpen, requests.ConnectionError):
+    """Para ``transport.request``: se trata como cualquier error de conexión de requests"""
+
+
+class AsyncCircuitOpenError(CircuitOpen, httpx.TransportError):
+    """Para ``transport.arequest``: se trata como cualquier error de transporte de httpx"""
+
+
+class CircuitBreaker:
+    def __init__(self, name: str):
+        self.name = name
+        self.state = CLOSED
+        self._outcomes = deque()  # (instante, ok)
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _config():
+        return settings.PROVIDER_CIRCUIT
+
+    def _move(self, state):
+        self.state = state
+        metrics.PROVIDER_CIRCUIT_TRANSITIONS.labels(self.name, state).inc()
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        elif state == HALF_OPEN:
+            self._probes = 0
+        else:
+            self._outcomes.clear()
+
+    def _refresh(self):
+        if self.state == OPEN and time.monotonic() - self._opened_at >= self._config()['OPEN_SECONDS']:
+            self._move(HALF_OPEN)
+
+    def available(self) -> bool:
+        """Si ahora mismo se dejaría pasar una petición (no reserva la de prueba)"""
+        with self._lock:
+            self._refresh()
+            if self.state == OPEN:
+                return False
+            return self.state == CLOSED or self._probes < self._config()['HALF_OPEN_CALLS']
+
+    def allow(self) -> bool:
+        """Reserva el paso de una petición; en semiabierto cuenta como prueba"""
+        with self._lock:
+            self._refresh()
+            if self.state == OPEN:
+                return False
+            if self.state == HALF_OPEN:
+                if self._probes >= self._config()['HALF_OPEN_CALLS']:
+                    return False
+                self._probes += 1
+            return True
+
+    def discard(self):
+        """Una petición que ``allow`` dejó pasar se canceló: no cuenta y, en semiabierto, libera su plaza de prueba"""
+        with self._lock:
+            if self.state == HALF_OPEN and self._probes:
+                self._probes -= 1
+
+    def record(self, ok: bool):
+        """Resultado final de una petición que ``allow`` dejó pasar"""
+        config = self._config()
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._move(CLOSED if ok else OPEN)
+                return
+            if self.state == OPEN:
+                return
+            now = time.monotonic()
+            self._outcomes.append((now, ok))
+            while self._outcomes and now - self._outcomes[0][0] > config['WINDOW_SECONDS']:
+                self._outcomes.popleft()
+            calls = len(self._outcomes)
+            failures = sum(1 for _, outcome in self._outcomes if not outcome)
+            if calls >= config['MIN_CALLS'] and failures / calls >= config['ERROR_RATE']:
+                self._move(OPEN)
+
+
+def breaker(provider: str) -> CircuitBreaker:
+    """Cortacircuitos de ``provider`` en este proceso"""
+    circuit = _breakers.get(provider)
+    if circuit is not None:
+        return circuit
+    with _breakers_lock:
+        return _breakers.setdefault(provider, CircuitBreaker(provider))
+
+
+def reset():
+    """Cierra todos los circuitos (tests)"""
+    with _breakers_lock:
+        _breakers.clear()
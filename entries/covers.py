@@ -0,0 +1,205 @@
+"""
+Caché local de portadas.
+
+Las portadas de AniList/TVMaze se descargan una sola vez, se reducen a
+las variantes de ``COVER_VARIANTS`` en WebP y se guardan en el storage por
+defecto bajo ``covers/<sha256 de la URL>-<variante>.webp``. El nombre
+depende solo de la URL de origen, así que el contenido de una ruta no
+cambia nunca y se sirve como inmutable.
+
+Mientras una portada no está en caché las plantillas siguen enlazando la
+URL original y la descarga se encola en un pool de hilos: ni la petición
+que la pide ni las importaciones esperan a la imagen.
+
+Lo que se sabe del storage se recuerda por proceso en un LRU de
+``AVAILABILITY_MAX_ENTRIES`` portadas: las presentes para siempre (su
+ruta no cambia) y las ausentes durante ``MISSING_TTL`` segundos, de modo
+que una tarjeta sin portada local no hace un stat en cada render.
+"""
+import hashlib
+import io
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import DatabaseError, close_old_connections
+from django.urls import reverse
+
+from . import metrics, transport
+
+logger = logging.getLogger(__name__)
+
+# Nombre de la variante -> caja máxima (ancho, alto); se conserva la proporción
+COVER_VARIANTS = {
+    'grid': (320, 480),
+    'detail': (640, 960),
+}
+COVER_FORMAT = 'WEBP'
+COVER_QUALITY = 80
+COVER_DIR = 'covers'
+
+# Portadas recordadas como presentes o ausentes (LRU) y segundos que vale un "ausente"
+AVAILABILITY_MAX_ENTRIES = 10000
+MISSING_TTL = 60
+
+_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='cover-fetch')
+# digest -> True (en el storage) o instante monotónico hasta el que se da por ausente
+_known = OrderedDict()
+# Descargas en curso
+_pending = set()
+_lock = threading.Lock()
+
+
+def cover_digest(url: str) -> str:
+    return hashlib.sha256(url.encode()).hexdigest()
+
+
+def cover_path(digest: str, variant: str) -> str:
+    return f'{COVER_DIR}/{digest[:2]}/{digest}-{variant}.webp'
+
+
+def _cacheable(url: str) -> bool:
+    if not url or not settings.COVER_CACHE['ENABLED']:
+        return False
+    parsed = urlparse(url)
+    # Solo CDNs conocidos: la descarga la hace el servidor
+    return parsed.scheme in ('http', 'https') and parsed.hostname in settings.COVER_CACHE['ALLOWED_HOSTS']
+
+
+def _remember(digest: str, available: bool):
+    with _lock:
+        _known[digest] = True if available else time.monotonic() + MISSING_TTL
+        _known.move_to_end(digest)
+        while len(_known) > AVAILABILITY_MAX_ENTRIES:
+            _known.popitem(last=False)
+
+
+def _known_available(digest: str):
+    """True/False si se sabe (sin tocar el storage), None si hay que mirarlo"""
+    with _lock:
+        known = _known.get(digest)
+        if known is None:
+            return None
+        if known is not True and known <= time.monotonic():
+            del _known[digest]
+            return None
+        _known.move_to_end(digest)
+        return known is True
+
+
+def is_cached(digest: str) -> bool:
+    known = _known_available(digest)
+    if known is not None:
+        return known
+    available = all(default_storage.exists(cover_path(digest, variant)) for variant in COVER_VARIANTS)
+    _remember(digest, available)
+    return available
+
+
+def cover_url(url: str, variant: str = 'grid', fetch: bool = True) -> str:
+    """
+    URL a usar en las plantillas para la portada ``url``.
+
+    Devuelve la variante local si ya existe; si no, la URL original y, con
+    ``fetch``, encola la descarga para las siguientes peticiones.
+    """
+    if variant not in COVER_VARIANTS or not _cacheable(url):
+        return url or ''
+    digest = cover_digest(url)
+    if is_cached(digest):
+        metrics.record_cache('covers', hits=1)
+        return reverse('cover_image', args=[digest, variant])
+    metrics.record_cache('covers', misses=1)
+    if fetch:
+        enqueue(url)
+    return url
+
+
+def enqueue(url: str):
+    """Descarga ``url`` en segundo plano si no está ya en caché o en curso"""
+    if not _cacheable(url):
+        return
+    digest = cover_digest(url)
+    if _known_available(digest):
+        return
+    with _lock:
+        if digest in _pending:
+            return
+        _pending.add(digest)
+    _pool.submit(_fetch, url, digest)
+
+
+def prefetch(urls):
+    for url in urls:
+        enqueue(url)
+
+
+def _download(url: str) -> bytes:
+    max_bytes = settings.COVER_CACHE['MAX_BYTES']
+    response = transport.request('covers', 'GET', url, idempotent=True, stream=True)
+    try:
+        length = response.headers.get('Content-Length')
+        if length and length.isdigit() and int(length) > max_bytes:
+            raise ValueError(f'Portada demasiado grande ({length} bytes)')
+        data = bytearray()
+        for chunk in response.iter_content(64 * 1024):
+            data.extend(chunk)
+            if len(data) > max_bytes:
+                raise ValueError('Portada demasiado grande')
+        return bytes(data)
+    finally:
+        response.close()
+
+
+def render_variants(data: bytes):
+    """{variante: bytes WebP} a partir de la imagen original"""
+    from PIL import Image
+
+    variants = {}
+    with Image.open(io.BytesIO(data)) as image:
+        image.load()
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        for variant, size in COVER_VARIANTS.items():
+            thumbnail = image.copy()
+            thumbnail.thumbnail(size)
+            buffer = io.BytesIO()
+            thumbnail.save(buffer, COVER_FORMAT, quality=COVER_QUALITY, method=4)
+            variants[variant] = buffer.getvalue()
+    return variants
+
+
+def _invalidate_entries(url: str):
+    """Las rejillas ya cacheadas con la URL original pasan a la variante local"""
+    from .fragments import bump_library_version
+    from .models import Entry
+
+    bump_library_version(Entry.objects.filter(cover_image=url).values_list('user_id', flat=True).distinct())
+    close_old_connections()
+
+
+def _fetch(url: str, digest: str):
+    try:
+        variants = render_variants(_download(url))
+        for variant, content in variants.items():
+            path = cover_path(digest, variant)
+            if not default_storage.exists(path):
+                default_storage.save(path, ContentFile(content))
+        _remember(digest, True)
+        _invalidate_entries(url)
+    except (requests.exceptions.RequestException, ValueError, OSError, DatabaseError):
+        # Se seguirá enlazando la URL original; se reintenta en la próxima petición
+        logger.warning('No se pudo cachear la portada %s', url, exc_info=True)
+    except Exception:
+        # En el pool nadie recoge el resultado: sin esto el fallo no se vería
+        logger.exception('Error inesperado al cachear la portada %s', url)
+    finally:
+        with _lock:
+            _pending.discard(digest)
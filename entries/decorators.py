@@ -0,0 +1,21 @@
+from functools import wraps
+
+from django.contrib.auth.views import redirect_to_login
+
+
+def async_login_required(view_func):
+    """
+    Equivalente a ``login_required`` para vistas ``async def``.
+
+    Resuelve el usuario con ``request.auser()`` y lo deja en ``request.user``,
+    de modo que la vista puede usarlo sin disparar consultas síncronas.
+    """
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        request.user = user
+        return await view_func(request, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,91 @@
+"""
+Exportación de la biblioteca de un usuario en CSV o JSONL.
+
+Las entradas se recorren con ``iterator(chunk_size)`` (cursor de servidor
+en Postgres) y las etiquetas se resuelven con un prefetch por bloque, así
+que la memoria no depende del tamaño de la biblioteca: cada línea se
+genera y se envía al cliente sin acumular el fichero.
+
+Hay un generador síncrono (WSGI y el comando ``export_library``) y otro
+asíncrono (ASGI); Django acumula en una lista cualquier iterador del
+tipo contrario al del servidor, que es justo lo que hay que evitar.
+"""
+import csv
+import json
+
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from .models import Entry, Tag
+
+CHUNK_SIZE = 500
+EXPORT_FIELDS = (
+    'id', 'title', 'category', 'status', 'platform', 'progress_current', 'progress_total',
+    'episodes_count', 'duration_minutes', 'rating', 'notes', 'external_link', 'external_id',
+    'external_source', 'cover_image', 'created_at', 'updated_at', 'tags',
+)
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+
+class _Echo:
+    """Pseudo-fichero para csv.writer: devuelve la línea en vez de escribirla"""
+
+    def write(self, value):
+        return value
+
+
+def export_queryset(user):
+    return (
+        Entry.objects.filter(user=user)
+        .order_by('pk')
+        .prefetch_related(Prefetch('tags', queryset=Tag.objects.only('id', 'name').order_by('name')))
+    )
+
+
+def export_filename(user, fmt: str) -> str:
+    return f'mylist-{user.username}-{timezone.localdate():%Y%m%d}.{fmt}'
+
+
+def _row(entry) -> dict:
+    row = {field: getattr(entry, field) for field in EXPORT_FIELDS if field != 'tags'}
+    row['created_at'] = entry.created_at.isoformat()
+    row['updated_at'] = entry.updated_at.isoformat()
+    row['tags'] = [tag.name for tag in entry.tags.all()]
+    return row
+
+
+def _encoder(fmt: str):
+    """(cabecera, función entrada -> línea) del formato"""
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+
+        def encode(entry):
+            row = _row(entry)
+            row['tags'] = ', '.join(row['tags'])
+            return writer.writerow([row[field] for field in EXPORT_FIELDS])
+
+        return writer.writerow(EXPORT_FIELDS), encode
+    if fmt == 'jsonl':
+        return None, lambda entry: json.dumps(_row(entry), ensure_ascii=False) + '\n'
+    raise ValueError(f'Formato de exportación desconocido: {fmt}')
+
+
+def iter_export(user, fmt: str, chunk_size: int = CHUNK_SIZE):
+    """Líneas de la exportación (str), de ``chunk_size`` en ``chunk_size`` entradas"""
+    header, encode = _encoder(fmt)
+    if header:
+        yield header
+    for entry in export_queryset(user).iterator(chunk_size=chunk_size):
+        yield encode(entry)
+
+
+async def aiter_export(user, fmt: str, chunk_size: int = CHUNK_SIZE):
+    """Versión asíncrona de ``iter_export``"""
+    header, encode = _encoder(fmt)
+    if header:
+        yield header
+    async for entry in export_queryset(user).aiterator(chunk_size=chunk_size):
+        yield encode(entry)
@@ -0,0 +1,92 @@
+"""
+Caché de fragmentos de la lista de entradas.
+
+Cada tarjeta renderizada se guarda bajo una clave con su id y su
+``updated_at`` (más el total y la portada, que el refresco de AniList y la
+caché de portadas cambian sin tocar ``updated_at``). La rejilla completa de
+cada página se guarda bajo la versión de la biblioteca del usuario
+(``User.library_version``), que sube con cualquier cambio en sus entradas
+o etiquetas.
+
+La versión vive en la fila del usuario: la autenticación ya la carga en
+cada petición, así que leerla no cuesta ninguna consulta y es la misma en
+todos los workers aunque la caché sea local a cada proceso.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db.models import F
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+from . import covers, metrics
+
+CACHE_ALIAS = 'fragments'
+KEY_PREFIX = 'entries:v1'
+CARD_TEMPLATE = 'entries/_entry_card.html'
+
+
+def library_version(user) -> int:
+    return getattr(user, 'library_version', 0)
+
+
+def bump_library_version(user_ids):
+    """Invalida la rejilla (y los validadores HTTP) de esos usuarios"""
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if user_ids:
+        get_user_model().objects.filter(pk__in=user_ids).update(library_version=F('library_version') + 1)
+
+
+def _timeout():
+    return settings.ENTRIES_FRAGMENT_CACHE_TIMEOUT
+
+
+def _card_key(entry):
+    cover = covers.cover_url(entry.cover_image, 'grid')
+    parts = (entry.pk, entry.updated_at.isoformat(), entry.progress_total, cover)
+    digest = hashlib.sha1(json.dumps(parts, default=str).encode()).hexdigest()
+    return f'{KEY_PREFIX}:card:{entry.pk}:{digest}'
+
+
+def render_cards(entries) -> str:
+    """HTML de las tarjetas, reutilizando las ya renderizadas (un get_many y un set_many)"""
+    entries = list(entries)
+    cache = caches[CACHE_ALIAS]
+    keys = [_card_key(entry) for entry in entries]
+    cached = cache.get_many(keys)
+
+    template = None
+    missing = {}
+    parts = []
+    for entry, key in zip(entries, keys):
+        html = cached.get(key)
+        if html is None:
+            template = template or get_template(CARD_TEMPLATE)
+            html = missing[key] = template.render({'entry': entry})
+        parts.append(html)
+    if missing:
+        cache.set_many(missing, _timeout())
+    metrics.record_cache('fragment_cards', hits=len(entries) - len(missing), misses=len(missing))
+    return mark_safe(''.join(parts))
+
+
+def cached_grid(user, params, build):
+    """
+    Página de la rejilla ``{'html', 'next_cursor', 'count'}`` desde la caché.
+
+    Args:
+        params: Filtros y cursor que identifican la página
+        build: Callable que calcula la página en un fallo (sus excepciones se propagan)
+    """
+    cache = caches[CACHE_ALIAS]
+    digest = hashlib.sha1(json.dumps(sorted(params.items())).encode()).hexdigest()
+    key = f'{KEY_PREFIX}:grid:{user.pk}:{library_version(user)}:{digest}'
+    grid = cache.get(key)
+    metrics.record_cache('fragment_grid', hits=int(grid is not None), misses=int(grid is None))
+    if grid is None:
+        grid = build()
+        cache.set(key, {**grid, 'html': str(grid['html'])}, _timeout())
+    return {**grid, 'html': mark_safe(grid['html'])}
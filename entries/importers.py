@@ -0,0 +1,169 @@
+import re
+from typing import Dict, List
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from . import catalog, covers
+from .fragments import bump_library_version
+from .models import Entry
+from .stats import record_entries_added
+
+# Máximo de títulos por petición de importación en bloque
+BULK_IMPORT_MAX_ITEMS = 100
+
+
+class InvalidImportItem(ValueError):
+    """El elemento del proveedor no se puede convertir en una entrada"""
+
+
+def _clean_description(description: str) -> str:
+    if not description:
+        return ''
+    # Remover HTML
+    description = re.sub('<[^<]+?>', '', description)
+    # Remover saltos de línea múltiples
+    description = re.sub(r'\n\s*\n', '\n\n', description)
+    # Limitar longitud
+    return description[:500]
+
+
+def _positive_int(value):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 else None
+
+
+def _optional_text(item: Dict, field: str) -> str:
+    """Campo de texto opcional del elemento ('' si falta); cualquier otro tipo es un error del cliente"""
+    value = item.get(field)
+    if value is None:
+        return ''
+    if not isinstance(value, str):
+        raise InvalidImportItem(f'{field} inválido')
+    return value
+
+
+def entry_from_provider_item(user, item: Dict) -> Entry:
+    """
+    Construye (sin guardar) la entrada correspondiente a un resultado de AniList/TVMaze.
+
+    Raises:
+        InvalidImportItem: Si el elemento no tiene título o algún campo de texto no es texto
+    """
+    if not isinstance(item, dict):
+        raise InvalidImportItem('Datos inválidos')
+
+    # Validar que tenga al menos el título
+    title = str(item.get('title') or '').strip()
+    if not title:
+        raise InvalidImportItem('El anime debe tener un título')
+
+    episodes = _positive_int(item.get('episodes'))
+    source = _optional_text(item, 'source') or 'anilist'
+
+    # Mapear categoría según la fuente
+    category = 'anime'
+    platform = 'AniList'
+    if source == 'tvmaze':
+        category = 'serie'
+        platform = 'TVMaze'
+
+    return Entry(
+        user=user,
+        title=title[:255],  # Limitar longitud del título
+        category=category,
+        status='pendiente',
+        external_id=str(item.get('external_id') or '')[:100],
+        external_source=source[:50],
+        external_link=_optional_text(item, 'url')[:200],
+        cover_image=_optional_text(item, 'cover_image')[:200],
+        notes=_clean_description(_optional_text(item, 'description')),
+        progress_current=0,
+        progress_total=episodes,
+        episodes_count=episodes,
+        duration_minutes=_positive_int(item.get('duration')),
+        platform=platform,
+    )
+
+
+def _existing_ids(user, keys):
+    """{(source, external_id): entry_id} de las claves que el usuario ya tiene, en una consulta"""
+    by_source = {}
+    for source, external_id in keys:
+        by_source.setdefault(source, []).append(external_id)
+
+    condition = Q()
+    for source, external_ids in by_source.items():
+        condition |= Q(external_source=source, external_id__in=external_ids)
+    if not condition:
+        return {}
+
+    rows = Entry.objects.filter(user=user).filter(condition).exclude(external_id='').values_list(
+        'external_source', 'external_id', 'id'
+    )
+    return {(source, external_id): entry_id for source, external_id, entry_id in rows}
+
+
+def bulk_import(user, items: List[Dict], build=entry_from_provider_item) -> List[Dict]:
+    """
+    Importa varios resultados de proveedor de una vez.
+
+    Comprueba con una sola consulta qué pares (external_source, external_id)
+    ya existen e inserta el resto con bulk_create en una transacción. Las
+    entradas se enlazan con su ficha del catálogo (otra consulta).
+
+    Args:
+        build: Callable (user, item) -> Entry sin guardar; lanza InvalidImportItem
+
+    Returns:
+        Un resultado por elemento, en el mismo orden:
+        ``{'index', 'status': 'created'|'exists'|'error', 'entry_id'?, 'error'?}``
+    """
+    results = [None] * len(items)
+    candidates = []  # (index, entry)
+    for index, item in enumerate(items):
+        try:
+            candidates.append((index, build(user, item)))
+        except InvalidImportItem as e:
+            results[index] = {'index': index, 'status': 'error', 'error': str(e)}
+    catalog.link_media([entry for _, entry in candidates])
+
+    # Un reintento por si otra petición importa lo mismo entre la comprobación y el insert
+    for attempt in range(2):
+        keys = {(entry.external_source, entry.external_id) for _, entry in candidates if entry.external_id}
+        existing = _existing_ids(user, keys)
+
+        pending = []
+        seen = {}
+        for index, entry in candidates:
+            key = (entry.external_source, entry.external_id)
+            if entry.external_id and key in existing:
+                results[index] = {'index': index, 'status': 'exists', 'entry_id': existing[key]}
+            elif entry.external_id and key in seen:
+                # Repetido dentro del mismo lote: se resuelve tras el insert
+                results[index] = {'index': index, 'status': 'exists', 'duplicate_of': seen[key]}
+            else:
+                if entry.external_id:
+                    seen[key] = index
+                pending.append((index, entry))
+
+        try:
+            with transaction.atomic():
+                created = Entry.objects.bulk_create([entry for _, entry in pending])
+                record_entries_added(created)
+                bump_library_version([user.pk])
+                transaction.on_commit(lambda: covers.prefetch(entry.cover_image for entry in created))
+            break
+        except IntegrityError:
+            if attempt:
+                raise
+
+    for index, entry in pending:
+        results[index] = {'index': index, 'status': 'created', 'entry_id': entry.pk}
+    for result in results:
+        if 'duplicate_of' in result:
+            result['entry_id'] = results[result.pop('duplicate_of')]['entry_id']
+    return results
@@ -0,0 +1,340 @@
+"""
+Importación de listas exportadas de MyAnimeList (XML) y AniList (JSON).
+
+Los ficheros se leen de forma incremental: el XML con ``iterparse``,
+liberando cada ``<anime>``/``<manga>`` en cuanto se ha leído, y el JSON
+decodificando uno a uno los elementos de cada array ``"entries"``, así
+que nunca hay un árbol completo en memoria. Admiten gzip.
+
+Los títulos se guardan en lotes con ``bulk_import`` (una transacción
+por lote, deduplicando contra ``(external_source, external_id)``) y tras
+cada lote se emite el progreso, que la vista envía como NDJSON.
+"""
+import gzip
+import io
+import json
+import re
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterator
+
+from asgiref.sync import sync_to_async
+
+from .importers import InvalidImportItem, _clean_description, _positive_int, bulk_import
+from .models import Entry
+
+BATCH_SIZE = 500
+# Los ficheros subidos mayores se rechazan antes de empezar
+MAX_FILE_BYTES = 20 * 1024 * 1024
+# Errores por elemento que se devuelven con detalle en el resumen final
+MAX_REPORTED_ERRORS = 20
+READ_SIZE = 64 * 1024
+# Un elemento de "entries" más largo que esto no es una exportación válida
+MAX_JSON_ITEM_CHARS = 1024 * 1024
+
+FORMATS = ('mal', 'anilist')
+
+MAL_STATUSES = {
+    'watching': 'en_curso',
+    'reading': 'en_curso',
+    'completed': 'terminado',
+    # No hay estado "en pausa": se queda como empezado
+    'on-hold': 'en_curso',
+    'dropped': 'abandonado',
+    'plan to watch': 'pendiente',
+    'plan to read': 'pendiente',
+    # Exportaciones antiguas con el estado numérico
+    '1': 'en_curso',
+    '2': 'terminado',
+    '3': 'en_curso',
+    '4': 'abandonado',
+    '6': 'pendiente',
+}
+ANILIST_STATUSES = {
+    'CURRENT': 'en_curso',
+    'REPEATING': 'en_curso',
+    'COMPLETED': 'terminado',
+    'PAUSED': 'en_curso',
+    'DROPPED': 'abandonado',
+    'PLANNING': 'pendiente',
+}
+_ENTRIES_ARRAY = re.compile(r'"entries"\s*:\s*\[')
+
+
+class InvalidListFile(ValueError):
+    """El fichero no es una exportación de MAL/AniList legible"""
+
+
+def _open(file):
+    """El fichero binario, descomprimido si viene en gzip"""
+    head = file.read(2)
+    file.seek(0)
+    return gzip.GzipFile(fileobj=file) if head == b'\x1f\x8b' else file
+
+
+def detect_format(file, filename: str = '') -> str:
+    """'mal' o 'anilist' según la extensión o el primer carácter significativo"""
+    name = filename.lower().removesuffix('.gz')
+    if name.endswith('.xml'):
+        return 'mal'
+    if name.endswith('.json'):
+        return 'anilist'
+    stream = _open(file)
+    head = stream.read(512).lstrip(b'\xef\xbb\xbf \t\r\n')
+    file.seek(0)
+    if head.startswith(b'<'):
+        return 'mal'
+    if head.startswith((b'{', b'[')):
+        return 'anilist'
+    raise InvalidListFile('Formato no reconocido: se espera el XML de MyAnimeList o el JSON de AniList')
+
+
+def _score(value):
+    """
+    Nota en la escala 1-10 de Entry.rating.
+
+    Una nota mayor que 10 se toma como escala de 100 (POINT_100 de AniList)
+    y se divide entre 10; el resto se guarda tal cual. La exportación no
+    dice la escala de cada nota, así que las de 5 o 3 puntos de AniList
+    no se pueden distinguir y se guardan como si fueran de 10.
+    """
+    try:
+        score = float(value)
+    except (TypeError, ValueError):
+        return None
+    if score > 10:
+        score /= 10
+    return min(10, round(score)) or None
+
+
+def _progress(progress, total):
+    progress = _positive_int(progress) or 0
+    return min(progress, total) if total else progress
+
+
+def parse_mal(file) -> Iterator[Dict]:
+    """Elementos de un XML exportado de MyAnimeList (anime o manga)"""
+    root = None
+    try:
+        for event, elem in ET.iterparse(_open(file), events=('start', 'end')):
+            if event == 'start':
+                if root is None:
+                    root = elem
+                continue
+            if elem.tag == 'anime':
+                yield {
+                    'source': 'myanimelist',
+                    'category': 'anime',
+                    'external_id': elem.findtext('series_animedb_id', '').strip(),
+                    'title': elem.findtext('series_title', ''),
+                    'total': elem.findtext('series_episodes'),
+                    'progress': elem.findtext('my_watched_episodes'),
+                    'status': MAL_STATUSES.get(elem.findtext('my_status', '').strip().lower()),
+                    'score': elem.findtext('my_score'),
+                    'notes': elem.findtext('my_comments', ''),
+                    'url': 'https://myanimelist.net/anime/%s' % elem.findtext('series_animedb_id', '').strip(),
+                }
+            elif elem.tag == 'manga':
+                yield {
+                    # Los ids de manga de MAL son otra numeración: con la misma fuente que
+                    # el anime, el manga 1 chocaría con el anime 1 al deduplicar
+                    'source': 'myanimelist_manga',
+                    'category': 'manga',
+                    'external_id': elem.findtext('manga_mangadb_id', '').strip(),
+                    'title': elem.findtext('manga_title', ''),
+                    'total': elem.findtext('manga_chapters'),
+                    'progress': elem.findtext('my_read_chapters'),
+                    'status': MAL_STATUSES.get(elem.findtext('my_status', '').strip().lower()),
+                    'score': elem.findtext('my_score'),
+                    'notes': elem.findtext('my_comments', ''),
+                    'url': 'https://myanimelist.net/manga/%s' % elem.findtext('manga_mangadb_id', '').strip(),
+                }
+            else:
+                continue
+            # Soltar lo ya leído: el árbol nunca pasa de un elemento
+            root.clear()
+    except ET.ParseError as e:
+        raise InvalidListFile(f'XML inválido: {e}') from e
+
+
+def _iter_json_entries(stream) -> Iterator[Dict]:
+    """Objetos de todos los arrays ``"entries"`` del JSON, decodificados de uno en uno"""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    eof = False
+    in_array = False
+
+    def more():
+        nonlocal buffer, eof
+        chunk = stream.read(READ_SIZE)
+        eof = not chunk
+        buffer += chunk
+
+    while True:
+        if not in_array:
+            match = _ENTRIES_ARRAY.search(buffer)
+            if match:
+                buffer = buffer[match.end():]
+                in_array = True
+                continue
+            if eof:
+                return
+            # Lo último podría ser el principio de '"entries": ['
+            buffer = buffer[-32:]
+            more()
+            continue
+
+        buffer = buffer.lstrip(' \t\r\n,')
+        if buffer.startswith(']'):
+            buffer = buffer[1:]
+            in_array = False
+            continue
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError as e:
+            if eof or len(buffer) > MAX_JSON_ITEM_CHARS:
+                raise InvalidListFile(f'JSON inválido: {e}') from e
+            more()
+            continue
+        buffer = buffer[end:]
+        yield item
+
+
+def parse_anilist(file) -> Iterator[Dict]:
+    """Elementos de un JSON de AniList (``MediaListCollection`` con sus ``lists[].entries``)"""
+    stream = io.TextIOWrapper(_open(file), encoding='utf-8-sig')
+    for entry in _iter_json_entries(stream):
+        if not isinstance(entry, dict):
+            yield {}
+            continue
+        media = entry.get('media') or {}
+        title = media.get('title') or {}
+        is_manga = media.get('type') == 'MANGA'
+        yield {
+            'source': 'anilist',
+            'category': 'manga' if is_manga else 'anime',
+            'external_id': str(media.get('id') or ''),
+            'title': title.get('romaji') or title.get('english') or title.get('native') or '',
+            'total': media.get('chapters') if is_manga else media.get('episodes'),
+            'progress': entry.get('progress'),
+            'status': ANILIST_STATUSES.get(entry.get('status')),
+            'score': entry.get('score'),
+            'notes': entry.get('notes') or '',
+            'cover_image': (media.get('coverImage') or {}).get('large') or '',
+            'url': media.get('siteUrl') or '',
+            'duration': media.get('duration'),
+        }
+
+
+PARSERS = {'mal': parse_mal, 'anilist': parse_anilist}
+
+
+def entry_from_list_item(user, item: Dict) -> Entry:
+    """
+    Construye (sin guardar) la entrada de un elemento de ``parse_mal``/``parse_anilist``.
+
+    Raises:
+        InvalidImportItem: Si el elemento no tiene título o id
+    """
+    title = str(item.get('title') or '').strip()
+    if not title:
+        raise InvalidImportItem('Elemento sin título')
+    if not item.get('external_id'):
+        raise InvalidImportItem(f'"{title}" no tiene id')
+
+    total = _positive_int(item.get('total'))
+    is_manga = item['category'] == 'manga'
+    return Entry(
+        user=user,
+        title=title[:255],
+        category=item['category'],
+        status=item.get('status') or 'pendiente',
+        external_id=str(item['external_id'])[:100],
+        external_source=item['source'],
+        external_link=(item.get('url') or '')[:200],
+        cover_image=(item.get('cover_image') or '')[:200],
+        notes=_clean_description(item.get('notes') or ''),
+        progress_current=_progress(item.get('progress'), total),
+        progress_total=total,
+        episodes_count=None if is_manga else total,
+        duration_minutes=_positive_int(item.get('duration')),
+        rating=_score(item.get('score')),
+        platform='AniList' if item['source'] == 'anilist' else 'MyAnimeList',
+    )
+
+
+class ImportProgress:
+    """Contadores del import; ``add`` suma un lote y devuelve el evento de progreso"""
+
+    def __init__(self):
+        self.processed = 0
+        self.created = 0
+        self.exists = 0
+        self.failed = 0
+        self.errors = []
+
+    def add(self, results, offset):
+        for result in results:
+            if result['status'] == 'created':
+                self.created += 1
+            elif result['status'] == 'exists':
+                self.exists += 1
+            else:
+                self.failed += 1
+                if len(self.errors) < MAX_REPORTED_ERRORS:
+                    self.errors.append({'index': offset + result['index'], 'error': result['error']})
+        self.processed += len(results)
+        return self.event('progress')
+
+    def event(self, name, **extra):
+        return {
+            'event': name,
+            'processed': self.processed,
+            'created': self.created,
+            'exists': self.exists,
+            'failed': self.failed,
+            **extra,
+        }
+
+    def done(self):
+        return self.event('done', errors=self.errors)
+
+
+def import_list(user, file, fmt: str, batch_size: int = BATCH_SIZE) -> Iterator[Dict]:
+    """
+    Importa el fichero por lotes; genera un evento de progreso por lote y uno final.
+
+    Los lotes ya guardados se quedan aunque el fichero falle más adelante;
+    en ese caso el último evento es ``{'event': 'error', ...}``.
+    """
+    progress = ImportProgress()
+
+    def save(batch):
+        return progress.add(bulk_import(user, batch, build=entry_from_list_item), progress.processed)
+
+    batch = []
+    try:
+        for item in PARSERS[fmt](file):
+            batch.append(item)
+            if len(batch) == batch_size:
+                yield save(batch)
+                batch = []
+    except InvalidListFile as e:
+        # Lo leído antes del error se guarda igualmente
+        if batch:
+            yield save(batch)
+        yield progress.event('error', error=str(e))
+        return
+    if batch:
+        yield save(batch)
+    yield progress.done()
+
+
+async def aimport_list(user, file, fmt: str, batch_size: int = BATCH_SIZE):
+    """Versión asíncrona de ``import_list``: lectura y escritura de cada lote en un hilo"""
+    events = import_list(user, file, fmt, batch_size)
+    next_event = sync_to_async(next, thread_sensitive=True)
+    while True:
+        event = await next_event(events, None)
+        if event is None:
+            return
+        yield event
@@ -0,0 +1,120 @@
+import json
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+
+from entries import provider_fixtures
+from entries.benchmark import SCENARIOS, HTTPDriver, TestClientDriver, default_scenarios, run_benchmark
+from entries.models import Entry, MediaQuery, Tag
+from entries.seeding import seed_users
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide latencia (p50/p95/p99), throughput y consultas por petición de la lista, '
+        'el detalle, la edición, la importación y la búsqueda. Por defecto en una BD de test desechable; '
+        'la búsqueda solo se incluye por defecto con PROVIDER_TRANSPORT_MODE=replay.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Peticiones medidas por escenario')
+        parser.add_argument('--warmup', type=int, default=10, help='Peticiones previas sin medir por escenario')
+        parser.add_argument('--scenario', action='append', dest='scenarios', choices=sorted(SCENARIOS),
+                            help='Escenario a ejecutar (repetible). Por defecto, todos los reproducibles.')
+        parser.add_argument('--users', type=int, default=5, help='Usuarios a sembrar en la BD de test')
+        parser.add_argument('--entries', type=int, default=500, help='Entradas por usuario a sembrar')
+        parser.add_argument('--tags', type=int, default=12, help='Etiquetas por usuario a sembrar')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='seed',
+                            help='Prefijo de los usuarios sembrados (con --existing-db o --base-url)')
+        parser.add_argument('--existing-db', action='store_true',
+                            help='Usar la BD configurada y sus usuarios sembrados en lugar de una BD de test. '
+                                 'Ojo: los escenarios de edición e importación escriben en ella.')
+        parser.add_argument('--base-url', help='Medir contra un servidor en marcha (implica --existing-db)')
+        parser.add_argument('--cold', action='store_true',
+                            help='Vaciar las cachés de fragmentos y de proveedores (y las búsquedas del '
+                                 'catálogo local) antes de cada petición. Solo dentro del proceso: '
+                                 'no vale con --base-url')
+        parser.add_argument('--output', help='Fichero donde escribir el JSON (por defecto, stdout)')
+
+    def handle(self, *args, **options):
+        if options['cold'] and options['base_url']:
+            raise CommandError(
+                '--cold vacía las cachés de este proceso, no las del servidor: no se puede usar con --base-url'
+            )
+        scenarios = options['scenarios'] or default_scenarios(provider_fixtures.mode())
+        if options['base_url'] or options['existing_db']:
+            report = self._run(options, scenarios)
+        else:
+            report = self._run_in_test_db(options, scenarios)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f"Informe escrito en {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def _run_in_test_db(self, options, scenarios):
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            seed_users(options['users'], options['entries'], options['tags'], seed=options['seed'],
+                       prefix=options['prefix'])
+            return self._run(options, scenarios)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+    def _run(self, options, scenarios):
+        users = list(get_user_model().objects.filter(username__startswith=f"{options['prefix']}-").order_by('pk'))
+        if not users:
+            raise CommandError(f"No hay usuarios '{options['prefix']}-*': ejecutar antes seed_library")
+
+        overrides = {
+            # Sin descargas de portadas en segundo plano compitiendo con las peticiones medidas
+            'COVER_CACHE': {'ENABLED': False, 'ALLOWED_HOSTS': [], 'MAX_BYTES': 0},
+        }
+        if options['base_url']:
+            driver = HTTPDriver(options['base_url'])
+        else:
+            driver = TestClientDriver()
+            # El cliente de test pide a 'testserver'; fuera de setup_test_environment
+            # (--existing-db) no está en ALLOWED_HOSTS y todo sería un 400
+            overrides['ALLOWED_HOSTS'] = [*settings.ALLOWED_HOSTS, 'testserver']
+        on_request = self._clear_caches if options['cold'] else None
+        provider_fixtures.reset_injector()
+
+        with override_settings(**overrides):
+            report = run_benchmark(
+                driver, users, scenarios,
+                requests_per_scenario=options['requests'],
+                warmup=options['warmup'],
+                seed=options['seed'],
+                on_request=on_request,
+            )
+        report['provider_transport'] = provider_fixtures.mode()
+        report['library'] = self._library(users)
+        return report
+
+    @staticmethod
+    def _library(users):
+        """Lo que hay de verdad en la BD para los usuarios medidos (sembrado o no por este comando)"""
+        entries = Entry.objects.filter(user__in=users).count()
+        tags = Tag.objects.filter(user__in=users).count()
+        return {
+            'users': len(users),
+            'entries_per_user': round(entries / len(users), 1),
+            'tags_per_user': round(tags / len(users), 1),
+        }
+
+    @staticmethod
+    def _clear_caches():
+        caches['fragments'].clear()
+        caches['providers'].clear()
+        MediaQuery.objects.all().delete()
@@ -0,0 +1,36 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from entries.exports import CHUNK_SIZE, CONTENT_TYPES, iter_export
+
+
+class Command(BaseCommand):
+    help = 'Exporta la biblioteca de un usuario en CSV o JSONL, entrada a entrada y sin cargarla en memoria'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--format', choices=sorted(CONTENT_TYPES), default='csv')
+        parser.add_argument('--output', help='Fichero de salida (por defecto, stdout)')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Entradas leídas por bloque')
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options['username'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No existe el usuario {options['username']}")
+
+        lines = iter_export(user, options['format'], chunk_size=options['chunk_size'])
+        if not options['output']:
+            # Sin el estilo ni el salto de línea que añade self.stdout
+            sys.stdout.writelines(lines)
+            return
+        count = 0
+        with open(options['output'], 'w', encoding='utf-8', newline='') as f:
+            for line in lines:
+                f.write(line)
+                count += 1
+        if options['format'] == 'csv':
+            count -= 1
+        self.stderr.write(self.style.SUCCESS(f"{count} entradas exportadas a {options['output']}"))
@@ -0,0 +1,41 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from entries.list_imports import BATCH_SIZE, FORMATS, InvalidListFile, detect_format, import_list
+
+
+class Command(BaseCommand):
+    help = 'Importa una lista exportada de MyAnimeList (XML, opcionalmente .gz) o AniList (JSON) a un usuario'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, help='Por defecto se detecta por la extensión o el contenido')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Títulos por transacción')
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options['username'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No existe el usuario {options['username']}")
+
+        with open(options['path'], 'rb') as f:
+            try:
+                fmt = options['format'] or detect_format(f, options['path'])
+            except InvalidListFile as e:
+                raise CommandError(str(e))
+            for event in import_list(user, f, fmt, batch_size=options['batch_size']):
+                if event['event'] == 'progress':
+                    if options['verbosity'] > 1:
+                        self.stderr.write(json.dumps(event))
+                elif event['event'] == 'error':
+                    raise CommandError(f"{event['error']} (guardados {event['created']} de {event['processed']})")
+                else:
+                    for error in event['errors']:
+                        self.stderr.write(self.style.WARNING(f"#{error['index']}: {error['error']}"))
+                    self.stdout.write(self.style.SUCCESS(
+                        f"{event['processed']} títulos: {event['created']} añadidos, "
+                        f"{event['exists']} ya estaban, {event['failed']} con errores"
+                    ))
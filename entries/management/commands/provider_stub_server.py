@@ -0,0 +1,112 @@
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from entries import provider_fixtures
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Sirve ``/<proveedor>/<ruta>`` desde los fixtures grabados.
+
+    El servidor lleva ``fixtures_dir``, ``injector`` y ``verbosity``
+    (ver ``make_server``).
+    """
+
+    # Keep-alive como los proveedores reales, para que se note el pool de conexiones
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self._serve()
+
+    def do_POST(self):
+        self._serve()
+
+    def _serve(self):
+        url = urlsplit(self.path)
+        provider, _, path = url.path.lstrip('/').partition('/')
+        if provider not in settings.PROVIDER_BASE_URLS:
+            return self._reply(404, 'application/json', b'{"error": "proveedor desconocido"}')
+
+        body = None
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            try:
+                body = json.loads(self.rfile.read(length))
+            except ValueError:
+                return self._reply(400, 'application/json', b'{"error": "JSON no valido"}')
+
+        time.sleep(self.server.injector.delay())
+        if self.server.injector.error():
+            return self._reply(provider_fixtures.INJECTED_ERROR_STATUS, 'application/json', b'{"error": "injected"}')
+
+        key = provider_fixtures.fixture_key(
+            provider, self.command, '/' + path.strip('/'), dict(parse_qsl(url.query)), body,
+        )
+        try:
+            fixture = provider_fixtures.load(provider, key, self.server.fixtures_dir)
+        except provider_fixtures.FixtureNotFound as e:
+            return self._reply(404, 'application/json', json.dumps({'error': str(e)}).encode())
+        self._reply(fixture['status'], fixture['content_type'], provider_fixtures.body_bytes(fixture))
+
+    def _reply(self, status, content_type, content):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        if self.server.verbosity > 1:
+            super().log_message(format, *args)
+
+
+def make_server(host, port, transport, verbosity=1):
+    """Servidor sin arrancar para los fixtures y la inyección de ``transport`` (como PROVIDER_TRANSPORT)"""
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.fixtures_dir = transport['FIXTURES_DIR']
+    server.injector = provider_fixtures.Injector(transport)
+    server.verbosity = verbosity
+    return server
+
+
+class Command(BaseCommand):
+    help = (
+        'Servidor HTTP local que imita a AniList y TVMaze con los fixtures grabados '
+        '(PROVIDER_TRANSPORT_MODE=record). Para usarlo: '
+        'ANILIST_BASE_URL=http://127.0.0.1:8765/anilist TVMAZE_BASE_URL=http://127.0.0.1:8765/tvmaze'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--fixtures', help='Directorio de fixtures (por defecto PROVIDER_FIXTURES_DIR)')
+        parser.add_argument('--latency-ms', type=float, help='Latencia añadida a cada respuesta')
+        parser.add_argument('--jitter-ms', type=float, help='Variación aleatoria de la latencia (±)')
+        parser.add_argument('--error-rate', type=float, help='Fracción de respuestas 503 inyectadas (0-1)')
+        parser.add_argument('--seed', type=int)
+
+    def handle(self, *args, **options):
+        transport = dict(settings.PROVIDER_TRANSPORT)
+        for option, setting in (('fixtures', 'FIXTURES_DIR'), ('latency_ms', 'LATENCY_MS'),
+                                ('jitter_ms', 'JITTER_MS'), ('error_rate', 'ERROR_RATE'), ('seed', 'SEED')):
+            if options[option] is not None:
+                transport[setting] = options[option]
+        if not 0 <= transport['ERROR_RATE'] <= 1:
+            raise CommandError('--error-rate debe estar entre 0 y 1')
+
+        server = make_server(options['host'], options['port'], transport, options['verbosity'])
+        base = f"http://{options['host']}:{server.server_port}"
+        self.stdout.write(f"Sirviendo {transport['FIXTURES_DIR']} en {base}")
+        for provider in settings.PROVIDER_BASE_URLS:
+            self.stdout.write(f'  {provider.upper()}_BASE_URL={base}/{provider}')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
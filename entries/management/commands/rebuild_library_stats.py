@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from entries.stats import rebuild_library_summary, verify_library_summary
+
+# Diferencias que se listan como mucho
+MAX_REPORTED = 20
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula desde cero los contadores y sumas desnormalizados de LibrarySummary '
+        'y los comprueba contra una agregación completa de Entry'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help='ID de usuario a recalcular (repetible). Por defecto, todos.')
+        parser.add_argument('--verify', action='store_true',
+                            help='Solo comprobar, sin recalcular; termina con error si hay diferencias')
+
+    def handle(self, *args, **options):
+        if not options['verify']:
+            written = rebuild_library_summary(options['user_ids'])
+            self.stdout.write(self.style.SUCCESS(f'LibrarySummary recalculado: {written} filas'))
+
+        mismatches = verify_library_summary(options['user_ids'])
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS('LibrarySummary coincide con la agregación de Entry'))
+            return
+        for mismatch in mismatches[:MAX_REPORTED]:
+            self.stderr.write(
+                'usuario {user_id} {category}/{status} {column}: esperado {expected}, guardado {actual}'.format(**mismatch)
+            )
+        if len(mismatches) > MAX_REPORTED:
+            self.stderr.write(f'... y {len(mismatches) - MAX_REPORTED} más')
+        raise CommandError(f'LibrarySummary no coincide: {len(mismatches)} diferencias')
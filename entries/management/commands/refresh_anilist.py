@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from entries.api_services import AniListAPI
+from entries.refresh import refresh_anilist_entries
+
+
+class Command(BaseCommand):
+    help = 'Actualiza episodios, total y portada de las entradas importadas de AniList'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--id', type=int, action='append', dest='ids',
+                            help='ID de AniList a refrescar (repetible). Por defecto, todos los guardados.')
+        parser.add_argument('--batch-size', type=int, default=AniListAPI.MAX_IDS_PER_QUERY,
+                            help='IDs por petición a AniList (máximo 50)')
+
+    def handle(self, *args, **options):
+        summary = refresh_anilist_entries(options['ids'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"AniList: {summary['ids']} títulos en {summary['requests']} peticiones, "
+            f"{summary['updated']} entradas actualizadas"
+        ))
+        if summary['failed']:
+            self.stderr.write(self.style.WARNING(f"{summary['failed']} títulos no se pudieron refrescar"))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from entries.seeding import SEED_PASSWORD, seed_users
+
+
+class Command(BaseCommand):
+    help = 'Crea usuarios con bibliotecas sintéticas (entradas, etiquetas y sus enlaces) para pruebas de carga'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='Usuarios a crear')
+        parser.add_argument('--entries', type=int, default=500, help='Entradas por usuario')
+        parser.add_argument('--tags', type=int, default=12, help='Etiquetas por usuario')
+        parser.add_argument('--seed', type=int, default=0, help='Semilla: misma semilla, mismos datos')
+        parser.add_argument('--prefix', default='seed', help='Prefijo de los nombres de usuario')
+
+    def handle(self, *args, **options):
+        users = seed_users(
+            users=options['users'],
+            entries=options['entries'],
+            tags=options['tags'],
+            seed=options['seed'],
+            prefix=options['prefix'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Creados {len(users)} usuarios ({users[0].username}…) con {options['entries']} entradas "
+            f"y {options['tags']} etiquetas cada uno. Contraseña: {SEED_PASSWORD}"
+        ) if users else 'No se creó ningún usuario')
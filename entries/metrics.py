@@ -0,0 +1,100 @@
+"""
+Métricas de la app en formato Prometheus, expuestas en /metrics.
+
+Con varios workers de gunicorn cada proceso escribe sus valores en
+ficheros mmap de ``PROMETHEUS_MULTIPROC_DIR`` (lo prepara
+gunicorn.conf.py) y la vista agrega los de todos los procesos, así que
+cualquier worker devuelve los totales. Sin esa variable (runserver,
+tests) se usa el registro del propio proceso.
+
+Las proporciones de acierto de las cachés salen de
+``mylist_cache_requests_total`` en la consulta, p. ej.
+``sum by (cache) (rate(...{result="hit"}[5m])) / sum by (cache) (rate(...[5m]))``.
+"""
+import hmac
+import os
+
+from django.conf import settings
+from django.http import HttpResponse
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+PROVIDER_LATENCY = Histogram(
+    'mylist_provider_request_duration_seconds',
+    'Duración de las peticiones a proveedores externos, reintentos incluidos',
+    ['provider', 'outcome'],
+    buckets=LATENCY_BUCKETS,
+)
+PROVIDER_ERRORS = Counter(
+    'mylist_provider_errors_total',
+    'Peticiones a proveedores fallidas tras los reintentos, por tipo (timeout, connection, http_<estado>, circuit_open)',
+    ['provider', 'kind'],
+)
+PROVIDER_RETRIES = Counter(
+    'mylist_provider_retries_total',
+    'Reintentos de peticiones a proveedores',
+    ['provider'],
+)
+PROVIDER_COALESCED = Counter(
+    'mylist_provider_coalesced_total',
+    'Peticiones a proveedores resueltas con la llamada en curso de otra (scope: process o workers)',
+    ['provider', 'scope'],
+)
+PROVIDER_CIRCUIT_TRANSITIONS = Counter(
+    'mylist_provider_circuit_transitions_total',
+    'Cambios de estado del cortacircuitos de cada proveedor (closed, open, half_open)',
+    ['provider', 'state'],
+)
+PROVIDER_SKIPPED = Counter(
+    'mylist_provider_skipped_total',
+    'Proveedores que una búsqueda no esperó, por motivo (circuit_open, deadline)',
+    ['provider', 'reason'],
+)
+PROVIDER_RESULTS = Histogram(
+    'mylist_provider_results',
+    'Número de resultados devueltos por el proveedor',
+    ['provider', 'operation'],
+    buckets=(0, 1, 2, 5, 10, 20, 50),
+)
+VIEW_LATENCY = Histogram(
+    'mylist_view_duration_seconds',
+    'Duración de las peticiones por vista',
+    ['view', 'method', 'status'],
+    buckets=LATENCY_BUCKETS,
+)
+CACHE_REQUESTS = Counter(
+    'mylist_cache_requests_total',
+    'Lecturas de caché por resultado (hit, miss, stale)',
+    ['cache', 'result'],
+)
+
+
+def record_cache(cache: str, hits: int = 0, misses: int = 0, stale: int = 0):
+    for result, count in (('hit', hits), ('miss', misses), ('stale', stale)):
+        if count:
+            CACHE_REQUESTS.labels(cache, result).inc(count)
+
+
+def _registry():
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def _authorized(request):
+    token = settings.METRICS_TOKEN
+    header = request.headers.get('Authorization', '')
+    if token and header.startswith('Bearer ') and hmac.compare_digest(header[7:], token):
+        return True
+    return request.user.is_authenticated and request.user.is_staff
+
+
+def metrics_view(request):
+    """Métricas en texto Prometheus; con ``Authorization: Bearer $METRICS_TOKEN`` o como staff"""
+    if not _authorized(request):
+        return HttpResponse('No autorizado', status=401, content_type='text/plain')
+    return HttpResponse(generate_latest(_registry()), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,42 @@
+# Generated by Django 5.0.1 on 2026-10-18 07:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_summary(apps, schema_editor):
+    Entry = apps.get_model('entries', 'Entry')
+    LibrarySummary = apps.get_model('entries', 'LibrarySummary')
+    rows = Entry.objects.order_by().values('user_id', 'category', 'status').annotate(n=Count('id'))
+    LibrarySummary.objects.bulk_create([
+        LibrarySummary(user_id=row['user_id'], category=row['category'], status=row['status'], entries_count=row['n'])
+        for row in rows
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('entries', '0003_entry_duration_minutes_entry_episodes_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LibrarySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(choices=[('anime', '🎬 Anime'), ('serie', '📺 Serie'), ('pelicula', '🎥 Película'), ('manga', '📖 Manga'), ('manhwa', '📚 Manhwa'), ('libro', '📕 Libro'), ('videojuego', '🎮 Videojuego')], max_length=20)),
+                ('status', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_curso', 'En Curso'), ('terminado', 'Terminado'), ('abandonado', 'Abandonado')], max_length=20)),
+                ('entries_count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='library_summary', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'library_summary',
+                'unique_together': {('user', 'category', 'status')},
+            },
+        ),
+        migrations.RunPython(backfill_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,79 @@
+from django.db import migrations
+
+# Copia congelada del SQL de entries.search: la migración no debe cambiar si ese módulo lo hace
+SQLITE_INSTALL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(
+        title, notes, content='entries', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS entries_fts_ai AFTER INSERT ON entries BEGIN
+        INSERT INTO entries_fts(rowid, title, notes) VALUES (new.id, new.title, new.notes);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS entries_fts_ad AFTER DELETE ON entries BEGIN
+        INSERT INTO entries_fts(entries_fts, rowid, title, notes) VALUES ('delete', old.id, old.title, old.notes);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS entries_fts_au AFTER UPDATE OF title, notes ON entries BEGIN
+        INSERT INTO entries_fts(entries_fts, rowid, title, notes) VALUES ('delete', old.id, old.title, old.notes);
+        INSERT INTO entries_fts(rowid, title, notes) VALUES (new.id, new.title, new.notes);
+    END
+    """,
+    "INSERT INTO entries_fts(entries_fts) VALUES ('rebuild')",
+]
+
+SQLITE_UNINSTALL = [
+    'DROP TRIGGER IF EXISTS entries_fts_ai',
+    'DROP TRIGGER IF EXISTS entries_fts_ad',
+    'DROP TRIGGER IF EXISTS entries_fts_au',
+    'DROP TABLE IF EXISTS entries_fts',
+]
+
+# Título pesa más que las notas
+POSTGRES_INSTALL = [
+    """
+    ALTER TABLE entries ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(notes, '')), 'B')
+    ) STORED
+    """,
+    'CREATE INDEX IF NOT EXISTS entries_search_vector_gin ON entries USING GIN (search_vector)',
+]
+
+POSTGRES_UNINSTALL = [
+    'DROP INDEX IF EXISTS entries_search_vector_gin',
+    'ALTER TABLE entries DROP COLUMN IF EXISTS search_vector',
+]
+
+
+def _run(schema_editor, statements_by_vendor):
+    for sql in statements_by_vendor.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def install(apps, schema_editor):
+    _run(schema_editor, {'sqlite': SQLITE_INSTALL, 'postgresql': POSTGRES_INSTALL})
+
+
+def uninstall(apps, schema_editor):
+    _run(schema_editor, {'sqlite': SQLITE_UNINSTALL, 'postgresql': POSTGRES_UNINSTALL})
+
+
+class Migration(migrations.Migration):
+    """
+    Índice de texto completo sobre Entry.title y Entry.notes:
+    FTS5 con triggers en SQLite y columna tsvector generada + GIN en Postgres.
+    """
+
+    dependencies = [
+        ('entries', '0004_librarysummary'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.0.1 on 2026-10-18 07:43
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def detach_duplicate_imports(apps, schema_editor):
+    """
+    Antes de la restricción única: si un usuario tiene el mismo título externo
+    repetido, se conserva el vínculo en la entrada más antigua y se vacía
+    external_id en el resto (no se borra ninguna entrada).
+    """
+    Entry = apps.get_model('entries', 'Entry')
+    duplicates = (
+        Entry.objects.exclude(external_id='')
+        .order_by()
+        .values('user_id', 'external_source', 'external_id')
+        .annotate(n=Count('id'), keep=Min('id'))
+        .filter(n__gt=1)
+    )
+    for row in duplicates:
+        Entry.objects.filter(
+            user_id=row['user_id'],
+            external_source=row['external_source'],
+            external_id=row['external_id'],
+        ).exclude(id=row['keep']).update(external_id='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('entries', '0005_entry_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(detach_duplicate_imports, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='entry',
+            index=models.Index(fields=['user', '-updated_at', '-id'], name='entries_user_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entry',
+            index=models.Index(fields=['user', 'status', '-updated_at', '-id'], name='entries_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entry',
+            index=models.Index(fields=['user', 'category', '-updated_at', '-id'], name='entries_user_category_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='entry',
+            constraint=models.UniqueConstraint(condition=models.Q(('external_id', ''), _negated=True), fields=('user', 'external_source', 'external_id'), name='entries_unique_external_item'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.0.1 on 2026-10-18 08:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('entries', '0006_entry_access_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Media',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=50)),
+                ('external_id', models.CharField(max_length=100)),
+                ('title', models.CharField(max_length=255)),
+                ('title_english', models.CharField(blank=True, max_length=255)),
+                ('title_native', models.CharField(blank=True, max_length=255)),
+                ('description', models.TextField(blank=True)),
+                ('cover_image', models.URLField(blank=True, max_length=500)),
+                ('banner_image', models.URLField(blank=True, max_length=500)),
+                ('format', models.CharField(blank=True, max_length=30)),
+                ('airing_status', models.CharField(blank=True, max_length=30)),
+                ('episodes', models.IntegerField(blank=True, null=True)),
+                ('duration', models.IntegerField(blank=True, null=True)),
+                ('genres', models.JSONField(blank=True, default=list)),
+                ('studios', models.JSONField(blank=True, default=list)),
+                ('score', models.FloatField(blank=True, null=True)),
+                ('popularity', models.FloatField(blank=True, null=True)),
+                ('season', models.CharField(blank=True, max_length=20)),
+                ('year', models.IntegerField(blank=True, null=True)),
+                ('url', models.URLField(blank=True, max_length=500)),
+                ('fetched_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'media',
+            },
+        ),
+        migrations.CreateModel(
+            name='MediaQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=50)),
+                ('query', models.CharField(max_length=255)),
+                ('limit', models.PositiveSmallIntegerField()),
+                ('external_ids', models.JSONField(default=list)),
+                ('fetched_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'media_queries',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='media',
+            constraint=models.UniqueConstraint(fields=('source', 'external_id'), name='media_unique_external_item'),
+        ),
+        migrations.AddField(
+            model_name='entry',
+            name='media',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='entries', to='entries.media'),
+        ),
+        migrations.AddConstraint(
+            model_name='mediaquery',
+            constraint=models.UniqueConstraint(fields=('source', 'query', 'limit'), name='media_queries_unique_search'),
+        ),
+    ]
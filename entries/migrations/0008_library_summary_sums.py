@@ -0,0 +1,55 @@
+# Generated by Django 5.0.1 on 2026-10-18 08:21
+
+from django.db import migrations, models
+from django.db.models import Case, Count, F, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest
+
+
+def backfill_sums(apps, schema_editor):
+    """Rellena las sumas nuevas con la misma agregación que stats.summary_rows"""
+    Entry = apps.get_model('entries', 'Entry')
+    LibrarySummary = apps.get_model('entries', 'LibrarySummary')
+    duration = Coalesce(F('duration_minutes'), Value(0))
+    rows = Entry.objects.order_by().values('user_id', 'category', 'status').annotate(
+        entries_count=Count('id'),
+        progress_sum=Sum('progress_current'),
+        minutes_watched=Sum(Case(
+            When(category='pelicula', status='terminado', then=duration * Greatest(F('progress_current'), Value(1))),
+            default=duration * F('progress_current'),
+        )),
+        rating_sum=Sum(Coalesce(F('rating'), Value(0))),
+        rated_count=Count('rating'),
+    )
+    LibrarySummary.objects.all().delete()
+    LibrarySummary.objects.bulk_create([LibrarySummary(**row) for row in rows], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('entries', '0007_media_catalog'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='librarysummary',
+            name='minutes_watched',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='librarysummary',
+            name='progress_sum',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='librarysummary',
+            name='rated_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='librarysummary',
+            name='rating_sum',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_sums, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations
+
+MANGA_LINK = 'https://myanimelist.net/manga/'
+
+
+def split_mal_manga(apps, schema_editor):
+    """El manga importado de MAL pasa a su propia fuente: sus ids no son los del anime"""
+    Entry = apps.get_model('entries', 'Entry')
+    Entry.objects.filter(external_source='myanimelist', external_link__startswith=MANGA_LINK).update(
+        external_source='myanimelist_manga',
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('entries', '0008_library_summary_sums'),
+    ]
+
+    operations = [
+        # Sin vuelta atrás: juntarlas de nuevo chocaría con la restricción única
+        migrations.RunPython(split_mal_manga, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Count, Q
 from django.conf import settings
 
 class Tag(models.Model):
@@ -17,6 +18,86 @@ class Tag(models.Model):
         return self.name
 
 
+class Media(models.Model):
+    """
+    Ficha de un título de AniList/TVMaze compartida por todos los usuarios.
+
+    Se rellena con los resultados de búsqueda (entries/catalog.py); las
+    entradas importadas apuntan a ella por ``media``.
+    """
+    source = models.CharField(max_length=50)
+    external_id = models.CharField(max_length=100)
+    title = models.CharField(max_length=255)
+    title_english = models.CharField(max_length=255, blank=True)
+    title_native = models.CharField(max_length=255, blank=True)
+    description = models.TextField(blank=True)
+    cover_image = models.URLField(max_length=500, blank=True)
+    banner_image = models.URLField(max_length=500, blank=True)
+    format = models.CharField(max_length=30, blank=True)
+    airing_status = models.CharField(max_length=30, blank=True)
+    episodes = models.IntegerField(null=True, blank=True)
+    duration = models.IntegerField(null=True, blank=True)
+    genres = models.JSONField(default=list, blank=True)
+    studios = models.JSONField(default=list, blank=True)
+    score = models.FloatField(null=True, blank=True)
+    popularity = models.FloatField(null=True, blank=True)
+    season = models.CharField(max_length=20, blank=True)
+    year = models.IntegerField(null=True, blank=True)
+    url = models.URLField(max_length=500, blank=True)
+    fetched_at = models.DateTimeField()
+    
+    class Meta:
+        db_table = 'media'
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'external_id'], name='media_unique_external_item'),
+        ]
+    
+    def __str__(self):
+        return f"{self.title} ({self.source}:{self.external_id})"
+
+
+class MediaQuery(models.Model):
+    """Resultado de una búsqueda en un proveedor: ids de Media en el orden en que los devolvió"""
+    source = models.CharField(max_length=50)
+    query = models.CharField(max_length=255)
+    limit = models.PositiveSmallIntegerField()
+    external_ids = models.JSONField(default=list)
+    fetched_at = models.DateTimeField()
+    
+    class Meta:
+        db_table = 'media_queries'
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'query', 'limit'], name='media_queries_unique_search'),
+        ]
+    
+    def __str__(self):
+        return f"{self.source}: {self.query}"
+
+
+class EntryQuerySet(models.QuerySet):
+
+    def imported(self, source, external_id):
+        """Entradas importadas de ``source`` con ese id; resuelto por el índice único parcial"""
+        # El exclude repite la condición del índice para que el planificador pueda usarlo
+        return self.filter(external_source=source, external_id=external_id).exclude(external_id='')
+
+    def stats(self):
+        """Totales por estado y por categoría en una sola consulta agregada"""
+        aggregates = {'total': Count('id')}
+        for value, _ in Entry.STATUS_CHOICES:
+            aggregates[f'status_{value}'] = Count('id', filter=Q(status=value))
+        for value, _ in Entry.CATEGORY_CHOICES:
+            aggregates[f'category_{value}'] = Count('id', filter=Q(category=value))
+        row = self.aggregate(**aggregates)
+
+        stats = {'total': row['total'], 'by_category': {}}
+        for value, _ in Entry.STATUS_CHOICES:
+            stats[value] = row[f'status_{value}']
+        for value, _ in Entry.CATEGORY_CHOICES:
+            stats['by_category'][value] = row[f'category_{value}']
+        return stats
+
+
 class Entry(models.Model):
     """Entrada principal del usuario"""
     
@@ -38,6 +119,8 @@ class Entry(models.Model):
     ]
     
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='entries')
+    # Ficha compartida del catálogo, si el título vino de un proveedor conocido
+    media = models.ForeignKey(Media, null=True, blank=True, on_delete=models.SET_NULL, related_name='entries')
     tags = models.ManyToManyField(Tag, blank=True, related_name='entries')
     
     title = models.CharField(max_length=255)
@@ -60,13 +143,38 @@ class Entry(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = EntryQuerySet.as_manager()
+    
+    # Campos cuyo valor en BD se recuerda para calcular los deltas de LibrarySummary
+    SUMMARY_FIELDS = ('category', 'status', 'progress_current', 'duration_minutes', 'rating')
+    
     class Meta:
         db_table = 'entries'
         ordering = ['-updated_at']
+        indexes = [
+            # Lista principal y sus filtros, en el orden de KeysetPaginator
+            models.Index(fields=['user', '-updated_at', '-id'], name='entries_user_updated_idx'),
+            models.Index(fields=['user', 'status', '-updated_at', '-id'], name='entries_user_status_idx'),
+            models.Index(fields=['user', 'category', '-updated_at', '-id'], name='entries_user_category_idx'),
+        ]
+        constraints = [
+            # Un mismo título de un proveedor solo una vez por usuario (import_anime)
+            models.UniqueConstraint(
+                fields=['user', 'external_source', 'external_id'],
+                condition=~Q(external_id=''),
+                name='entries_unique_external_item',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.title} ({self.get_category_display()})"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._db_state = {field: instance.__dict__.get(field) for field in cls.SUMMARY_FIELDS}
+        return instance
+    
     @property
     def status_badge_color(self):
         colors = {
@@ -75,4 +183,24 @@ class Entry(models.Model):
             'terminado': 'bg-green-500',
             'abandonado': 'bg-red-500',
         }
-        return colors.get(self.status, 'bg-gray-500')
\ No newline at end of file
+        return colors.get(self.status, 'bg-gray-500')
+
+
+class LibrarySummary(models.Model):
+    """Contadores y sumas desnormalizados de entradas por usuario, categoría y estado"""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='library_summary')
+    category = models.CharField(max_length=20, choices=Entry.CATEGORY_CHOICES)
+    status = models.CharField(max_length=20, choices=Entry.STATUS_CHOICES)
+    entries_count = models.IntegerField(default=0)
+    # Sumas de lo que aporta cada entrada (stats.summary_values)
+    progress_sum = models.BigIntegerField(default=0)
+    minutes_watched = models.BigIntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    rated_count = models.IntegerField(default=0)
+    
+    class Meta:
+        db_table = 'library_summary'
+        unique_together = ['user', 'category', 'status']
+    
+    def __str__(self):
+        return f"{self.user} · {self.category}/{self.status}: {self.entries_count}"
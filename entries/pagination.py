@@ -0,0 +1,93 @@
+import base64
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional
+
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    """El cursor recibido no se puede decodificar"""
+
+
+@dataclass
+class KeysetPage:
+    object_list: List
+    next_cursor: Optional[str]
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    Paginación por cursor (keyset) sobre un orden total.
+
+    En lugar de OFFSET, cada página filtra por "después de la última fila
+    vista", así que el coste de una página profunda es el mismo que el de la
+    primera mientras exista un índice que cubra el orden.
+
+    El último campo de ``ordering`` debe ser único (normalmente ``-id``) y
+    ninguno puede ser nulo.
+    """
+
+    def __init__(self, queryset, ordering=('-updated_at', '-id'), per_page=48):
+        self.queryset = queryset.order_by(*ordering)
+        self.keys = [(field.lstrip('-'), field.startswith('-')) for field in ordering]
+        self.per_page = per_page
+
+    def page(self, cursor: Optional[str] = None) -> KeysetPage:
+        queryset = self.queryset
+        if cursor:
+            queryset = queryset.filter(self._after(self.decode_cursor(cursor)))
+
+        rows = list(queryset[:self.per_page + 1])
+        next_cursor = None
+        if len(rows) > self.per_page:
+            rows = rows[:self.per_page]
+            next_cursor = self.encode_cursor(rows[-1])
+        return KeysetPage(rows, next_cursor)
+
+    def _after(self, values):
+        """(k1 > v1) OR (k1 = v1 AND k2 > v2) OR ... respetando el sentido de cada clave"""
+        if len(values) != len(self.keys):
+            raise InvalidCursor('El cursor no corresponde a este orden')
+        condition = Q()
+        for i, (field, descending) in enumerate(self.keys):
+            term = Q(**{f"{field}__{'lt' if descending else 'gt'}": values[i]})
+            for j in range(i):
+                term &= Q(**{self.keys[j][0]: values[j]})
+            condition |= term
+        # Cota redundante sobre la primera clave: permite al planificador
+        # empezar el recorrido del índice en el cursor en lugar de al principio
+        first_field, first_descending = self.keys[0]
+        bound = Q(**{f"{first_field}__{'lte' if first_descending else 'gte'}": values[0]})
+        return bound & condition
+
+    def encode_cursor(self, obj) -> str:
+        values = []
+        for field, _ in self.keys:
+            value = getattr(obj, field)
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            values.append(value)
+        raw = json.dumps(values, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor: str) -> list:
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            values = json.loads(raw)
+        except (ValueError, TypeError) as e:
+            raise InvalidCursor(str(e))
+        if not isinstance(values, list):
+            raise InvalidCursor('Formato de cursor inválido')
+        return values
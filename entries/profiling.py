@@ -0,0 +1,122 @@
+"""
+Perfil por petición: consultas SQL, llamadas a proveedores y render de plantillas.
+
+El perfil de la petición en curso vive en una ContextVar, así que sigue a
+la petición también en los hilos de ``sync_to_async`` y en las corrutinas
+de las vistas async. Los puntos de medida no hacen nada si no hay perfil
+activo (petición no muestreada o middleware desactivado):
+
+* SQL: un execute_wrapper instalado en cada conexión al crearse.
+* Plantillas: ``Template.render`` envuelto una vez; solo cuenta el render
+  más externo, no cada include.
+* Proveedores: ``entries.transport`` llama a ``record_provider_call``.
+"""
+import time
+from contextvars import ContextVar
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+_current = ContextVar('entries_request_profile', default=None)
+_installed = False
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_queries = 0
+        self.db_ms = 0.0
+        self.provider_calls = 0
+        self.provider_ms = 0.0
+        self.template_ms = 0.0
+        self._template_depth = 0
+
+    @property
+    def total_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def as_dict(self):
+        return {
+            'total_ms': round(self.total_ms, 2),
+            'db_queries': self.db_queries,
+            'db_ms': round(self.db_ms, 2),
+            'provider_calls': self.provider_calls,
+            'provider_ms': round(self.provider_ms, 2),
+            'template_ms': round(self.template_ms, 2),
+        }
+
+
+def start():
+    """Activa un perfil para el contexto actual; devuelve el token para ``stop``"""
+    profile = RequestProfile()
+    return profile, _current.set(profile)
+
+
+def stop(token):
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+def record_provider_call(elapsed_ms):
+    profile = _current.get()
+    if profile is not None:
+        profile.provider_calls += 1
+        profile.provider_ms += elapsed_ms
+
+
+def _sql_wrapper(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    t0 = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.db_queries += 1
+        profile.db_ms += (time.perf_counter() - t0) * 1000
+
+
+def _add_sql_wrapper(connection):
+    if _sql_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_sql_wrapper)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    _add_sql_wrapper(connection)
+
+
+def _wrap_template_render():
+    from django.template.base import Template
+
+    original = Template.render
+
+    def render(self, context):
+        profile = _current.get()
+        if profile is None:
+            return original(self, context)
+        profile._template_depth += 1
+        t0 = time.perf_counter()
+        try:
+            return original(self, context)
+        finally:
+            profile._template_depth -= 1
+            if not profile._template_depth:
+                profile.template_ms += (time.perf_counter() - t0) * 1000
+
+    Template.render = render
+
+
+def install():
+    """Instala los puntos de medida (idempotente; lo llama el middleware al arrancar)"""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    connection_created.connect(_on_connection_created, dispatch_uid='entries.profiling')
+    # Conexiones ya abiertas en este hilo
+    for connection in connections.all(initialized_only=True):
+        _add_sql_wrapper(connection)
+    _wrap_template_render()
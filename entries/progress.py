@@ -0,0 +1,106 @@
+"""
+Incremento atómico del progreso de una entrada ("+1 episodio").
+
+El nuevo progreso y el estado se calculan en el propio UPDATE a partir de
+los valores de la fila (``progress_current + N`` acotado a
+``[0, progress_total]``), así que dos pestañas que suman a la vez nunca se
+pisan. La fila se lee antes con SELECT ... FOR UPDATE solo para conocer el
+estado anterior, que hace falta para LibrarySummary (progreso, minutos
+vistos y, si cambia el estado, los contadores de las dos celdas).
+"""
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Greatest, Least
+from django.utils import timezone
+
+from .fragments import bump_library_version
+from .models import Entry
+from .stats import add_entry_delta, apply_summary_deltas, summary_deltas
+
+MAX_PROGRESS_DELTA = 1000
+
+
+class InvalidProgressDelta(ValueError):
+    pass
+
+
+def clean_delta(value) -> int:
+    if isinstance(value, bool):
+        raise InvalidProgressDelta('Incremento inválido')
+    try:
+        delta = int(value)
+    except (TypeError, ValueError):
+        raise InvalidProgressDelta('Incremento inválido')
+    if not delta or abs(delta) > MAX_PROGRESS_DELTA:
+        raise InvalidProgressDelta(f'El incremento debe estar entre -{MAX_PROGRESS_DELTA} y {MAX_PROGRESS_DELTA}, sin ser 0')
+    return delta
+
+
+def next_progress(progress, total, delta):
+    progress = max(progress + delta, 0)
+    return min(progress, total) if total and total > 0 else progress
+
+
+def next_status(status, progress, total):
+    """Estado tras llegar a ``progress``: terminado al alcanzar el total, en curso si se retoma"""
+    if total and total > 0 and progress >= total:
+        return 'terminado'
+    if progress > 0 and (status in ('pendiente', 'abandonado') or (status == 'terminado' and total and total > 0)):
+        return 'en_curso'
+    return status
+
+
+def _progress_expression(delta):
+    raised = Greatest(F('progress_current') + delta, Value(0))
+    return Case(When(progress_total__gt=0, then=Least(raised, F('progress_total'))), default=raised)
+
+
+def _status_expression(delta):
+    # Las condiciones usan los valores anteriores de la fila: progreso nuevo = progress_current + delta
+    has_total = Q(progress_total__gt=0)
+    return Case(
+        When(has_total & Q(progress_total__lte=F('progress_current') + delta), then=Value('terminado')),
+        When(
+            Q(progress_current__gt=-delta)
+            & (Q(status__in=['pendiente', 'abandonado']) | (Q(status='terminado') & has_total)),
+            then=Value('en_curso'),
+        ),
+        default=F('status'),
+    )
+
+
+def increment_progress(user, pk, delta) -> dict:
+    """
+    Suma ``delta`` al progreso de la entrada ``pk`` del usuario en un único UPDATE.
+
+    Returns:
+        ``{'progress_current', 'progress_total', 'status'}`` tras el cambio
+
+    Raises:
+        Entry.DoesNotExist: Si la entrada no existe o no es del usuario
+        InvalidProgressDelta
+    """
+    delta = clean_delta(delta)
+    with transaction.atomic():
+        row = (
+            Entry.objects.select_for_update()
+            .filter(pk=pk, user=user)
+            .values('progress_total', *Entry.SUMMARY_FIELDS)
+            .first()
+        )
+        if row is None:
+            raise Entry.DoesNotExist
+        Entry.objects.filter(pk=pk).update(
+            progress_current=_progress_expression(delta),
+            status=_status_expression(delta),
+            updated_at=timezone.now(),
+        )
+        # Con la fila bloqueada el resultado del UPDATE es exactamente este
+        progress = next_progress(row['progress_current'], row['progress_total'], delta)
+        status = next_status(row['status'], progress, row['progress_total'])
+        deltas = summary_deltas()
+        add_entry_delta(deltas, user.pk, row, sign=-1)
+        add_entry_delta(deltas, user.pk, {**row, 'progress_current': progress, 'status': status})
+        apply_summary_deltas(deltas)
+        bump_library_version([user.pk])
+    return {'progress_current': progress, 'progress_total': row['progress_total'], 'status': status}
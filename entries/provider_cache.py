@@ -0,0 +1,259 @@
+"""
+Caché de resultados de proveedores externos (AniList, TVMaze).
+
+Se apoya en el framework de caché de Django (alias ``providers``). Cada
+entrada guarda el valor junto con el instante hasta el que se considera
+fresco; pasado ese instante se sigue sirviendo durante
+``PROVIDER_CACHE_STALE_SECONDS`` mientras se refresca en segundo plano
+(stale-while-revalidate). Si el proveedor falla durante el refresco, se
+conserva el valor anterior.
+
+El tamaño lo acota ``MAX_ENTRIES`` del backend: LocMemCache mueve al final
+cada clave leída y al llenarse descarta las menos usadas (LRU).
+
+En un fallo de caché, las peticiones idénticas simultáneas del mismo
+proceso esperan a la primera en vez de repetir la llamada (single-flight),
+y con ``PROVIDER_SINGLE_FLIGHT['CROSS_WORKER']`` un bloqueo en la propia
+caché hace lo mismo entre workers. Así las llamadas al proveedor crecen
+con las búsquedas distintas, no con los usuarios.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+import unicodedata
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import caches
+
+from . import metrics, transport
+
+logger = logging.getLogger(__name__)
+
+CACHE_ALIAS = 'providers'
+KEY_PREFIX = 'provider:v1'
+# Lo que tarda como mucho un refresco; evita lanzar varios a la vez para la misma clave
+REFRESH_LOCK_SECONDS = 30
+
+# Los refrescos corren en hilos también para la versión async: bajo WSGI el
+# bucle de eventos de la petición se cierra al responder y una tarea
+# pendiente se perdería.
+_refresh_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='provider-refresh')
+
+
+def normalize_query(query: str) -> str:
+    """'  Shingeki  no KYOJIN ' y 'shingeki no kyojin' comparten entrada"""
+    return ' '.join(unicodedata.normalize('NFKC', query or '').casefold().split())
+
+
+def cache_key(provider: str, operation: str, *parts) -> str:
+    digest = hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+    return f'{KEY_PREFIX}:{provider}:{operation}:{digest}'
+
+
+def _ttl(provider: str) -> int:
+    return settings.PROVIDER_CACHE_TTLS.get(provider, settings.PROVIDER_CACHE_TTLS.get('default', 3600))
+
+
+def _envelope(provider, value):
+    return {'value': value, 'fresh_until': time.time() + _ttl(provider)}
+
+
+def _timeout(provider):
+    return _ttl(provider) + settings.PROVIDER_CACHE_STALE_SECONDS
+
+
+# Llamadas en curso por (clave, 'sync'|'async'), compartidas por todos los hilos y
+# bucles de eventos del proceso. Las dos variantes no se mezclan: cada una
+# lanza las excepciones de su cliente HTTP (requests o httpx).
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+class _Abandoned(Exception):
+    """La petición que hacía la llamada se canceló antes de terminarla"""
+
+
+def _join(flight_key):
+    """(future de la llamada en curso, si quien llama es quien debe hacerla)"""
+    with _inflight_lock:
+        future = _inflight.get(flight_key)
+        if future is not None:
+            return future, False
+        future = _inflight[flight_key] = Future()
+        return future, True
+
+
+def _land(flight_key, future, value=None, error=None):
+    with _inflight_lock:
+        _inflight.pop(flight_key, None)
+    if error is None:
+        future.set_result(value)
+    else:
+        future.set_exception(error)
+
+
+def _record(provider, miss=False, stale=False):
+    if miss:
+        metrics.record_cache(f'providers:{provider}', misses=1)
+    else:
+        metrics.record_cache(f'providers:{provider}', hits=int(not stale), stale=int(stale))
+
+
+def cached_call(provider, operation, parts, fetch):
+    """
+    Devuelve el resultado de ``fetch()`` pasando por la caché.
+
+    Args:
+        provider: Nombre del proveedor (elige el TTL)
+        operation: Nombre de la operación, parte de la clave
+        parts: Argumentos ya normalizados que identifican la petición
+        fetch: Callable sin argumentos que consulta al proveedor y lanza excepción si falla
+
+    Raises:
+        Lo que lance ``fetch`` si no hay ningún valor en caché que servir
+    """
+    cache = caches[CACHE_ALIAS]
+    key = cache_key(provider, operation, *parts)
+    envelope = cache.get(key)
+
+    if envelope is not None:
+        stale = time.time() >= envelope['fresh_until']
+        _record(provider, stale=stale)
+        if stale and cache.add(f'{key}:refresh', 1, REFRESH_LOCK_SECONDS):
+            _refresh_pool.submit(_refresh, cache, provider, key, fetch)
+        return envelope['value']
+
+    _record(provider, miss=True)
+    flight_key = (key, 'sync')
+    future, leader = _join(flight_key)
+    if not leader:
+        metrics.PROVIDER_COALESCED.labels(provider, 'process').inc()
+        try:
+            return future.result()
+        except _Abandoned:
+            return _fetch(cache, provider, key, fetch)
+    try:
+        value = _fetch_once(cache, provider, key, fetch)
+    except BaseException as e:
+        _land(flight_key, future, error=e if isinstance(e, Exception) else _Abandoned())
+        raise
+    _land(flight_key, future, value)
+    return value
+
+
+async def acached_call(provider, operation, parts, afetch):
+    """Versión asíncrona de cached_call; ``afetch`` es una corrutina sin argumentos"""
+    cache = caches[CACHE_ALIAS]
+    key = cache_key(provider, operation, *parts)
+    envelope = await cache.aget(key)
+
+    if envelope is not None:
+        stale = time.time() >= envelope['fresh_until']
+        _record(provider, stale=stale)
+        if stale and await cache.aadd(f'{key}:refresh', 1, REFRESH_LOCK_SECONDS):
+            async def refetch():
+                # Bucle de async_to_sync que se cierra al acabar: sin AsyncClient propio
+                with transport.short_lived_loop():
+                    return await afetch()
+            _refresh_pool.submit(_refresh, cache, provider, key, async_to_sync(refetch))
+        return envelope['value']
+
+    _record(provider, miss=True)
+    flight_key = (key, 'async')
+    future, leader = _join(flight_key)
+    if not leader:
+        metrics.PROVIDER_COALESCED.labels(provider, 'process').inc()
+        try:
+            # shield: si se cancela esta petición, no se cancela la llamada compartida
+            return await asyncio.shield(asyncio.wrap_future(future))
+        except _Abandoned:
+            return await _afetch(cache, provider, key, afetch)
+    try:
+        value = await _afetch_once(cache, provider, key, afetch)
+    except BaseException as e:
+        # CancelledError incluido: quienes esperan lo intentan por su cuenta
+        _land(flight_key, future, error=e if isinstance(e, Exception) else _Abandoned())
+        raise
+    _land(flight_key, future, value)
+    return value
+
+
+def _fetch(cache, provider, key, fetch):
+    value = fetch()
+    cache.set(key, _envelope(provider, value), _timeout(provider))
+    return value
+
+
+async def _afetch(cache, provider, key, afetch):
+    value = await afetch()
+    await cache.aset(key, _envelope(provider, value), _timeout(provider))
+    return value
+
+
+def _fetch_once(cache, provider, key, fetch):
+    """
+    ``_fetch`` con el bloqueo entre workers si está activado.
+
+    Quien no consigue el bloqueo espera a que el valor aparezca en la caché;
+    si el bloqueo se libera sin valor (falló) o se agota la espera, llama él.
+    """
+    options = settings.PROVIDER_SINGLE_FLIGHT
+    if not options['CROSS_WORKER']:
+        return _fetch(cache, provider, key, fetch)
+    lock = f'{key}:fetch'
+    if cache.add(lock, 1, options['LOCK_SECONDS']):
+        try:
+            return _fetch(cache, provider, key, fetch)
+        finally:
+            cache.delete(lock)
+
+    deadline = time.monotonic() + options['WAIT_SECONDS']
+    while time.monotonic() < deadline:
+        time.sleep(options['POLL_INTERVAL'])
+        envelope = cache.get(key)
+        if envelope is not None:
+            metrics.PROVIDER_COALESCED.labels(provider, 'workers').inc()
+            return envelope['value']
+        if cache.get(lock) is None:
+            break
+    return _fetch(cache, provider, key, fetch)
+
+
+async def _afetch_once(cache, provider, key, afetch):
+    """Versión asíncrona de ``_fetch_once``"""
+    options = settings.PROVIDER_SINGLE_FLIGHT
+    if not options['CROSS_WORKER']:
+        return await _afetch(cache, provider, key, afetch)
+    lock = f'{key}:fetch'
+    if await cache.aadd(lock, 1, options['LOCK_SECONDS']):
+        try:
+            return await _afetch(cache, provider, key, afetch)
+        finally:
+            await cache.adelete(lock)
+
+    deadline = time.monotonic() + options['WAIT_SECONDS']
+    while time.monotonic() < deadline:
+        await asyncio.sleep(options['POLL_INTERVAL'])
+        envelope = await cache.aget(key)
+        if envelope is not None:
+            metrics.PROVIDER_COALESCED.labels(provider, 'workers').inc()
+            return envelope['value']
+        if await cache.aget(lock) is None:
+            break
+    return await _afetch(cache, provider, key, afetch)
+
+
+def _refresh(cache, provider, key, fetch):
+    try:
+        cache.set(key, _envelope(provider, fetch()), _timeout(provider))
+    except Exception:
+        # Se sigue sirviendo el valor anterior hasta que caduque del todo
+        logger.warning('Refresco fallido de %s (%s); se mantiene el valor en caché', key, provider, exc_info=True)
+    finally:
+        cache.delete(f'{key}:refresh')
+
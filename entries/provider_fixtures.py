@@ -0,0 +1,204 @@
+"""
+Grabación y reproducción de respuestas de proveedores (PROVIDER_TRANSPORT).
+
+Modos (``PROVIDER_TRANSPORT['MODE']``):
+
+* ``live``: peticiones reales, como siempre.
+* ``record``: peticiones reales; cada respuesta 2xx se guarda además como
+  fixture JSON en ``FIXTURES_DIR/<proveedor>/<clave>.json``.
+* ``replay``: no sale nada a la red; la respuesta se lee del fixture y se
+  le añade la latencia y la tasa de errores configuradas. Una petición sin
+  fixture falla como un error de conexión.
+
+La clave de un fixture depende del proveedor, el método, la ruta relativa
+a su URL base (PROVIDER_BASE_URLS), los parámetros y el cuerpo JSON, y no
+de las cabeceras ni del host, así que los mismos ficheros sirven tanto en
+``replay`` como desde el servidor ``provider_stub_server``.
+"""
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+import httpx
+import requests
+from django.conf import settings
+from requests.structures import CaseInsensitiveDict
+
+MODES = ('live', 'record', 'replay')
+# Estado de las respuestas de error inyectadas: transport las reintenta como un 503 real
+INJECTED_ERROR_STATUS = 503
+TEXT_TYPES = ('application/json', 'text/')
+
+_injector_instance = None
+_injector_lock = threading.Lock()
+
+
+class FixtureNotFound(LookupError):
+    pass
+
+
+def _config():
+    return settings.PROVIDER_TRANSPORT
+
+
+def mode() -> str:
+    return _config()['MODE']
+
+
+def fixtures_dir() -> Path:
+    return Path(_config()['FIXTURES_DIR'])
+
+
+def relative_path(provider: str, url: str) -> str:
+    """Ruta de ``url`` respecto a la URL base del proveedor (la URL completa si no tiene base)"""
+    base = settings.PROVIDER_BASE_URLS.get(provider)
+    if base and url.startswith(base.rstrip('/')):
+        url = url[len(base.rstrip('/')):]
+    return '/' + url.split('?', 1)[0].strip('/')
+
+
+def fixture_key(provider: str, method: str, path: str, params=None, body=None) -> str:
+    params = {str(k): str(v) for k, v in (params or {}).items()}
+    raw = json.dumps([provider, method.upper(), path, sorted(params.items()), body], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+
+def key_for(provider: str, method: str, url: str, kwargs) -> str:
+    """Clave de una llamada de ``entries.transport`` (params/json como en requests y httpx)"""
+    return fixture_key(provider, method, relative_path(provider, url), kwargs.get('params'), kwargs.get('json'))
+
+
+def fixture_path(provider: str, key: str, directory=None) -> Path:
+    return Path(directory or fixtures_dir()) / provider / f'{key}.json'
+
+
+def load(provider: str, key: str, directory=None) -> dict:
+    try:
+        with open(fixture_path(provider, key, directory), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise FixtureNotFound(f'Sin fixture {provider}/{key}: grabarlo con PROVIDER_TRANSPORT_MODE=record') from None
+
+
+def save(provider: str, key: str, request: dict, status: int, content_type: str, content: bytes, directory=None):
+    fixture = {'request': request, 'status': status, 'content_type': content_type}
+    if content_type.startswith(TEXT_TYPES):
+        fixture['body'] = content.decode('utf-8')
+    else:
+        fixture['body_b64'] = base64.b64encode(content).decode('ascii')
+
+    path = fixture_path(provider, key, directory)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Escritura atómica: un worker que reproduce nunca lee un fichero a medias
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(fixture, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def body_bytes(fixture: dict) -> bytes:
+    if 'body_b64' in fixture:
+        return base64.b64decode(fixture['body_b64'])
+    return fixture.get('body', '').encode('utf-8')
+
+
+class Injector:
+    """Latencia (LATENCY_MS ± JITTER_MS) y errores (ERROR_RATE) simulados, reproducibles con SEED"""
+
+    def __init__(self, config):
+        self.latency_ms = config['LATENCY_MS']
+        self.jitter_ms = config['JITTER_MS']
+        self.error_rate = config['ERROR_RATE']
+        self._rng = random.Random(config['SEED'])
+        self._lock = threading.Lock()
+
+    def delay(self) -> float:
+        """Segundos a esperar antes de responder"""
+        if not self.jitter_ms:
+            return self.latency_ms / 1000
+        with self._lock:
+            jitter = self._rng.uniform(-self.jitter_ms, self.jitter_ms)
+        return max(0.0, self.latency_ms + jitter) / 1000
+
+    def error(self) -> bool:
+        if not self.error_rate:
+            return False
+        with self._lock:
+            return self._rng.random() < self.error_rate
+
+
+def _injector() -> Injector:
+    global _injector_instance
+    with _injector_lock:
+        if _injector_instance is None:
+            _injector_instance = Injector(_config())
+        return _injector_instance
+
+
+def reset_injector():
+    """Vuelve a leer la configuración y a sembrar la secuencia (entre ejecuciones del benchmark)"""
+    global _injector_instance
+    with _injector_lock:
+        _injector_instance = None
+
+
+def _replayed(provider, method, url, kwargs):
+    """(estado, content_type, cuerpo) para la llamada, con el error inyectado si toca"""
+    if _injector().error():
+        return INJECTED_ERROR_STATUS, 'application/json', b'{"error": "injected"}'
+    fixture = load(provider, key_for(provider, method, url, kwargs))
+    return fixture['status'], fixture['content_type'], body_bytes(fixture)
+
+
+def replay(provider: str, method: str, url: str, kwargs) -> requests.Response:
+    """Respuesta de ``requests`` reproducida desde el fixture"""
+    time.sleep(_injector().delay())
+    try:
+        status, content_type, content = _replayed(provider, method, url, kwargs)
+    except FixtureNotFound as e:
+        raise requests.ConnectionError(str(e)) from e
+    response = requests.Response()
+    response.status_code = status
+    response.reason = 'Replayed' if status < 400 else 'Injected error'
+    response.headers = CaseInsensitiveDict({'Content-Type': content_type})
+    response._content = content
+    # Como una respuesta ya leída: iter_content (stream=True) recorre _content; raw para quien lo lea directamente
+    response._content_consumed = True
+    response.raw = io.BytesIO(content)
+    response.url = url
+    response.request = requests.Request(method, url).prepare()
+    return response
+
+
+async def areplay(provider: str, method: str, url: str, kwargs) -> httpx.Response:
+    """Respuesta de ``httpx`` reproducida desde el fixture"""
+    await asyncio.sleep(_injector().delay())
+    request = httpx.Request(method, url, params=kwargs.get('params'))
+    try:
+        status, content_type, content = _replayed(provider, method, url, kwargs)
+    except FixtureNotFound as e:
+        raise httpx.ConnectError(str(e), request=request) from e
+    return httpx.Response(status, headers={'Content-Type': content_type}, content=content, request=request)
+
+
+def record(provider: str, method: str, url: str, kwargs, status: int, content_type: Optional[str], content: bytes):
+    """Guarda una respuesta real 2xx como fixture"""
+    if not 200 <= status < 300:
+        return
+    key = key_for(provider, method, url, kwargs)
+    request = {
+        'method': method.upper(),
+        'path': relative_path(provider, url),
+        'params': kwargs.get('params'),
+        'json': kwargs.get('json'),
+    }
+    save(provider, key, request, status, (content_type or 'application/octet-stream').split(';')[0], content)
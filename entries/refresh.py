@@ -0,0 +1,92 @@
+"""
+Refresco de los metadatos de las entradas importadas de AniList.
+
+Al importar se copian episodios y portada; AniList los va completando
+(series en emisión, portadas nuevas). El refresco reúne los ids distintos
+de todos los usuarios, los pide en páginas de ``Media(id_in: ...)`` y
+escribe los cambios con ``bulk_update``: una petición y unas pocas
+consultas por cada 50 títulos, no una por entrada.
+"""
+import logging
+from typing import Dict, Iterable, List, Optional
+
+import requests
+
+from .api_services import AniListAPI
+from .fragments import bump_library_version
+from .models import Entry
+
+logger = logging.getLogger(__name__)
+
+REFRESH_FIELDS = ('episodes_count', 'progress_total', 'cover_image')
+UPDATE_BATCH_SIZE = 500
+
+
+def _anilist_ids(ids: Optional[Iterable] = None) -> List[int]:
+    """Ids de AniList distintos guardados en cualquier biblioteca, ordenados"""
+    queryset = Entry.objects.filter(external_source='anilist').exclude(external_id='')
+    if ids is not None:
+        queryset = queryset.filter(external_id__in=[str(anilist_id) for anilist_id in ids])
+    anilist_ids = set()
+    for external_id in queryset.values_list('external_id', flat=True).distinct():
+        try:
+            anilist_ids.add(int(external_id))
+        except ValueError:
+            continue
+    return sorted(anilist_ids)
+
+
+def _apply(entry: Entry, media: Dict) -> bool:
+    """Copia en ``entry`` lo que haya cambiado; devuelve si hubo cambios"""
+    changed = False
+    episodes = media.get('episodes')
+    if episodes and episodes > 0 and episodes != entry.episodes_count:
+        # El total solo sigue a los episodios si el usuario no lo ha tocado
+        if entry.progress_total is None or entry.progress_total == entry.episodes_count:
+            entry.progress_total = episodes
+        entry.episodes_count = episodes
+        changed = True
+    cover = media.get('cover_image')
+    if cover and len(cover) <= 200 and cover != entry.cover_image:
+        entry.cover_image = cover
+        changed = True
+    return changed
+
+
+def refresh_anilist_entries(ids: Optional[Iterable] = None, batch_size: int = AniListAPI.MAX_IDS_PER_QUERY) -> Dict:
+    """
+    Refresca episodios, total y portada de las entradas de AniList.
+
+    Args:
+        ids: Limitar a estos ids de AniList (por defecto, todos los guardados)
+        batch_size: Ids por petición a AniList (máximo 50)
+
+    Returns:
+        Dict con 'ids', 'requests', 'updated' (entradas modificadas) y
+        'failed' (ids cuya página no se pudo obtener)
+    """
+    batch_size = max(1, min(batch_size, AniListAPI.MAX_IDS_PER_QUERY))
+    anilist_ids = _anilist_ids(ids)
+    summary = {'ids': len(anilist_ids), 'requests': 0, 'updated': 0, 'failed': 0}
+
+    for start in range(0, len(anilist_ids), batch_size):
+        batch = anilist_ids[start:start + batch_size]
+        summary['requests'] += 1
+        try:
+            media_by_id = AniListAPI.fetch_media_batch(batch)
+        except requests.exceptions.RequestException:
+            logger.warning('Refresco de AniList fallido para %d ids (%d..%d)', len(batch), batch[0], batch[-1], exc_info=True)
+            summary['failed'] += len(batch)
+            continue
+
+        entries = Entry.objects.filter(
+            external_source='anilist', external_id__in=list(media_by_id),
+        ).only('id', 'user', 'external_id', *REFRESH_FIELDS)
+        changed = [entry for entry in entries if _apply(entry, media_by_id[entry.external_id])]
+        if changed:
+            Entry.objects.bulk_update(changed, REFRESH_FIELDS, batch_size=UPDATE_BATCH_SIZE)
+            # bulk_update no envía señales ni toca updated_at
+            bump_library_version(entry.user_id for entry in changed)
+            summary['updated'] += len(changed)
+
+    return summary
@@ -0,0 +1,147 @@
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Entry
+
+# Orden por relevancia para KeysetPaginator ('-id' desempata)
+SEARCH_ORDERING = ('-search_rank', '-id')
+
+FTS_TABLE = 'entries_fts'
+PG_VECTOR_COLUMN = 'search_vector'
+
+# Título pesa más que las notas
+_PG_VECTOR_SQL = (
+    "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(notes, '')), 'B')"
+)
+
+# La migración 0005 guarda una copia congelada de este SQL: cambiarlo aquí pide una migración nueva
+_SQLITE_TRIGGERS = {
+    'entries_fts_ai': """
+        CREATE TRIGGER IF NOT EXISTS entries_fts_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts}(rowid, title, notes) VALUES (new.id, new.title, new.notes);
+        END
+    """,
+    'entries_fts_ad': """
+        CREATE TRIGGER IF NOT EXISTS entries_fts_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, title, notes) VALUES ('delete', old.id, old.title, old.notes);
+        END
+    """,
+    'entries_fts_au': """
+        CREATE TRIGGER IF NOT EXISTS entries_fts_au AFTER UPDATE OF title, notes ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, title, notes) VALUES ('delete', old.id, old.title, old.notes);
+            INSERT INTO {fts}(rowid, title, notes) VALUES (new.id, new.title, new.notes);
+        END
+    """,
+}
+
+
+def _terms(query):
+    return re.findall(r'\w+', query or '')
+
+
+def search_entries(queryset, query):
+    """
+    Filtra ``queryset`` por texto completo en título y notas.
+
+    Usa la tabla FTS5 en SQLite y la columna tsvector con índice GIN en
+    Postgres; cada palabra se trata como prefijo y todas deben aparecer.
+    Añade la anotación ``search_rank`` (mayor es más relevante).
+    """
+    terms = _terms(query)
+    if not terms:
+        return queryset.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    table = Entry._meta.db_table
+    vendor = connections[queryset.db].vendor
+
+    if vendor == 'sqlite':
+        match = ' '.join(f'"{term}"*' for term in terms)
+        matches = RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', (match,))
+        rank = RawSQL(
+            f'SELECT -bm25({FTS_TABLE}, 10.0, 1.0) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND {FTS_TABLE}.rowid = {table}.id',
+            (match,),
+            output_field=FloatField(),
+        )
+        return queryset.filter(id__in=matches).annotate(search_rank=rank)
+
+    if vendor == 'postgresql':
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        matches = RawSQL(
+            f"{table}.{PG_VECTOR_COLUMN} @@ to_tsquery('simple', %s)", (tsquery,), output_field=BooleanField()
+        )
+        # float8 para que el valor sobreviva intacto al viaje de ida y vuelta en el cursor
+        rank = RawSQL(
+            f"ts_rank({table}.{PG_VECTOR_COLUMN}, to_tsquery('simple', %s))::float8", (tsquery,),
+            output_field=FloatField(),
+        )
+        return queryset.filter(matches).annotate(search_rank=rank)
+
+    condition = Q()
+    for term in terms:
+        condition &= Q(title__icontains=term) | Q(notes__icontains=term)
+    return queryset.filter(condition).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+def install_search_index(connection, rebuild=False):
+    """
+    Crea (si no existen) el índice de texto completo y lo que lo mantiene sincronizado.
+
+    En SQLite, Django recrea la tabla al aplicar algunas migraciones y con
+    ello se pierden los triggers; ``repair_search_index`` los repone tras
+    cada ``migrate``.
+    """
+    table = Entry._meta.db_table
+
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger') AND name IN (%s, %s, %s, %s)",
+                (FTS_TABLE, *_SQLITE_TRIGGERS),
+            )
+            existing = {row[0] for row in cursor.fetchall()}
+            if existing == {FTS_TABLE, *_SQLITE_TRIGGERS} and not rebuild:
+                return
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                f"title, notes, content='{table}', content_rowid='id', "
+                f"tokenize='unicode61 remove_diacritics 2')"
+            )
+            for sql in _SQLITE_TRIGGERS.values():
+                cursor.execute(sql.format(table=table, fts=FTS_TABLE))
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+    elif connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {PG_VECTOR_COLUMN} tsvector "
+                f"GENERATED ALWAYS AS ({_PG_VECTOR_SQL}) STORED"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {table}_search_vector_gin ON {table} USING GIN ({PG_VECTOR_COLUMN})"
+            )
+
+
+def repair_search_index(connection):
+    """Repone los triggers de SQLite si la tabla FTS existe pero falta alguno"""
+    if connection.vendor != 'sqlite':
+        return
+    if FTS_TABLE in connection.introspection.table_names():
+        install_search_index(connection)
+
+
+def uninstall_search_index(connection):
+    table = Entry._meta.db_table
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            for name in _SQLITE_TRIGGERS:
+                cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+            cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+        elif connection.vendor == 'postgresql':
+            cursor.execute(f'DROP INDEX IF EXISTS {table}_search_vector_gin')
+            cursor.execute(f'ALTER TABLE {table} DROP COLUMN IF EXISTS {PG_VECTOR_COLUMN}')
@@ -0,0 +1,151 @@
+"""
+Generación de bibliotecas sintéticas para tests de rendimiento y benchmarks.
+
+Las distribuciones imitan una biblioteca real: mucho anime y series, la
+mayoría pendiente o terminada, notas de longitud muy variable, un tercio
+de entradas sin etiquetas y unas pocas con muchas. Todo se inserta con
+``bulk_create`` y se deriva de un ``random.Random`` con semilla, así que
+dos ejecuciones con la misma semilla producen los mismos datos.
+"""
+import random
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from .fragments import bump_library_version
+from .models import Entry, Tag
+from .stats import record_entries_added
+
+CATEGORY_WEIGHTS = {
+    'anime': 45, 'serie': 25, 'pelicula': 12, 'manga': 8, 'manhwa': 4, 'libro': 4, 'videojuego': 2,
+}
+STATUS_WEIGHTS = {'pendiente': 35, 'en_curso': 20, 'terminado': 37, 'abandonado': 8}
+# Número de etiquetas por entrada -> peso
+TAG_FANOUT_WEIGHTS = {0: 35, 1: 30, 2: 20, 3: 10, 5: 4, 8: 1}
+
+SEED_PASSWORD = 'seed-password'
+
+_TITLE_WORDS = (
+    'Shingeki', 'Kyojin', 'Sombra', 'Cielo', 'Hunter', 'Ciudad', 'Dragon', 'Luz', 'Kimetsu', 'Yaiba',
+    'Ghost', 'Tokyo', 'Noche', 'Espada', 'Mar', 'Corazón', 'Steins', 'Gate', 'Frieren', 'Viaje',
+    'Último', 'Reino', 'Piece', 'One', 'Bosque', 'Fuego', 'Código', 'Geass', 'Sueño', 'Cowboy',
+)
+_NOTE_WORDS = (
+    'gran', 'animación', 'final', 'temporada', 'personajes', 'ritmo', 'lento', 'épico', 'recomendado',
+    'banda', 'sonora', 'capítulo', 'arco', 'historia', 'dibujo', 'volver', 'a', 'ver', 'con', 'amigos',
+)
+_TAG_NAMES = (
+    'favoritos', 'rewatch', 'fin de semana', 'clásico', 'acción', 'comedia', 'drama', 'romance',
+    'misterio', 'ciencia ficción', 'fantasía', 'slice of life', 'deportes', 'terror', 'isekai', 'mecha',
+)
+
+
+def _choice(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def _notes(rng):
+    # Casi la mitad sin notas; el resto con una cola larga de notas extensas
+    if rng.random() < 0.45:
+        return ''
+    words = min(int(rng.lognormvariate(3, 1)), 400)
+    return ' '.join(rng.choice(_NOTE_WORDS) for _ in range(max(words, 1)))
+
+
+def _entry(rng, user, index, now):
+    category = _choice(rng, CATEGORY_WEIGHTS)
+    status = _choice(rng, STATUS_WEIGHTS)
+    total = rng.choice((None, 12, 13, 24, 26, 50, 100)) if category in ('anime', 'serie') else None
+    if status == 'terminado' and total:
+        current = total
+    elif status == 'pendiente':
+        current = 0
+    else:
+        current = rng.randint(0, total or 30)
+
+    imported = category in ('anime', 'serie') and rng.random() < 0.7
+    source = 'anilist' if category == 'anime' else 'tvmaze'
+    updated_at = now - timedelta(minutes=rng.randint(0, 60 * 24 * 365))
+    return Entry(
+        user=user,
+        title=f'{rng.choice(_TITLE_WORDS)} {rng.choice(_TITLE_WORDS)} {index}',
+        category=category,
+        status=status,
+        platform=rng.choice(('', 'Crunchyroll', 'Netflix', 'AniList', 'TVMaze')),
+        progress_current=current,
+        progress_total=total,
+        episodes_count=total,
+        rating=rng.choice((None, None, rng.randint(1, 10))),
+        notes=_notes(rng),
+        external_id=str(100000 + index) if imported else '',
+        external_source=source if imported else '',
+        cover_image=f'https://s4.anilist.co/file/anilistcdn/media/anime/cover/large/bx{100000 + index}.jpg'
+        if imported else '',
+        created_at=updated_at - timedelta(days=rng.randint(0, 30)),
+        updated_at=updated_at,
+    )
+
+
+@transaction.atomic
+def seed_library(user, entries=200, tags=12, rng=None):
+    """
+    Crea ``entries`` entradas y ``tags`` etiquetas para ``user``.
+
+    Args:
+        rng: ``random.Random`` a usar (por defecto, uno con semilla fija)
+
+    Returns:
+        Lista de entradas creadas
+    """
+    rng = rng or random.Random(0)
+    now = timezone.now()
+
+    tag_objects = Tag.objects.bulk_create([
+        Tag(user=user, name=f'{_TAG_NAMES[i % len(_TAG_NAMES)]} {i // len(_TAG_NAMES) or ""}'.strip(),
+            color=f'#{rng.randrange(0x1000000):06x}')
+        for i in range(tags)
+    ])
+
+    offset = Entry.objects.filter(user=user).count()
+    built = [_entry(rng, user, offset + i, now) for i in range(entries)]
+    created = Entry.objects.bulk_create(built, batch_size=500)
+    # bulk_create pisa las fechas con auto_now; se restauran las repartidas en el tiempo
+    for entry, original in zip(created, built):
+        entry.updated_at, entry.created_at = original.updated_at, original.created_at
+    Entry.objects.bulk_update(created, ['created_at', 'updated_at'], batch_size=500)
+
+    links = []
+    for entry in created:
+        fanout = min(_choice(rng, TAG_FANOUT_WEIGHTS), len(tag_objects))
+        for tag in rng.sample(tag_objects, fanout):
+            links.append(Entry.tags.through(entry_id=entry.pk, tag_id=tag.pk))
+    Entry.tags.through.objects.bulk_create(links, batch_size=1000)
+
+    record_entries_added(created)
+    bump_library_version([user.pk])
+    return created
+
+
+def seed_users(users=1, entries=200, tags=12, seed=0, prefix='seed'):
+    """
+    Crea ``users`` usuarios con su biblioteca sintética.
+
+    Todos comparten la contraseña ``SEED_PASSWORD`` (hasheada una sola vez).
+
+    Returns:
+        Lista de usuarios creados
+    """
+    rng = random.Random(seed)
+    User = get_user_model()
+    password = make_password(SEED_PASSWORD)
+    start = User.objects.filter(username__startswith=f'{prefix}-').count()
+    created = User.objects.bulk_create([
+        User(username=f'{prefix}-{start + i}', email=f'{prefix}-{start + i}@example.com', password=password)
+        for i in range(users)
+    ])
+    for user in created:
+        seed_library(user, entries=entries, tags=tags, rng=rng)
+    return created
@@ -0,0 +1,71 @@
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+from .bulk_actions import signals_suspended
+from .fragments import bump_library_version
+from .models import Entry, Tag
+from .search import repair_search_index
+from .stats import add_entry_delta, apply_summary_deltas, summary_deltas
+
+
+def _owner_deleted(kwargs) -> bool:
+    """Si el borrado viene en cascada del propio usuario (sus filas de resumen ya no están)"""
+    return isinstance(kwargs.get('origin'), get_user_model())
+
+
+def _remember_db_state(entry):
+    entry._db_state = {field: entry.__dict__.get(field) for field in Entry.SUMMARY_FIELDS}
+
+
+@receiver(post_save, sender=Entry)
+def update_summary_on_save(sender, instance, created, raw=False, **kwargs):
+    """Mantiene LibrarySummary al crear o modificar una entrada"""
+    if raw or signals_suspended():
+        return
+    deltas = summary_deltas()
+    previous = getattr(instance, '_db_state', None)
+    if not created and previous is None:
+        # Instancia que no se leyó de la BD: no sabemos qué restar
+        _remember_db_state(instance)
+        return
+    if not created:
+        add_entry_delta(deltas, instance.user_id, previous, sign=-1)
+    add_entry_delta(deltas, instance.user_id, instance.__dict__)
+    apply_summary_deltas(deltas)
+    _remember_db_state(instance)
+
+
+@receiver(post_delete, sender=Entry)
+def update_summary_on_delete(sender, instance, **kwargs):
+    """Resta la entrada eliminada de LibrarySummary"""
+    if signals_suspended() or _owner_deleted(kwargs):
+        return
+    state = getattr(instance, '_db_state', None)
+    deltas = summary_deltas()
+    add_entry_delta(deltas, instance.user_id, state if state is not None else instance.__dict__, sign=-1)
+    apply_summary_deltas(deltas)
+
+
+@receiver(post_save, sender=Entry)
+@receiver(post_delete, sender=Entry)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def bump_version_on_change(sender, instance, raw=False, **kwargs):
+    """Cualquier cambio en entradas o etiquetas invalida la rejilla cacheada del usuario"""
+    if not raw and not signals_suspended() and not _owner_deleted(kwargs):
+        bump_library_version([instance.user_id])
+
+
+@receiver(m2m_changed, sender=Entry.tags.through)
+def bump_version_on_tags_change(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_library_version([instance.user_id])
+
+
+@receiver(post_migrate)
+def repair_search_index_after_migrate(sender, using, **kwargs):
+    """Las migraciones que recrean la tabla en SQLite se llevan por delante los triggers FTS"""
+    if sender.name == 'entries':
+        repair_search_index(connections[using])
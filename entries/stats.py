@@ -0,0 +1,276 @@
+from collections import Counter, defaultdict
+from typing import Dict, List
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Entry, LibrarySummary
+
+# Columnas acumuladas de LibrarySummary; cada entrada aporta summary_values()
+SUMMARY_SUMS = ('entries_count', 'progress_sum', 'minutes_watched', 'rating_sum', 'rated_count')
+
+
+def library_stats(user):
+    """
+    Totales de la biblioteca de un usuario.
+
+    Con ENTRIES_DENORMALIZED_STATS se leen de LibrarySummary (como mucho una
+    fila por categoría y estado, independiente del tamaño de la biblioteca);
+    si no, se calculan con una única consulta agregada sobre Entry.
+
+    Returns:
+        Dict con 'total', una clave por estado y 'by_category'
+    """
+    if not getattr(settings, 'ENTRIES_DENORMALIZED_STATS', False):
+        return Entry.objects.filter(user=user).stats()
+
+    stats = {'total': 0, 'by_category': {value: 0 for value, _ in Entry.CATEGORY_CHOICES}}
+    for value, _ in Entry.STATUS_CHOICES:
+        stats[value] = 0
+
+    rows = LibrarySummary.objects.filter(user=user).values_list('category', 'status', 'entries_count')
+    for category, status, count in rows:
+        stats['total'] += count
+        stats[status] = stats.get(status, 0) + count
+        stats['by_category'][category] = stats['by_category'].get(category, 0) + count
+    return stats
+
+
+def summary_values(state) -> Dict[str, int]:
+    """
+    Lo que aporta una entrada a su celda de LibrarySummary.
+
+    Los minutos vistos son episodios vistos × duración; una película
+    terminada cuenta su duración aunque no se haya apuntado progreso.
+
+    Args:
+        state: Dict (o ``__dict__`` de la entrada) con los campos de Entry.SUMMARY_FIELDS
+    """
+    progress = state.get('progress_current') or 0
+    duration = state.get('duration_minutes') or 0
+    rating = state.get('rating')
+    if state.get('category') == 'pelicula' and state.get('status') == 'terminado':
+        minutes = duration * max(progress, 1)
+    else:
+        minutes = duration * progress
+    return {
+        'entries_count': 1,
+        'progress_sum': progress,
+        'minutes_watched': minutes,
+        'rating_sum': rating or 0,
+        'rated_count': int(rating is not None),
+    }
+
+
+def summary_deltas():
+    """Acumulador {(user_id, category, status): Counter(columna -> incremento)} para apply_summary_deltas"""
+    return defaultdict(Counter)
+
+
+def add_entry_delta(deltas, user_id, state, sign=1):
+    """Suma (``sign=1``) o resta (``sign=-1``) la aportación de una entrada en ``state``"""
+    cell = deltas[(user_id, state.get('category'), state.get('status'))]
+    for column, value in summary_values(state).items():
+        cell[column] += sign * value
+
+
+def _create_or_increment(user_id, category, status, delta):
+    cell = LibrarySummary.objects.filter(user_id=user_id, category=category, status=status)
+    increment = {column: F(column) + value for column, value in delta.items()}
+    if delta.get('entries_count', 0) <= 0:
+        # Sin entradas que sumar no se crea la celda (quedaría en negativo): o se está
+        # borrando el usuario o el resumen ya estaba desfasado (rebuild_library_stats)
+        cell.update(**increment)
+        return
+    try:
+        with transaction.atomic():
+            LibrarySummary.objects.create(user_id=user_id, category=category, status=status, **delta)
+    except IntegrityError:
+        # Otra petición creó la fila entre medias
+        cell.update(**increment)
+
+
+def apply_summary_deltas(deltas):
+    """
+    Aplica incrementos a LibrarySummary.
+
+    Con una o dos celdas (guardar una entrada) hace un UPDATE por celda; con
+    más (importaciones y acciones en bloque) lee las celdas existentes y las
+    actualiza todas en un único UPDATE con un CASE por columna, así que el
+    coste no crece con el número de celdas.
+
+    Args:
+        deltas: Dict {(user_id, category, status): {columna: incremento}} (ver summary_deltas)
+    """
+    deltas = {
+        key: {column: value for column, value in delta.items() if value}
+        for key, delta in deltas.items()
+        if key[1] is not None and key[2] is not None
+    }
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if len(deltas) <= 2:
+        for (user_id, category, status), delta in deltas.items():
+            cell = LibrarySummary.objects.filter(user_id=user_id, category=category, status=status)
+            if not cell.update(**{column: F(column) + value for column, value in delta.items()}):
+                _create_or_increment(user_id, category, status, delta)
+        return
+
+    user_ids = {user_id for user_id, _, _ in deltas}
+    existing = set(
+        LibrarySummary.objects.filter(user_id__in=user_ids).values_list('user_id', 'category', 'status')
+    )
+    changes = {}
+    for column in SUMMARY_SUMS:
+        whens = [
+            When(user_id=user_id, category=category, status=status, then=Value(delta[column]))
+            for (user_id, category, status), delta in deltas.items()
+            if (user_id, category, status) in existing and delta.get(column)
+        ]
+        if whens:
+            changes[column] = F(column) + Case(*whens, default=Value(0))
+    if changes:
+        LibrarySummary.objects.filter(user_id__in=user_ids).update(**changes)
+    for (user_id, category, status), delta in deltas.items():
+        if (user_id, category, status) not in existing:
+            _create_or_increment(user_id, category, status, delta)
+
+
+def record_entries_added(entries):
+    """Suma al resumen entradas creadas sin pasar por save() (p. ej. bulk_create)"""
+    deltas = summary_deltas()
+    for entry in entries:
+        add_entry_delta(deltas, entry.user_id, entry.__dict__)
+    apply_summary_deltas(deltas)
+
+
+def summary_rows(entries):
+    """Las celdas de LibrarySummary calculadas con una agregación sobre ``entries``"""
+    duration = Coalesce(F('duration_minutes'), Value(0))
+    return entries.order_by().values('user_id', 'category', 'status').annotate(
+        entries_count=Count('id'),
+        progress_sum=Sum('progress_current'),
+        minutes_watched=Sum(Case(
+            When(category='pelicula', status='terminado', then=duration * Greatest(F('progress_current'), Value(1))),
+            default=duration * F('progress_current'),
+        )),
+        rating_sum=Sum(Coalesce(F('rating'), Value(0))),
+        rated_count=Count('rating'),
+    )
+
+
+def rebuild_library_summary(user_ids=None):
+    """
+    Recalcula LibrarySummary desde cero con una agregación sobre Entry.
+
+    Args:
+        user_ids: Usuarios a recalcular (todos si es None)
+
+    Returns:
+        Número de filas de resumen escritas
+    """
+    entries = Entry.objects.all()
+    summaries = LibrarySummary.objects.all()
+    if user_ids is not None:
+        entries = entries.filter(user_id__in=user_ids)
+        summaries = summaries.filter(user_id__in=user_ids)
+
+    with transaction.atomic():
+        summaries.delete()
+        created = LibrarySummary.objects.bulk_create(
+            [LibrarySummary(**row) for row in summary_rows(entries)], batch_size=500,
+        )
+    return len(created)
+
+
+def verify_library_summary(user_ids=None) -> List[Dict]:
+    """
+    Compara LibrarySummary con una agregación completa sobre Entry.
+
+    Una celda a cero equivale a no tenerla (queda así al borrar la última
+    entrada de una categoría/estado).
+
+    Returns:
+        Una diferencia por celda y columna:
+        ``{'user_id', 'category', 'status', 'column', 'expected', 'actual'}``
+    """
+    entries = Entry.objects.all()
+    summaries = LibrarySummary.objects.all()
+    if user_ids is not None:
+        entries = entries.filter(user_id__in=user_ids)
+        summaries = summaries.filter(user_id__in=user_ids)
+
+    def cells(rows):
+        return {(row['user_id'], row['category'], row['status']): row for row in rows}
+
+    expected = cells(summary_rows(entries))
+    actual = cells(summaries.values('user_id', 'category', 'status', *SUMMARY_SUMS))
+    mismatches = []
+    for key in sorted(expected.keys() | actual.keys(), key=str):
+        for column in SUMMARY_SUMS:
+            want = expected.get(key, {}).get(column) or 0
+            got = actual.get(key, {}).get(column) or 0
+            if want != got:
+                user_id, category, status = key
+                mismatches.append({
+                    'user_id': user_id, 'category': category, 'status': status,
+                    'column': column, 'expected': want, 'actual': got,
+                })
+    return mismatches
+
+
+def _ratio(part, whole, digits=1):
+    return round(part / whole, digits) if whole else None
+
+
+def consumption_stats(user):
+    """
+    Estadísticas de consumo de un usuario: horas vistas, progreso, nota media y
+    proporción de terminadas por categoría, nota media por estado y totales.
+
+    Igual que library_stats, salen de LibrarySummary (sin recorrer las
+    entradas) o, sin ENTRIES_DENORMALIZED_STATS, de una agregación sobre Entry.
+    """
+    if getattr(settings, 'ENTRIES_DENORMALIZED_STATS', False):
+        rows = LibrarySummary.objects.filter(user=user).values('category', 'status', *SUMMARY_SUMS)
+    else:
+        rows = summary_rows(Entry.objects.filter(user=user))
+
+    categories = {value: Counter() for value, _ in Entry.CATEGORY_CHOICES}
+    statuses = {value: Counter() for value, _ in Entry.STATUS_CHOICES}
+    totals = Counter()
+    for row in rows:
+        sums = Counter({column: row[column] or 0 for column in SUMMARY_SUMS})
+        categories.setdefault(row['category'], Counter()).update(sums)
+        statuses.setdefault(row['status'], Counter()).update(sums)
+        totals.update(sums)
+        if row['status'] == 'terminado':
+            categories[row['category']]['finished'] += sums['entries_count']
+            totals['finished'] += sums['entries_count']
+
+    def summary(sums):
+        return {
+            'entries': sums['entries_count'],
+            'hours': round(sums['minutes_watched'] / 60, 1),
+            'progress': sums['progress_sum'],
+            'average_rating': _ratio(sums['rating_sum'], sums['rated_count']),
+            'completion_rate': _ratio(100 * sums['finished'], sums['entries_count'], 0),
+        }
+
+    labels = dict(Entry.CATEGORY_CHOICES)
+    status_labels = dict(Entry.STATUS_CHOICES)
+    return {
+        'totals': summary(totals),
+        'by_category': [
+            {'category': category, 'label': labels.get(category, category), **summary(sums)}
+            for category, sums in categories.items() if sums['entries_count']
+        ],
+        'by_status': [
+            {
+                'status': status, 'label': status_labels.get(status, status),
+                'entries': sums['entries_count'], 'average_rating': _ratio(sums['rating_sum'], sums['rated_count']),
+            }
+            for status, sums in statuses.items()
+        ],
+    }
@@ -0,0 +1,11 @@
+from django import template
+
+from entries import covers
+
+register = template.Library()
+
+
+@register.filter
+def cover_url(url, variant='grid'):
+    """``{{ entry.cover_image|cover_url:'detail' }}``: variante local si ya está en caché"""
+    return covers.cover_url(url, variant)
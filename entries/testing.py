@@ -0,0 +1,51 @@
+"""
+Utilidades de test para vigilar el coste en BD de las vistas.
+"""
+import re
+from collections import Counter
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def query_shape(sql: str) -> str:
+    """SQL sin literales: dos consultas con la misma forma suelen ser un N+1"""
+    return _LITERALS.sub('?', sql)
+
+
+def format_queries(queries) -> str:
+    lines = []
+    for number, query in enumerate(queries, 1):
+        lines.append(f'{number:3}. [{float(query["time"]) * 1000:.2f} ms] {query["sql"]}')
+    repeated = [(shape, n) for shape, n in Counter(query_shape(q['sql']) for q in queries).items() if n > 1]
+    if repeated:
+        lines.append('Consultas repetidas (posible N+1):')
+        lines.extend(f'  {n}x {shape}' for shape, n in repeated)
+    return '\n'.join(lines)
+
+
+class QueryBudgetMixin:
+    """
+    ``assertQueryBudget`` para TestCase: el bloque no puede lanzar más de
+    ``max_queries`` consultas ni pasar más de ``max_db_ms`` en la BD. Si se
+    pasa, el fallo lista las consultas con su tiempo y las repetidas.
+    """
+
+    @contextmanager
+    def assertQueryBudget(self, max_queries, max_db_ms=None, using=DEFAULT_DB_ALIAS, label=''):
+        with CaptureQueriesContext(connections[using]) as context:
+            yield context
+
+        queries = context.captured_queries
+        db_ms = sum(float(query['time']) for query in queries) * 1000
+        problems = []
+        if len(queries) > max_queries:
+            problems.append(f'{len(queries)} consultas (máximo {max_queries})')
+        if max_db_ms is not None and db_ms > max_db_ms:
+            problems.append(f'{db_ms:.1f} ms en BD (máximo {max_db_ms} ms)')
+        if problems:
+            prefix = f'{label}: ' if label else ''
+            self.fail(f'{prefix}{", ".join(problems)}\n{format_queries(queries)}')
@@ -1,3 +1,1635 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import httpx
+import requests
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from prometheus_client import REGISTRY
+
+from users.models import User
+
+from . import catalog, circuit, covers, provider_cache, provider_fixtures, transport
+from . import urls as entries_urls
+from .api_services import AniListAPI, TVMazeAPI
+from .management.commands.provider_stub_server import make_server
+from .models import Entry, LibrarySummary, Media, MediaQuery, Tag
+from .bulk_actions import BULK_ACTION_MAX_IDS
+from .exports import aiter_export, iter_export
+from .importers import bulk_import
+from .list_imports import import_list
+from .pagination import KeysetPaginator
+from .progress import MAX_PROGRESS_DELTA, increment_progress
+from .provider_cache import acached_call, cache_key, cached_call, normalize_query
+from .refresh import REFRESH_FIELDS, refresh_anilist_entries
+from .search import search_entries
+from .seeding import seed_library, seed_users
+from .stats import consumption_stats, library_stats, verify_library_summary
+from .testing import QueryBudgetMixin
+
+
+class EntryQueryPlanTests(TestCase):
+    """Las consultas calientes sobre Entry deben resolverse con índices, no con un scan completo."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('planner', 'planner@example.com', 'x')
+        for i in range(20):
+            Entry.objects.create(
+                user=cls.user,
+                title=f'Título {i}',
+                category='anime' if i % 2 else 'serie',
+                status='en_curso' if i % 3 else 'pendiente',
+                external_id=str(i),
+                external_source='anilist',
+            )
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            # Con tablas diminutas el planificador prefiere el seq scan aunque haya índice
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+
+    def assertNoFullScan(self, queryset, table='entries'):
+        plan = queryset.explain()
+        if connection.vendor == 'sqlite':
+            # 'SEARCH' usa el índice para acotar filas; 'SCAN' recorre la tabla (o un índice) entero
+            full_scan = re.search(rf'\bSCAN {table}\b', plan) is not None
+            sorts_in_memory = 'USE TEMP B-TREE FOR ORDER BY' in plan
+        elif connection.vendor == 'postgresql':
+            full_scan = f'Seq Scan on {table}' in plan
+            sorts_in_memory = False
+        else:
+            self.skipTest(f'Sin comprobación de planes para {connection.vendor}')
+        self.assertFalse(full_scan, f'Scan completo de {table}:\n{plan}\n\nSQL: {queryset.query}')
+        self.assertFalse(sorts_in_memory, f'Ordenación sin índice:\n{plan}\n\nSQL: {queryset.query}')
+
+    def test_list_first_page(self):
+        paginator = KeysetPaginator(Entry.objects.filter(user=self.user))
+        self.assertNoFullScan(paginator.queryset[:49])
+
+    def test_list_deep_page(self):
+        paginator = KeysetPaginator(Entry.objects.filter(user=self.user), per_page=5)
+        cursor = paginator.page().next_cursor
+        queryset = paginator.queryset.filter(paginator._after(paginator.decode_cursor(cursor)))
+        self.assertNoFullScan(queryset[:6])
+        if connection.vendor == 'sqlite':
+            # La página profunda debe arrancar en el cursor, no recorrer las anteriores
+            self.assertIn('updated_at<?', queryset[:6].explain())
+
+    def test_list_filtered_by_status(self):
+        paginator = KeysetPaginator(Entry.objects.filter(user=self.user, status='en_curso'))
+        self.assertNoFullScan(paginator.queryset[:49])
+
+    def test_list_filtered_by_category(self):
+        paginator = KeysetPaginator(Entry.objects.filter(user=self.user, category='anime'))
+        self.assertNoFullScan(paginator.queryset[:49])
+
+    def test_import_duplicate_lookup(self):
+        queryset = Entry.objects.filter(user=self.user).imported('anilist', '7').only('id')
+        self.assertNoFullScan(queryset)
+
+    def test_stats_aggregate(self):
+        self.assertNoFullScan(Entry.objects.filter(user=self.user).order_by())
+
+    def test_summary_lookup(self):
+        queryset = LibrarySummary.objects.filter(user=self.user)
+        self.assertNoFullScan(queryset, table='library_summary')
+
+
+class SearchIndexTests(TestCase):
+    """El índice de texto completo sigue a Entry al editar y borrar, sin reconstruirlo a mano."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('indexer', 'indexer@example.com', 'x')
+        self.entry = Entry.objects.create(user=self.user, title='Cowboy Bebop', category='anime')
+
+    def found(self, query):
+        return list(search_entries(Entry.objects.filter(user=self.user), query).values_list('id', flat=True))
+
+    def assertIndexInSync(self):
+        if connection.vendor != 'sqlite':
+            return
+        # FTS5 compara el índice con la tabla de contenido y falla si se han separado
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO entries_fts(entries_fts) VALUES ('integrity-check')")
+
+    def test_title_update_moves_the_match(self):
+        self.assertEqual(self.found('bebop'), [self.entry.id])
+
+        self.entry.title = 'Trigun'
+        self.entry.save()
+        self.assertEqual(self.found('bebop'), [])
+        self.assertEqual(self.found('trigun'), [self.entry.id])
+
+        Entry.objects.filter(id=self.entry.id).update(title='Planetes')
+        self.assertEqual(self.found('trigun'), [])
+        self.assertEqual(self.found('planetes'), [self.entry.id])
+        self.assertIndexInSync()
+
+    def test_delete_removes_the_row_from_the_index(self):
+        entry_id = self.entry.id
+        self.entry.delete()
+        self.assertEqual(self.found('bebop'), [])
+        self.assertIndexInSync()
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT rowid FROM entries_fts WHERE entries_fts MATCH 'bebop'")
+                self.assertNotIn((entry_id,), cursor.fetchall())
+
+
+# Consultas máximas y milisegundos de BD por vista, con una biblioteca de
+# 300 entradas. Cada ruta de entries/urls.py debe tener al menos una.
+# Las peticiones autenticadas pagan siempre 2 (sesión y usuario).
+VIEW_BUDGETS = {
+    'entry_list': (4, 50),
+    'entry_list:cached': (3, 20),
+    'entry_list:search': (4, 50),
+    'entry_list_page': (3, 50),
+    'entry_detail': (5, 20),
+    'entry_detail_json': (4, 20),
+    'entry_update_json': (7, 30),
+    'entry_update': (5, 20),
+    'entry_update:post': (12, 40),
+    'entry_delete': (3, 20),
+    'entry_delete:post': (10, 40),
+    'tag_list': (4, 30),
+    'tag_list:post': (4, 20),
+    'search_anime_page': (2, 10),
+    # Búsqueda guardada en el catálogo + fichas y búsquedas nuevas (dos upserts en una transacción)
+    'search_anime': (7, 20),
+    'search_anime:catalog': (4, 10),
+    'import_anime': (7, 30),
+    # Fichas del catálogo + duplicados + inserción en una transacción
+    'import_anime_bulk': (9, 40),
+    'cover_image': (0, 5),
+    # Bloqueo de la fila + UPDATE con F() + versión (+ dos celdas del resumen si cambia el estado)
+    'entry_progress': (9, 20),
+    # Bloqueo de filas + un UPDATE/DELETE + resumen (lectura y un UPDATE, más las celdas
+    # nuevas) + versión, sea cual sea el número de ids
+    'entry_bulk': (12, 40),
+    'entry_bulk:delete': (11, 40),
+    # Por lote de list_imports.BATCH_SIZE títulos, como import_anime_bulk pero con
+    # un UPDATE de LibrarySummary por cada par categoría/estado del lote
+    'import_list': (10, 40),
+    # Sesión + usuario y, por cada bloque de CHUNK_SIZE entradas, las entradas y sus etiquetas
+    'entry_export': (4, 60),
+    # Sesión + usuario + las celdas de LibrarySummary del usuario
+    'stats_dashboard': (3, 20),
+}
+
+
+# Exportación de MyAnimeList para las pruebas de import_list
+MAL_EXPORT = '''<?xml version="1.0" encoding="UTF-8" ?>
+<myanimelist>
+  <myinfo><user_name>tester</user_name></myinfo>
+  <anime>
+    <series_animedb_id>1</series_animedb_id>
+    <series_title><![CDATA[Cowboy Bebop]]></series_title>
+    <series_episodes>26</series_episodes>
+    <my_watched_episodes>26</my_watched_episodes>
+    <my_score>9</my_score>
+    <my_status>Completed</my_status>
+  </anime>
+  <anime>
+    <series_animedb_id>5</series_animedb_id>
+    <series_title><![CDATA[Cowboy Bebop: Tengoku no Tobira]]></series_title>
+    <my_status>Plan to Watch</my_status>
+  </anime>
+  <anime>
+    <series_animedb_id></series_animedb_id>
+    <series_title>Sin id</series_title>
+  </anime>
+  <manga>
+    <manga_mangadb_id>1</manga_mangadb_id>
+    <manga_title><![CDATA[Berserk]]></manga_title>
+    <manga_chapters>0</manga_chapters>
+    <my_read_chapters>120</my_read_chapters>
+    <my_status>Reading</my_status>
+  </manga>
+</myanimelist>
+'''
+
+
+@override_settings(COVER_CACHE={'ENABLED': False, 'ALLOWED_HOSTS': [], 'MAX_BYTES': 0})
+class ViewQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Ninguna vista puede crecer en consultas (N+1) o tiempo de BD sin que falle un test."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('budget', 'budget@example.com', 'x')
+        seed_library(cls.user, entries=300, tags=16)
+        # Otro usuario con biblioteca, para que los filtros por usuario importen
+        seed_library(User.objects.create_user('other', 'other@example.com', 'x'), entries=100, tags=4)
+        cls.entry = Entry.objects.filter(user=cls.user).order_by('-updated_at').first()
+        cls.entry.tags.set(Tag.objects.filter(user=cls.user)[:3])
+
+    def setUp(self):
+        caches['fragments'].clear()
+        self.client.force_login(self.user)
+        # Recargar: la versión de la biblioteca cambia al tocar las etiquetas
+        self.user.refresh_from_db()
+
+    def request(self, budget, method, url, data=None, **extra):
+        max_queries, max_db_ms = VIEW_BUDGETS[budget]
+        with self.assertQueryBudget(max_queries, max_db_ms, label=f'{budget} {method.upper()} {url}'):
+            return getattr(self.client, method)(url, data, **extra)
+
+    def post_json(self, budget, url, payload):
+        return self.request(budget, 'post', url, json.dumps(payload), content_type='application/json')
+
+    def test_every_route_has_a_budget(self):
+        budgeted = {name.split(':')[0] for name in VIEW_BUDGETS}
+        routes = {pattern.name for pattern in entries_urls.urlpatterns}
+        self.assertEqual(routes - budgeted, set(), 'Rutas sin presupuesto de consultas')
+
+    def test_entry_list(self):
+        response = self.request('entry_list', 'get', reverse('entry_list'))
+        self.assertEqual(response.status_code, 200)
+        # Segunda visita: rejilla desde la caché de fragmentos, sin consultar Entry
+        response = self.request('entry_list:cached', 'get', reverse('entry_list'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_entry_list_filters_and_search(self):
+        self.request('entry_list', 'get', reverse('entry_list'), {'status': 'terminado', 'category': 'anime'})
+        response = self.request('entry_list:search', 'get', reverse('entry_list'), {'search': 'sombra'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_entry_list_page(self):
+        cursor = self.client.get(reverse('entry_list')).context['next_cursor']
+        caches['fragments'].clear()
+        response = self.request('entry_list_page', 'get', reverse('entry_list_page'), {'cursor': cursor})
+        self.assertEqual(response.json()['count'], 48)
+
+    def test_entry_detail(self):
+        response = self.request('entry_detail', 'get', reverse('entry_detail', args=[self.entry.pk]))
+        self.assertContains(response, self.entry.tags.first().name)
+
+    def test_entry_detail_json(self):
+        response = self.request('entry_detail_json', 'get', reverse('entry_detail_json', args=[self.entry.pk]))
+        self.assertEqual(response.json()['id'], self.entry.pk)
+
+    def test_entry_update_json(self):
+        response = self.post_json(
+            'entry_update_json', reverse('entry_update_json', args=[self.entry.pk]),
+            {'status': 'terminado', 'progress_current': 3},
+        )
+        self.assertEqual(response.json(), {'success': True})
+
+    def test_entry_update(self):
+        url = reverse('entry_update', args=[self.entry.pk])
+        self.request('entry_update', 'get', url)
+        tags = list(Tag.objects.filter(user=self.user).values_list('pk', flat=True)[:2])
+        response = self.request('entry_update:post', 'post', url, {
+            'status': 'en_curso', 'progress_current': 2, 'notes': 'Notas', 'tags': tags,
+        })
+        self.assertEqual(response.status_code, 302)
+
+    def test_entry_delete(self):
+        url = reverse('entry_delete', args=[self.entry.pk])
+        self.request('entry_delete', 'get', url)
+        response = self.request('entry_delete:post', 'post', url)
+        self.assertEqual(response.status_code, 302)
+
+    def test_entry_progress(self):
+        entry = Entry.objects.create(
+            user=self.user, title='Progreso', category='anime', status='pendiente', progress_total=3,
+        )
+        url = reverse('entry_progress', args=[entry.pk])
+        # Primero cambia el estado (dos celdas del resumen), luego solo el progreso
+        self.assertEqual(self.post_json('entry_progress', url, {}).json()['status'], 'en_curso')
+        self.assertEqual(self.post_json('entry_progress', url, {}).json()['progress_current'], 2)
+
+    def test_entry_bulk(self):
+        # Mismo número de consultas sea cual sea el número de ids
+        ids = list(Entry.objects.filter(user=self.user).exclude(status='terminado').values_list('pk', flat=True)[:50])
+        response = self.post_json('entry_bulk', reverse('entry_bulk'), {
+            'ids': ids, 'action': 'update', 'patch': {'status': 'terminado', 'rating': 8},
+        })
+        self.assertEqual(response.json()['updated'], 50)
+        response = self.post_json('entry_bulk:delete', reverse('entry_bulk'), {'ids': ids, 'action': 'delete'})
+        self.assertEqual(response.json()['deleted'], 50)
+
+    def test_tag_list(self):
+        response = self.request('tag_list', 'get', reverse('tag_list'))
+        self.assertEqual(len(response.context['tags']), 16)
+        response = self.request('tag_list:post', 'post', reverse('tag_list'), {'name': 'nueva', 'color': '#000000'})
+        self.assertEqual(response.status_code, 302)
+
+    def test_search(self):
+        self.request('search_anime_page', 'get', reverse('search_anime_page'))
+        # Resultados de proveedor ya en caché: la vista no sale a la red
+        results = [{'external_id': '1', 'title': 'Frieren', 'source': 'anilist'}]
+        cached_call('anilist', 'search', (normalize_query('frieren'), 8), lambda: results)
+        cached_call('tvmaze', 'search', (normalize_query('frieren'), 8), lambda: [])
+        response = self.request('search_anime', 'get', reverse('search_anime'), {'q': 'frieren'})
+        self.assertEqual(len(response.json()['results']), 1)
+        # Segunda búsqueda: AniList sale del catálogo local sin pasar por su caché. TVMaze
+        # no devolvió nada, así que no se guardó y vuelve a su caché
+        caches['providers'].clear()
+        cached_call('tvmaze', 'search', (normalize_query('frieren'), 8), lambda: [])
+        response = self.request('search_anime:catalog', 'get', reverse('search_anime'), {'q': 'Frieren '})
+        self.assertEqual([item['title'] for item in response.json()['results']], ['Frieren'])
+
+    def test_import_anime(self):
+        response = self.post_json('import_anime', reverse('import_anime'), {
+            'anime': {'external_id': '999001', 'title': 'Nuevo', 'source': 'anilist'},
+        })
+        self.assertTrue(response.json()['success'])
+
+    def test_import_anime_bulk(self):
+        items = [{'external_id': str(999100 + i), 'title': f'Nuevo {i}', 'source': 'anilist'} for i in range(50)]
+        response = self.post_json('import_anime_bulk', reverse('import_anime_bulk'), {'items': items})
+        self.assertEqual(response.json()['created'], 50)
+
+    def test_entry_export(self):
+        url = reverse('entry_export', args=['csv'])
+        # El cuerpo se genera al leerlo: el presupuesto cubre todo el streaming
+        with self.assertQueryBudget(*VIEW_BUDGETS['entry_export'], label=f'entry_export GET {url}'):
+            response = self.client.get(url)
+            rows = list(csv.DictReader(line.decode() for line in response.streaming_content))
+        self.assertEqual(len(rows), 300)
+
+    def test_import_list(self):
+        upload = SimpleUploadedFile('animelist.xml', MAL_EXPORT.encode(), content_type='text/xml')
+        # El cuerpo se genera al leerlo: el presupuesto cubre toda la importación
+        with self.assertQueryBudget(*VIEW_BUDGETS['import_list'], label='import_list POST'):
+            response = self.client.post(reverse('import_list'), {'file': upload})
+            events = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(events[-1]['event'], 'done')
+
+    def test_cover_image(self):
+        response = self.request('cover_image', 'get', reverse('cover_image', args=['0' * 64, 'grid']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_stats_dashboard(self):
+        response = self.request('stats_dashboard', 'get', reverse('stats_dashboard'))
+        self.assertEqual(response.context['stats']['totals']['entries'], 300)
+        with self.settings(ENTRIES_DENORMALIZED_STATS=False):
+            self.assertEqual(consumption_stats(self.user), response.context['stats'])
+
+
+class ImportAnimeTests(TestCase):
+    """Un resultado de búsqueda mal formado se rechaza con 400 (o como error del elemento), nunca con 500."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('import_anime', 'import_anime@example.com', 'x')
+        self.client.force_login(self.user)
+
+    def post(self, name, payload):
+        return self.client.post(reverse(name), json.dumps(payload), content_type='application/json')
+
+    def test_missing_source_defaults_to_anilist(self):
+        response = self.post('import_anime', {'anime': {'external_id': '1', 'title': 'Frieren', 'source': None}})
+        self.assertTrue(response.json()['success'])
+        self.assertEqual(Entry.objects.get(user=self.user).external_source, 'anilist')
+
+    def test_non_text_fields_are_rejected(self):
+        for field, value in (('source', 7), ('source', ['anilist']), ('url', 1), ('cover_image', {}),
+                             ('description', 3)):
+            item = {'external_id': '1', 'title': 'Frieren', 'source': 'anilist', field: value}
+            response = self.post('import_anime', {'anime': item})
+            self.assertEqual(response.status_code, 400, field)
+            self.assertEqual(response.json(), {'error': f'{field} inválido'})
+        self.assertFalse(Entry.objects.filter(user=self.user).exists())
+
+    def test_bulk_reports_the_bad_item_and_imports_the_rest(self):
+        response = self.post('import_anime_bulk', {'items': [
+            {'external_id': '1', 'title': 'Frieren', 'source': 'anilist'},
+            {'external_id': '2', 'title': 'Roto', 'source': 42},
+        ]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['created'], 1)
+        self.assertEqual(response.json()['results'][1], {'index': 1, 'status': 'error', 'error': 'source inválido'})
+        self.assertEqual(list(Entry.objects.filter(user=self.user).values_list('title', flat=True)), ['Frieren'])
+
+
+class ExportTests(TestCase):
+    """La exportación incluye todas las entradas del usuario (y solo las suyas) con sus etiquetas."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('exporter', 'exporter@example.com', 'x')
+        self.bebop = Entry.objects.create(
+            user=self.user, title='Cowboy Bebop', category='anime', status='terminado',
+            progress_current=26, progress_total=26, rating=9, notes='Ver, otra vez "pronto"',
+        )
+        self.bebop.tags.set([
+            Tag.objects.create(user=self.user, name='space'),
+            Tag.objects.create(user=self.user, name='jazz'),
+        ])
+        self.monster = Entry.objects.create(user=self.user, title='Monster', category='manga')
+        Entry.objects.create(user=User.objects.create_user('other', 'other@example.com', 'x'), title='Ajena',
+                             category='anime')
+        self.client.force_login(self.user)
+
+    def download(self, fmt):
+        response = self.client.get(reverse('entry_export', args=[fmt]))
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_csv(self):
+        response, body = self.download('csv')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertRegex(response['Content-Disposition'], r'^attachment; filename="mylist-exporter-\d{8}\.csv"$')
+        self.assertEqual(response['Cache-Control'], 'private, no-store')
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual([row['title'] for row in rows], ['Cowboy Bebop', 'Monster'])
+        self.assertEqual(rows[0]['tags'], 'jazz, space')
+        self.assertEqual(rows[0]['notes'], 'Ver, otra vez "pronto"')
+        self.assertEqual((rows[0]['rating'], rows[1]['rating']), ('9', ''))
+
+    def test_jsonl(self):
+        response, body = self.download('jsonl')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        lines = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([line['id'] for line in lines], [self.bebop.pk, self.monster.pk])
+        self.assertEqual((lines[0]['tags'], lines[1]['tags']), (['jazz', 'space'], []))
+        self.assertEqual((lines[0]['progress_total'], lines[1]['progress_total']), (26, None))
+
+    def test_unknown_format(self):
+        self.assertEqual(self.client.get(reverse('entry_export', args=['xml'])).status_code, 404)
+
+    def test_chunks_do_not_change_the_output(self):
+        self.assertEqual(list(iter_export(self.user, 'jsonl', chunk_size=1)), list(iter_export(self.user, 'jsonl')))
+
+        async def collect():
+            return [line async for line in aiter_export(self.user, 'csv', chunk_size=1)]
+        self.assertEqual(async_to_sync(collect)(), list(iter_export(self.user, 'csv')))
+
+    def test_command(self):
+        output = tempfile.NamedTemporaryFile(suffix='.csv', delete=False)
+        output.close()
+        self.addCleanup(os.remove, output.name)
+        err = io.StringIO()
+        call_command('export_library', 'exporter', '--output', output.name, '--chunk-size', '1', stderr=err)
+        self.assertIn('2 entradas exportadas', err.getvalue())
+        with open(output.name, encoding='utf-8', newline='') as f:
+            self.assertEqual(f.read(), ''.join(iter_export(self.user, 'csv')))
+        with self.assertRaises(CommandError):
+            call_command('export_library', 'nadie')
+
+
+@override_settings(COVER_CACHE={'ENABLED': False, 'ALLOWED_HOSTS': [], 'MAX_BYTES': 0})
+class ListImportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('importer', 'importer@example.com', 'x')
+
+    def import_file(self, content, fmt):
+        return list(import_list(self.user, io.BytesIO(content.encode()), fmt))[-1]
+
+    def test_mal_export_through_the_view(self):
+        existing = Entry.objects.create(
+            user=self.user, title='Ya estaba', category='anime', external_source='myanimelist', external_id='5',
+        )
+        self.client.force_login(self.user)
+        upload = SimpleUploadedFile('animelist.xml', MAL_EXPORT.encode(), content_type='text/xml')
+        response = self.client.post(reverse('import_list'), {'file': upload})
+        events = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(events[-1]['event'], 'done')
+        self.assertEqual((events[-1]['created'], events[-1]['exists'], events[-1]['failed']), (2, 1, 1))
+
+        entries = Entry.objects.filter(user=self.user).exclude(pk=existing.pk)
+        self.assertEqual(
+            sorted(entries.values_list('title', 'category', 'status', 'progress_current', 'progress_total', 'rating')),
+            [('Berserk', 'manga', 'en_curso', 120, None, None), ('Cowboy Bebop', 'anime', 'terminado', 26, 26, 9)],
+        )
+        self.assertEqual(verify_library_summary([self.user.pk]), [])
+
+    def test_mal_anime_and_manga_ids_do_not_collide(self):
+        # MAL numera anime y manga por separado: el anime 1 y el manga 1 son obras distintas
+        anime = """<myanimelist><anime>
+          <series_animedb_id>1</series_animedb_id><series_title>Cowboy Bebop</series_title>
+          <my_status>Completed</my_status>
+        </anime></myanimelist>"""
+        manga = """<myanimelist><manga>
+          <manga_mangadb_id>1</manga_mangadb_id><manga_title>Monster</manga_title>
+          <my_status>Reading</my_status>
+        </manga></myanimelist>"""
+        self.assertEqual(self.import_file(anime, 'mal')['created'], 1)
+        done = self.import_file(manga, 'mal')
+        self.assertEqual((done['created'], done['exists']), (1, 0))
+        self.assertEqual(
+            sorted(Entry.objects.filter(user=self.user).values_list('title', 'external_source', 'external_link')),
+            [('Cowboy Bebop', 'myanimelist', 'https://myanimelist.net/anime/1'),
+             ('Monster', 'myanimelist_manga', 'https://myanimelist.net/manga/1')],
+        )
+        # Reimportar el mismo manga sí es un duplicado
+        self.assertEqual(self.import_file(manga, 'mal')['exists'], 1)
+
+    def test_anilist_scores(self):
+        entries = [
+            {'media': {'id': 1, 'title': {'romaji': 'Diez'}}, 'score': 7},
+            {'media': {'id': 2, 'title': {'romaji': 'Cien'}}, 'score': 80},
+            {'media': {'id': 3, 'title': {'romaji': 'Sin nota'}}, 'score': 0},
+        ]
+        export = json.dumps({'lists': [{'entries': entries}]})
+        self.assertEqual(self.import_file(export, 'anilist')['created'], 3)
+        self.assertEqual(
+            dict(Entry.objects.filter(user=self.user).values_list('title', 'rating')),
+            {'Diez': 7, 'Cien': 8, 'Sin nota': None},
+        )
+
+
+class BulkActionTests(TestCase):
+    """Las acciones en bloque solo tocan entradas del usuario, validan los cambios y mantienen el resumen."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('bulk', 'bulk@example.com', 'x')
+        self.tag = Tag.objects.create(user=self.user, name='favoritas')
+        self.entries = [
+            Entry.objects.create(user=self.user, title=f'Entrada {i}', category='anime', status='pendiente')
+            for i in range(4)
+        ]
+        for entry in self.entries:
+            entry.tags.add(self.tag)
+        self.ids = [entry.pk for entry in self.entries[:3]]
+        self.other = Entry.objects.create(
+            user=User.objects.create_user('bulk_other', 'bulk_other@example.com', 'x'),
+            title='Ajena', category='anime', status='pendiente',
+        )
+        self.client.force_login(self.user)
+
+    def post(self, payload):
+        return self.client.post(reverse('entry_bulk'), json.dumps(payload), content_type='application/json')
+
+    def assertSummaryMatches(self):
+        self.assertEqual(library_stats(self.user), Entry.objects.filter(user=self.user).stats())
+        self.assertEqual(verify_library_summary(), [])
+
+    def test_update(self):
+        updated_at = Entry.objects.get(pk=self.ids[0]).updated_at
+        response = self.post({
+            'ids': self.ids + [self.other.pk], 'action': 'update', 'patch': {'status': 'terminado', 'rating': 8},
+        })
+        self.assertEqual(response.json(), {'success': True, 'updated': 3, 'missing': [self.other.pk]})
+        self.assertEqual(
+            sorted(Entry.objects.filter(user=self.user).values_list('status', 'rating')),
+            [('pendiente', None)] + [('terminado', 8)] * 3,
+        )
+        self.other.refresh_from_db()
+        self.assertEqual((self.other.status, self.other.rating), ('pendiente', None))
+        # updated_at cambia: las tarjetas cacheadas no sirven la versión vieja
+        self.assertGreater(Entry.objects.get(pk=self.ids[0]).updated_at, updated_at)
+        self.assertSummaryMatches()
+
+    def test_update_outside_the_summary(self):
+        response = self.post({'ids': self.ids, 'action': 'update', 'patch': {'progress_current': 5}})
+        self.assertEqual(response.json()['updated'], 3)
+        self.assertEqual(Entry.objects.filter(pk__in=self.ids, progress_current=5).count(), 3)
+        self.assertSummaryMatches()
+
+    def test_delete(self):
+        response = self.post({'ids': self.ids + [self.other.pk], 'action': 'delete'})
+        self.assertEqual(response.json(), {'success': True, 'deleted': 3, 'missing': [self.other.pk]})
+        self.assertEqual(list(Entry.objects.filter(user=self.user)), [self.entries[3]])
+        self.assertTrue(Entry.objects.filter(pk=self.other.pk).exists())
+        self.assertFalse(Entry.tags.through.objects.filter(entry_id__in=self.ids).exists())
+        self.assertSummaryMatches()
+
+    def test_invalid_requests(self):
+        invalid = [
+            {'ids': self.ids, 'action': 'update', 'patch': {'user': 1}},
+            {'ids': self.ids, 'action': 'update', 'patch': {'title': 'Nuevo'}},
+            {'ids': self.ids, 'action': 'update', 'patch': {'status': 'otro'}},
+            {'ids': self.ids, 'action': 'update', 'patch': {'rating': 11}},
+            {'ids': self.ids, 'action': 'update', 'patch': {'rating': True}},
+            {'ids': self.ids, 'action': 'update', 'patch': {'progress_current': -1}},
+            {'ids': self.ids, 'action': 'update', 'patch': {}},
+            {'ids': [], 'action': 'delete'},
+            {'ids': ['x'], 'action': 'delete'},
+            {'ids': list(range(1, BULK_ACTION_MAX_IDS + 2)), 'action': 'delete'},
+            {'ids': self.ids, 'action': 'archive'},
+            [self.ids],
+        ]
+        for payload in invalid:
+            self.assertEqual(self.post(payload).status_code, 400, payload)
+        response = self.client.post(reverse('entry_bulk'), 'no es json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(reverse('entry_bulk')).status_code, 405)
+        self.assertEqual(Entry.objects.filter(user=self.user, status='pendiente').count(), 4)
+
+
+class ProgressTests(TestCase):
+    """"+N episodios" suma en la BD, acota al total y mueve el estado igual que lo predice la vista."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('progress', 'progress@example.com', 'x')
+        self.entry = Entry.objects.create(
+            user=self.user, title='Progreso', category='anime', status='pendiente', progress_total=3,
+        )
+        self.client.force_login(self.user)
+
+    def post(self, entry, payload):
+        return self.client.post(reverse('entry_progress', args=[entry.pk]), json.dumps(payload),
+                                content_type='application/json')
+
+    def test_increments_until_finished_and_back(self):
+        response = self.post(self.entry, {})
+        self.assertEqual(response.json(), {
+            'success': True, 'progress_current': 1, 'progress_total': 3, 'status': 'en_curso',
+        })
+        response = self.post(self.entry, {'delta': 5})
+        self.assertEqual((response.json()['progress_current'], response.json()['status']), (3, 'terminado'))
+        self.entry.refresh_from_db()
+        self.assertEqual((self.entry.progress_current, self.entry.status), (3, 'terminado'))
+        response = self.post(self.entry, {'delta': -1})
+        self.assertEqual((response.json()['progress_current'], response.json()['status']), (2, 'en_curso'))
+        self.assertEqual(library_stats(self.user), Entry.objects.filter(user=self.user).stats())
+        self.assertEqual(verify_library_summary([self.user.pk]), [])
+
+    def test_update_matches_the_prediction(self):
+        # El UPDATE con F() y la respuesta (calculada en Python) tienen que coincidir en todos los casos
+        for status in ('pendiente', 'en_curso', 'terminado', 'abandonado'):
+            for current, total in ((0, None), (0, 0), (2, 12), (12, 12), (5, None)):
+                for delta in (1, 3, -1, -20, 20):
+                    entry = Entry.objects.create(
+                        user=self.user, title='Caso', category='anime', status=status,
+                        progress_current=current, progress_total=total,
+                    )
+                    result = increment_progress(self.user, entry.pk, delta)
+                    entry.refresh_from_db()
+                    case = (status, current, total, delta)
+                    self.assertEqual((entry.progress_current, entry.status),
+                                     (result['progress_current'], result['status']), case)
+                    self.assertGreaterEqual(entry.progress_current, 0, case)
+                    if total:
+                        self.assertLessEqual(entry.progress_current, total, case)
+        self.assertEqual(verify_library_summary([self.user.pk]), [])
+
+    def test_invalid_requests(self):
+        for delta in (0, True, 'x', None, MAX_PROGRESS_DELTA + 1):
+            self.assertEqual(self.post(self.entry, {'delta': delta}).status_code, 400, delta)
+        response = self.client.post(reverse('entry_progress', args=[self.entry.pk]), 'no es json',
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(reverse('entry_progress', args=[self.entry.pk])).status_code, 405)
+        self.entry.refresh_from_db()
+        self.assertEqual(self.entry.progress_current, 0)
+
+    def test_other_users_entries_are_not_found(self):
+        other = Entry.objects.create(
+            user=User.objects.create_user('progress_other', 'progress_other@example.com', 'x'),
+            title='Ajena', category='anime',
+        )
+        self.assertEqual(self.post(other, {}).status_code, 404)
+        other.refresh_from_db()
+        self.assertEqual(other.progress_current, 0)
+
+
+class ConsumptionStatsTests(TestCase):
+    """Las sumas de LibrarySummary siguen a las entradas en cada escritura y cuadran con una agregación completa."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('viewer', 'viewer@example.com', 'x')
+        self.client.force_login(self.user)
+
+    def assertSummaryMatches(self):
+        self.assertEqual(verify_library_summary(), [])
+
+    def test_sums_follow_writes(self):
+        movie = Entry.objects.create(
+            user=self.user, title='Película', category='pelicula', status='terminado', duration_minutes=120, rating=8,
+        )
+        series = Entry.objects.create(
+            user=self.user, title='Serie', category='anime', status='en_curso',
+            progress_current=4, progress_total=12, duration_minutes=24, rating=6,
+        )
+        self.assertSummaryMatches()
+        cell = LibrarySummary.objects.get(user=self.user, category='anime', status='en_curso')
+        self.assertEqual((cell.progress_sum, cell.minutes_watched, cell.rating_sum, cell.rated_count), (4, 96, 6, 1))
+
+        self.client.post(reverse('entry_progress', args=[series.pk]), '{"delta": 2}', content_type='application/json')
+        movie.rating = 10
+        movie.save()
+        self.assertSummaryMatches()
+        stats = consumption_stats(self.user)
+        # 120 min de la película (terminada sin progreso cuenta una vez) + 6 × 24 min
+        self.assertEqual(stats['totals']['hours'], 4.4)
+        self.assertEqual(stats['totals']['average_rating'], 8.0)
+        self.assertEqual(stats['totals']['completion_rate'], 50)
+        by_status = {row['status']: row for row in stats['by_status']}
+        self.assertEqual(by_status['terminado']['average_rating'], 10.0)
+        self.assertIsNone(by_status['pendiente']['average_rating'])
+
+        self.client.post(reverse('entry_bulk'), json.dumps({
+            'ids': [movie.pk, series.pk], 'action': 'update', 'patch': {'rating': None},
+        }), content_type='application/json')
+        self.assertSummaryMatches()
+        self.assertIsNone(consumption_stats(self.user)['totals']['average_rating'])
+
+        self.client.post(reverse('entry_delete', args=[series.pk]))
+        self.assertFalse(Entry.objects.filter(pk=series.pk).exists())
+        self.assertSummaryMatches()
+        self.assertEqual(consumption_stats(self.user)['totals']['hours'], 2.0)
+
+    def test_command_verifies_and_rebuilds(self):
+        Entry.objects.create(user=self.user, title='Serie', category='serie', progress_current=3, duration_minutes=40)
+        LibrarySummary.objects.filter(user=self.user).update(minutes_watched=1)
+        out, err = io.StringIO(), io.StringIO()
+        with self.assertRaises(CommandError):
+            call_command('rebuild_library_stats', '--verify', stdout=out, stderr=err)
+        self.assertIn('minutes_watched: esperado 120, guardado 1', err.getvalue())
+
+        call_command('rebuild_library_stats', '--user', str(self.user.pk), stdout=out, stderr=err)
+        self.assertIn('coincide', out.getvalue())
+        self.assertSummaryMatches()
+
+
+class LibrarySummarySignalTests(TransactionTestCase):
+    """Con commits reales: las claves foráneas se comprueban al confirmar, no al final del test."""
+
+    def test_deleting_user_with_entries(self):
+        user = User.objects.create_user('leaving', 'leaving@example.com', 'x')
+        Entry.objects.create(user=user, title='Uno', category='anime', status='en_curso', progress_current=2)
+        Entry.objects.create(user=user, title='Dos', category='serie', status='terminado', rating=7)
+        keep = User.objects.create_user('staying', 'staying@example.com', 'x')
+        Entry.objects.create(user=keep, title='Tres', category='anime', status='en_curso')
+
+        user.delete()
+        self.assertFalse(LibrarySummary.objects.filter(user_id=user.pk).exists())
+        self.assertEqual(verify_library_summary(), [])
+
+
+class BenchmarkCommandTests(TestCase):
+    @override_settings(ALLOWED_HOSTS=['mylist.example.com'])
+    def test_existing_db(self):
+        seed_users(2, entries=15, tags=3, prefix='bench')
+        out = io.StringIO()
+        call_command(
+            'benchmark', '--existing-db', '--prefix', 'bench', '--scenario', 'entry_list',
+            '--requests', '3', '--warmup', '0', stdout=out,
+        )
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['scenarios']['entry_list']['errors'], 0)
+        self.assertGreater(report['total']['queries_per_request'], 0)
+        self.assertEqual(report['library'], {'users': 2, 'entries_per_user': 15, 'tags_per_user': 3})
+
+    def test_cold_rejected_with_base_url(self):
+        with self.assertRaises(CommandError):
+            call_command('benchmark', '--base-url', 'http://127.0.0.1:8000', '--cold')
+
+
+class RefreshAniListTests(TestCase):
+    """El refresco pide AniList en páginas de 50 ids y escribe solo episodios, total y portada."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user('refresh_a', 'refresh_a@example.com', 'x')
+        cls.bob = User.objects.create_user('refresh_b', 'refresh_b@example.com', 'x')
+        # 120 títulos distintos (3 páginas); el 1 y el 2 también están en la biblioteca de bob
+        Entry.objects.bulk_create(
+            Entry(user=cls.alice, title=f'Anime {anilist_id}', category='anime',
+                  external_source='anilist', external_id=str(anilist_id), episodes_count=12)
+            for anilist_id in range(1, 121)
+        )
+        Entry.objects.create(user=cls.bob, title='Anime 1', category='anime', external_source='anilist',
+                             external_id='1', episodes_count=12, progress_total=12)
+        Entry.objects.create(user=cls.bob, title='Anime 2', category='anime', external_source='anilist',
+                             external_id='2', episodes_count=12, progress_total=13)
+
+    def setUp(self):
+        self.fetched = []
+
+    def fetch_media_batch(self, failing=()):
+        def fetch(ids):
+            self.fetched.append(list(ids))
+            if set(ids) & set(failing):
+                raise requests.exceptions.ConnectionError('AniList caído')
+            return {str(anilist_id): {'episodes': 24, 'cover_image': f'https://img.example.com/{anilist_id}.jpg'}
+                    for anilist_id in ids}
+        return mock.patch.object(AniListAPI, 'fetch_media_batch', side_effect=fetch)
+
+    def versions(self):
+        return {user.username: user.library_version for user in User.objects.filter(pk__in=[self.alice.pk, self.bob.pk])}
+
+    def test_ids_are_fetched_in_batches_of_fifty(self):
+        with self.fetch_media_batch():
+            summary = refresh_anilist_entries()
+        self.assertEqual([len(batch) for batch in self.fetched], [AniListAPI.MAX_IDS_PER_QUERY] * 2 + [20])
+        self.assertEqual(sorted(sum(self.fetched, [])), list(range(1, 121)))
+        self.assertEqual(summary, {'ids': 120, 'requests': 3, 'updated': 122, 'failed': 0})
+
+    def test_progress_total_follows_episodes_unless_edited(self):
+        with self.fetch_media_batch():
+            refresh_anilist_entries(ids=[1, 2])
+        totals = dict(Entry.objects.filter(user=self.bob).values_list('external_id', 'progress_total'))
+        # Sin tocar (igual a los episodios) sigue a AniList; el 13 lo puso el usuario
+        self.assertEqual(totals, {'1': 24, '2': 13})
+        alice_entry = Entry.objects.get(user=self.alice, external_id='1')
+        self.assertEqual((alice_entry.episodes_count, alice_entry.progress_total), (24, 24))
+        self.assertEqual(alice_entry.cover_image, 'https://img.example.com/1.jpg')
+
+    def test_failed_batch_does_not_stop_the_others(self):
+        with self.fetch_media_batch(failing=[60]), self.assertLogs('entries.refresh', 'WARNING'):
+            summary = refresh_anilist_entries()
+        self.assertEqual(len(self.fetched), 3)
+        self.assertEqual(summary['failed'], 50)
+        self.assertEqual(summary['updated'], 72)
+        self.assertEqual(Entry.objects.get(user=self.alice, external_id='60').episodes_count, 12)
+        self.assertEqual(Entry.objects.get(user=self.alice, external_id='101').episodes_count, 24)
+
+    def test_bulk_update_writes_only_refresh_fields(self):
+        entry = Entry.objects.get(user=self.alice, external_id='1')
+        # Cambio hecho por otro lado mientras corre el refresco: no se debe pisar
+        Entry.objects.filter(pk=entry.pk).update(notes='nota nueva', title='Título editado')
+        with self.fetch_media_batch(), \
+                mock.patch.object(Entry.objects, 'bulk_update', wraps=Entry.objects.bulk_update) as bulk_update:
+            refresh_anilist_entries(ids=[1])
+        self.assertEqual([call.args[1] for call in bulk_update.call_args_list], [REFRESH_FIELDS])
+        entry.refresh_from_db()
+        self.assertEqual((entry.title, entry.notes, entry.episodes_count), ('Título editado', 'nota nueva', 24))
+
+    def test_library_version_bumps_only_for_changed_libraries(self):
+        before = self.versions()
+        with self.fetch_media_batch():
+            refresh_anilist_entries(ids=[3])
+        after = self.versions()
+        self.assertEqual(after['refresh_a'], before['refresh_a'] + 1)
+        self.assertEqual(after['refresh_b'], before['refresh_b'])
+
+        # Sin cambios que escribir no hay subida
+        with self.fetch_media_batch():
+            summary = refresh_anilist_entries(ids=[3])
+        self.assertEqual(summary['updated'], 0)
+        self.assertEqual(self.versions(), after)
+
+    def test_command_reports_the_summary(self):
+        out, err = io.StringIO(), io.StringIO()
+        with self.fetch_media_batch(failing=[2]), self.assertLogs('entries.refresh', 'WARNING'):
+            call_command('refresh_anilist', '--id', '1', '--id', '2', '--id', '3',
+                         '--batch-size', '2', stdout=out, stderr=err)
+        self.assertEqual(self.fetched, [[1, 2], [3]])
+        self.assertIn('AniList: 3 títulos en 2 peticiones, 1 entradas actualizadas', out.getvalue())
+        self.assertIn('2 títulos no se pudieron refrescar', err.getvalue())
+
+
+@override_settings(COVER_CACHE={'ENABLED': False, 'ALLOWED_HOSTS': [], 'MAX_BYTES': 0})
+class ConditionalGetTests(TestCase):
+    """El navegador revalida la lista y el detalle con ETag/Last-Modified y recibe 304 mientras nada cambie."""
+
+    def setUp(self):
+        caches['fragments'].clear()
+        self.user = User.objects.create_user('conditional', 'conditional@example.com', 'x')
+        self.entry = Entry.objects.create(
+            user=self.user, title='Frieren', category='anime', status='en_curso', progress_current=1, progress_total=28,
+        )
+        self.tag = Tag.objects.create(user=self.user, name='fantasía')
+        self.client.force_login(self.user)
+        self.urls = [
+            reverse('entry_list'), reverse('entry_list_page'),
+            reverse('entry_detail', args=[self.entry.pk]), reverse('entry_detail_json', args=[self.entry.pk]),
+        ]
+
+    def etags(self):
+        etags = {}
+        for url in self.urls:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            etags[url] = response['ETag']
+        return etags
+
+    def assertNotModified(self, etags):
+        for url, etag in etags.items():
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304, url)
+
+    def assertModified(self, etags):
+        for url, etag in etags.items():
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertNotEqual(response['ETag'], etag, url)
+
+    def test_not_modified_until_something_changes(self):
+        etags = self.etags()
+        self.assertNotModified(etags)
+
+        self.client.post(
+            reverse('entry_update_json', args=[self.entry.pk]), json.dumps({'notes': 'Muy buena'}),
+            content_type='application/json',
+        )
+        self.assertModified(etags)
+        etags = self.etags()
+        self.assertNotModified(etags)
+
+        self.entry.tags.add(self.tag)
+        self.assertModified(etags)
+        etags = self.etags()
+
+        self.client.post(reverse('entry_progress', args=[self.entry.pk]), '{}', content_type='application/json')
+        self.assertModified(etags)
+
+    def test_if_modified_since(self):
+        for url in self.urls[2:]:
+            last_modified = self.client.get(url)['Last-Modified']
+            self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304, url)
+
+    def test_validators_are_per_user(self):
+        etags = self.etags()
+        self.client.force_login(User.objects.create_user('someone', 'someone@example.com', 'x'))
+        self.assertEqual(self.client.get(self.urls[0], HTTP_IF_NONE_MATCH=etags[self.urls[0]]).status_code, 200)
+        self.assertEqual(self.client.get(self.urls[3], HTTP_IF_NONE_MATCH=etags[self.urls[3]]).status_code, 404)
+
+    def test_pending_messages_skip_304_on_pages(self):
+        # El borrado deja un mensaje flash que la lista tiene que pintar
+        other = Entry.objects.create(user=self.user, title='Otra', category='serie')
+        self.assertEqual(self.client.post(reverse('entry_delete', args=[other.pk])).status_code, 302)
+        # La página JSON comparte validador con la lista y no consume los mensajes
+        etag = self.client.get(self.urls[1])['ETag']
+        self.assertEqual(self.client.get(self.urls[0], HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(self.client.get(self.urls[0], HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+@override_settings(COVER_CACHE={'ENABLED': False, 'ALLOWED_HOSTS': [], 'MAX_BYTES': 0})
+class FragmentCacheTests(TestCase):
+    """La rejilla cacheada por versión de la biblioteca nunca muestra entradas editadas, borradas o sin sus etiquetas."""
+
+    def setUp(self):
+        caches['fragments'].clear()
+        self.user = User.objects.create_user('fragments', 'fragments@example.com', 'x')
+        self.entry = Entry.objects.create(
+            user=self.user, title='Frieren', category='anime', status='en_curso', progress_current=7, progress_total=28,
+        )
+        self.other = Entry.objects.create(user=self.user, title='Mushishi', category='anime')
+        self.client.force_login(self.user)
+
+    def grid_misses(self):
+        return REGISTRY.get_sample_value(
+            'mylist_cache_requests_total', {'cache': 'fragment_grid', 'result': 'miss'},
+        ) or 0
+
+    def render_list(self):
+        """Tarjetas que pinta /entries/ (sin los mensajes flash, que repiten títulos)"""
+        response = self.client.get(reverse('entry_list'))
+        self.assertEqual(response.status_code, 200)
+        return str(response.context['cards_html'])
+
+    def assertGridRebuilt(self):
+        before = self.grid_misses()
+        html = self.render_list()
+        self.assertEqual(self.grid_misses(), before + 1)
+        # Y la siguiente vuelve a salir de la caché
+        self.render_list()
+        self.assertEqual(self.grid_misses(), before + 1)
+        return html
+
+    def test_cached_grid_is_reused(self):
+        self.render_list()
+        before = self.grid_misses()
+        self.assertIn('Frieren', self.render_list())
+        self.assertEqual(self.grid_misses(), before)
+
+    def test_edit_shows_up(self):
+        self.render_list()
+        self.entry.title = 'Sousou no Frieren'
+        self.entry.progress_current = 14
+        self.entry.save()
+        html = self.assertGridRebuilt()
+        self.assertIn('Sousou no Frieren', html)
+        self.assertIn('50%', html)
+
+    def test_edit_through_the_view_shows_up(self):
+        self.render_list()
+        response = self.client.post(reverse('entry_progress', args=[self.entry.pk]), '{}',
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('29%', self.assertGridRebuilt())
+
+    def test_delete_shows_up(self):
+        self.assertIn('Mushishi', self.render_list())
+        self.assertEqual(self.client.post(reverse('entry_delete', args=[self.other.pk])).status_code, 302)
+        html = self.assertGridRebuilt()
+        self.assertNotIn('Mushishi', html)
+        self.assertIn('Frieren', html)
+
+    def test_tag_changes_rebuild_the_grid(self):
+        tag = Tag.objects.create(user=self.user, name='fantasía')
+        self.render_list()
+        self.entry.tags.add(tag)
+        self.assertGridRebuilt()
+        tag.entries.remove(self.entry)
+        self.assertGridRebuilt()
+        self.entry.tags.add(tag)
+        self.render_list()
+        self.entry.tags.clear()
+        self.assertGridRebuilt()
+
+
+@override_settings(COVER_CACHE={'ENABLED': True, 'ALLOWED_HOSTS': ['s4.anilist.co'], 'MAX_BYTES': 1024 * 1024})
+class CoverCacheTests(TestCase):
+    URL = 'https://s4.anilist.co/file/anilistcdn/media/anime/cover/large/bx1.png'
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        covers._known.clear()
+        self.addCleanup(covers._known.clear)
+        self.user = User.objects.create_user('covers', 'covers@example.com', 'x')
+        Entry.objects.create(user=self.user, title='Cowboy Bebop', category='anime', cover_image=self.URL)
+
+    @staticmethod
+    def png(size=(800, 1200)):
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.new('RGB', size, (200, 40, 40)).save(buffer, 'PNG')
+        return buffer.getvalue()
+
+    def test_fetch_stores_webp_variants_served_as_immutable(self):
+        from PIL import Image
+
+        digest = covers.cover_digest(self.URL)
+        self.assertEqual(covers.cover_url(self.URL, 'grid', fetch=False), self.URL)
+        version = self.user.library_version
+        # La descarga real sale a la red; el resto (variantes, storage, invalidación) es el de verdad
+        with mock.patch.object(covers, '_download', return_value=self.png()), \
+                mock.patch.object(covers, 'close_old_connections'):
+            covers._fetch(self.URL, digest)
+        self.user.refresh_from_db()
+        self.assertGreater(self.user.library_version, version)
+
+        for variant, box in covers.COVER_VARIANTS.items():
+            url = covers.cover_url(self.URL, variant)
+            self.assertEqual(url, reverse('cover_image', args=[digest, variant]))
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'image/webp')
+            self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+            with Image.open(io.BytesIO(b''.join(response.streaming_content))) as image:
+                self.assertEqual(image.format, 'WEBP')
+                self.assertEqual(image.size, box)
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+
+    def test_missing_covers_are_remembered_for_a_while(self):
+        with mock.patch.object(covers.default_storage, 'exists', return_value=False) as exists:
+            for _ in range(3):
+                self.assertEqual(covers.cover_url(self.URL, 'grid', fetch=False), self.URL)
+            self.assertEqual(exists.call_count, 1)
+            with mock.patch.object(covers, 'MISSING_TTL', 0):
+                covers._known.clear()
+                covers.cover_url(self.URL, 'grid', fetch=False)
+                covers.cover_url(self.URL, 'grid', fetch=False)
+            self.assertEqual(exists.call_count, 3)
+
+    def test_known_covers_are_bounded(self):
+        with mock.patch.object(covers, 'AVAILABILITY_MAX_ENTRIES', 2), \
+                mock.patch.object(covers.default_storage, 'exists', return_value=True):
+            for n in range(3):
+                self.assertTrue(covers.is_cached(covers.cover_digest(f'{self.URL}?{n}')))
+        self.assertEqual(list(covers._known), [covers.cover_digest(f'{self.URL}?{n}') for n in (1, 2)])
+
+
+@override_settings(METRICS_TOKEN='metrics-token', COVER_CACHE={'ENABLED': False, 'ALLOWED_HOSTS': [], 'MAX_BYTES': 0})
+class MetricsEndpointTests(TestCase):
+    def test_requires_token_or_staff(self):
+        self.assertEqual(self.client.get('/metrics/').status_code, 401)
+        self.assertEqual(self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer otro').status_code, 401)
+        self.client.force_login(User.objects.create_user('viewer', 'viewer@example.com', 'x'))
+        self.assertEqual(self.client.get('/metrics/').status_code, 401)
+
+    def test_exposes_view_latency_and_cache_counters(self):
+        self.client.force_login(User.objects.create_user('ops', 'ops@example.com', 'x', is_staff=True))
+        self.client.get(reverse('entry_list'))
+        self.client.get(reverse('entry_list'))
+        body = self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer metrics-token').content.decode()
+        self.assertIn('mylist_view_duration_seconds_count{method="GET",status="2xx",view="entry_list"}', body)
+        self.assertIn('mylist_cache_requests_total{cache="fragment_grid",result="hit"}', body)
+
+
+class MediaCatalogTests(TestCase):
+    RESULTS = [
+        {'external_id': '154587', 'title': 'Sousou no Frieren', 'episodes': 28, 'genres': ['Fantasy'], 'source': 'anilist'},
+        {'external_id': '170068', 'title': 'Frieren: Mini Anime', 'episodes': None, 'source': 'anilist'},
+    ]
+
+    def search(self, results, query='frieren'):
+        calls = []
+
+        async def fetch_anilist():
+            calls.append('anilist')
+            return results
+
+        async def fetch_tvmaze():
+            calls.append('tvmaze')
+            return []
+
+        found = async_to_sync(catalog.asearch)(query, 8, {'anilist': fetch_anilist, 'tvmaze': fetch_tvmaze})
+        return found, calls
+
+    def test_fresh_search_is_answered_from_the_catalog(self):
+        found, calls = self.search(self.RESULTS)
+        self.assertEqual(calls, ['anilist', 'tvmaze'])
+        self.assertEqual(Media.objects.count(), 2)
+
+        found, calls = self.search([], query='  FRIEREN')
+        # TVMaze no devolvió nada: no se guarda y se vuelve a preguntar
+        self.assertEqual(calls, ['tvmaze'])
+        self.assertEqual([item['external_id'] for item in found['anilist']], ['154587', '170068'])
+        self.assertEqual(found['anilist'][0]['genres'], ['Fantasy'])
+        self.assertEqual(found['tvmaze'], [])
+
+    def test_stale_search_goes_to_the_provider_and_falls_back_to_the_catalog(self):
+        self.search(self.RESULTS)
+        MediaQuery.objects.update(fetched_at=timezone.now() - timedelta(days=30))
+
+        found, calls = self.search(self.RESULTS[:1] + [{**self.RESULTS[1], 'episodes': 12}])
+        self.assertIn('anilist', calls)
+        self.assertEqual(Media.objects.get(external_id='170068').episodes, 12)
+
+        MediaQuery.objects.update(fetched_at=timezone.now() - timedelta(days=30))
+        found, calls = self.search([])
+        self.assertIn('anilist', calls)
+        self.assertEqual(len(found['anilist']), 2)
+
+    def test_imports_link_the_catalog_media(self):
+        self.search(self.RESULTS)
+        user = User.objects.create_user('catalog', 'catalog@example.com', 'x')
+        results = bulk_import(user, self.RESULTS + [{'external_id': '1', 'title': 'Otro', 'source': 'anilist'}])
+        media = dict(Entry.objects.filter(pk__in=[r['entry_id'] for r in results]).values_list('external_id', 'media__title'))
+        self.assertEqual(media, {'154587': 'Sousou no Frieren', '170068': 'Frieren: Mini Anime', '1': None})
+
+
+
+ANILIST_SEARCH_BODY = {'data': {'Page': {'media': [{
+    'id': 1, 'title': {'romaji': 'Cowboy Bebop', 'english': 'Cowboy Bebop', 'native': ''},
+    'description': '', 'coverImage': {'large': '', 'medium': ''}, 'episodes': 26, 'studios': {'nodes': []},
+}]}}}
+TVMAZE_SEARCH_BODY = [{'show': {'id': 7, 'name': 'Bebop'}}]
+
+
+def transport_settings(mode, fixtures_dir, **overrides):
+    return {'MODE': mode, 'FIXTURES_DIR': fixtures_dir, 'LATENCY_MS': 0, 'JITTER_MS': 0,
+            'ERROR_RATE': 0, 'SEED': 0, **overrides}
+
+
+def save_bebop_fixtures(fixtures_dir):
+    """Fixtures de la búsqueda 'bebop' (límite 8) en AniList y TVMaze"""
+    anilist_key = provider_fixtures.fixture_key('anilist', 'POST', '/', body={
+        'query': AniListAPI.SEARCH_QUERY, 'variables': {'search': 'bebop', 'perPage': 8},
+    })
+    tvmaze_key = provider_fixtures.fixture_key('tvmaze', 'GET', '/search/shows', {'q': 'bebop'})
+    for provider, key, body in (('anilist', anilist_key, ANILIST_SEARCH_BODY),
+                                ('tvmaze', tvmaze_key, TVMAZE_SEARCH_BODY)):
+        provider_fixtures.save(provider, key, {}, 200, 'application/json', json.dumps(body).encode(),
+                               directory=fixtures_dir)
+
+
+class ProviderReplayTests(SimpleTestCase):
+    """Fixtures servidos por provider_stub_server, grabados a través de él y reproducidos sin red."""
+
+    def setUp(self):
+        self.stub_dir = tempfile.mkdtemp()
+        self.record_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.stub_dir)
+        self.addCleanup(shutil.rmtree, self.record_dir)
+        caches['providers'].clear()
+        self.addCleanup(caches['providers'].clear)
+        provider_fixtures.reset_injector()
+        self.addCleanup(provider_fixtures.reset_injector)
+        # Los errores inyectados no deben abrir circuitos para otros tests
+        circuit.reset()
+        self.addCleanup(circuit.reset)
+        save_bebop_fixtures(self.stub_dir)
+
+    def start_stub(self, **overrides):
+        server = make_server('127.0.0.1', 0, transport_settings('replay', self.stub_dir, **overrides), verbosity=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        base = f'http://127.0.0.1:{server.server_port}'
+        return {'anilist': f'{base}/anilist', 'tvmaze': f'{base}/tvmaze'}
+
+    def search(self):
+        return AniListAPI.search_anime('Bebop', limit=8), TVMazeAPI.search_shows('Bebop', limit=8)
+
+    def test_record_through_stub_then_replay_offline(self):
+        with override_settings(PROVIDER_BASE_URLS=self.start_stub(),
+                               PROVIDER_TRANSPORT=transport_settings('record', self.record_dir)):
+            anime, shows = self.search()
+        self.assertEqual([item['title'] for item in anime], ['Cowboy Bebop'])
+        self.assertEqual([item['title'] for item in shows], ['Bebop'])
+
+        caches['providers'].clear()
+        with override_settings(PROVIDER_TRANSPORT=transport_settings('replay', self.record_dir)):
+            self.assertEqual(self.search(), (anime, shows))
+            # Sin fixture falla como un error de conexión: sin resultados
+            self.assertEqual(AniListAPI.search_anime('otra cosa', limit=8), [])
+
+    def test_injected_errors_are_retried_like_real_ones(self):
+        with override_settings(PROVIDER_BASE_URLS=self.start_stub(ERROR_RATE=1),
+                               PROVIDER_HTTP={**settings.PROVIDER_HTTP, 'RETRIES': 0}):
+            self.assertEqual(self.search(), ([], []))
+
+        provider_fixtures.reset_injector()
+        with override_settings(PROVIDER_TRANSPORT=transport_settings('replay', self.stub_dir, ERROR_RATE=1),
+                               PROVIDER_HTTP={**settings.PROVIDER_HTTP, 'RETRIES': 0}):
+            self.assertEqual(self.search(), ([], []))
+
+    def test_async_calls_under_wsgi_reuse_the_session_pool(self):
+        # Cada vista async bajo WSGI corre en un bucle nuevo de async_to_sync: un
+        # AsyncClient por bucle no reutilizaría nada y quedaría sin cerrar.
+        # Proveedor propio del test: su Session (y su pool) no la toca nadie más
+        url = self.start_stub()['anilist']
+        body = {'query': AniListAPI.SEARCH_QUERY, 'variables': {'search': 'bebop', 'perPage': 8}}
+
+        async def search(variables=body['variables']):
+            response = await transport.arequest('reuse-check', 'POST', url, json={**body, 'variables': variables})
+            return response.json()
+
+        pools = transport.get_session('reuse-check').get_adapter(url).poolmanager.pools
+        with override_settings(SERVER_MODE='wsgi'), \
+                mock.patch.object(transport, 'get_async_client', side_effect=AssertionError('AsyncClient bajo WSGI')):
+            first, second = async_to_sync(search)(), async_to_sync(search)()
+            with self.assertRaises(httpx.HTTPStatusError):
+                async_to_sync(search)({'search': 'sin fixture', 'perPage': 8})
+        self.assertEqual(first, ANILIST_SEARCH_BODY)
+        self.assertEqual(first, second)
+        # Las tres llamadas abrieron una sola conexión con el stub
+        self.assertEqual(sum(pools[key].num_connections for key in pools.keys()), 1)
+
+    def test_async_calls_under_asgi_reuse_the_loop_client(self):
+        async def search_twice():
+            results = [await AniListAPI._afetch_search('bebop', 8) for _ in range(2)]
+            client = transport.get_async_client('anilist')
+            connections = len(client._transport._pool.connections)
+            await client.aclose()
+            # Un refresco en segundo plano corre en un bucle propio: sin AsyncClient
+            with transport.short_lived_loop(), \
+                    mock.patch.object(transport, 'get_async_client', side_effect=AssertionError('AsyncClient')):
+                results.append(await AniListAPI._afetch_search('bebop', 8))
+            return results, connections
+
+        with override_settings(PROVIDER_BASE_URLS=self.start_stub(), SERVER_MODE='asgi'):
+            results, connections = async_to_sync(search_twice)()
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[0], results[2])
+        self.assertEqual(connections, 1)
+
+    def test_replay_streamed_request(self):
+        # covers._download pide con stream=True y lee con iter_content
+        url = 'https://s4.anilist.co/file/cover.png'
+        content = bytes(range(256)) * 1024
+        key = provider_fixtures.key_for('covers', 'GET', url, {})
+        provider_fixtures.save('covers', key, {}, 200, 'image/png', content, directory=self.stub_dir)
+        cover_cache = {'ENABLED': True, 'ALLOWED_HOSTS': ['s4.anilist.co'], 'MAX_BYTES': len(content)}
+        with override_settings(PROVIDER_TRANSPORT=transport_settings('replay', self.stub_dir), COVER_CACHE=cover_cache):
+            self.assertEqual(covers._download(url), content)
+
+
+@override_settings(COVER_CACHE={'ENABLED': False, 'ALLOWED_HOSTS': [], 'MAX_BYTES': 0})
+class ServerTimingTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('timed', 'timed@example.com', 'x'))
+        fixtures_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, fixtures_dir)
+        caches['providers'].clear()
+        self.addCleanup(caches['providers'].clear)
+        circuit.reset()
+        self.addCleanup(circuit.reset)
+        save_bebop_fixtures(fixtures_dir)
+        self.transport = transport_settings('replay', fixtures_dir)
+
+    def timings(self, response):
+        """{métrica: (duración, descripción)} de la cabecera Server-Timing"""
+        timings = {}
+        for metric in response['Server-Timing'].split(', '):
+            name, *params = metric.split(';')
+            params = dict(param.split('=', 1) for param in params)
+            timings[name] = (float(params['dur']), params.get('desc', '').strip('"'))
+        return timings
+
+    @override_settings(PROFILING={'ENABLED': True, 'SAMPLE_RATE': 1})
+    def test_header_and_log_when_enabled(self):
+        with self.assertLogs('entries.profiling', 'INFO') as logs:
+            response = self.client.get(reverse('entry_list'))
+        timings = self.timings(response)
+        self.assertEqual(set(timings), {'db', 'provider', 'tpl', 'total'})
+        self.assertRegex(timings['db'][1], r'^[1-9]\d* queries$')
+        self.assertEqual(timings['provider'], (0, '0 calls'))
+        self.assertGreater(timings['tpl'][0], 0)
+        self.assertGreaterEqual(timings['total'][0], timings['db'][0])
+        logged = json.loads(logs.records[-1].getMessage())
+        self.assertEqual((logged['view'], logged['status']), ('entry_list', 200))
+
+        # Vista async: las llamadas a proveedores se cuentan aunque corran en otro hilo
+        with override_settings(PROVIDER_TRANSPORT=self.transport), self.assertLogs('entries.profiling', 'INFO'):
+            response = self.client.get(reverse('search_anime'), {'q': 'bebop'})
+        self.assertEqual(len(response.json()['results']), 2)
+        self.assertEqual(self.timings(response)['provider'][1], '2 calls')
+
+    def test_no_header_when_disabled_or_not_sampled(self):
+        with override_settings(PROFILING={'ENABLED': False, 'SAMPLE_RATE': 1}):
+            self.assertNotIn('Server-Timing', self.client.get(reverse('entry_list')))
+        self.client = self.client_class()
+        self.client.force_login(User.objects.get(username='timed'))
+        with override_settings(PROFILING={'ENABLED': True, 'SAMPLE_RATE': 0}):
+            self.assertNotIn('Server-Timing', self.client.get(reverse('entry_list')))
+
+
+class ProviderCacheTests(SimpleTestCase):
+    """Valores frescos, caducados que se refrescan en segundo plano y límite de tamaño de la caché."""
+
+    def setUp(self):
+        caches['providers'].clear()
+        self.refreshes = []
+        real_submit = provider_cache._refresh_pool.submit
+
+        def submit(*args):
+            self.refreshes.append(real_submit(*args))
+            return self.refreshes[-1]
+
+        patcher = mock.patch.object(provider_cache._refresh_pool, 'submit', side_effect=submit)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fetcher(self, *values):
+        """fetch que devuelve ``values`` en orden (o los lanza si son excepciones) y cuenta las llamadas"""
+        return mock.Mock(side_effect=list(values))
+
+    def cached_value(self):
+        """Lo guardado para la búsqueda de prueba, sin pasar por cached_call (que lanzaría otro refresco)"""
+        return caches['providers'].get(cache_key('anilist', 'search', 'frieren', 8))['value']
+
+    def wait_for_refreshes(self):
+        for future in self.refreshes:
+            future.result(timeout=5)
+
+    def test_fresh_value_is_served_without_calling_the_provider(self):
+        fetch = self.fetcher(['Frieren'], ['Otro'])
+        self.assertEqual(cached_call('anilist', 'search', ('frieren', 8), fetch), ['Frieren'])
+        self.assertEqual(cached_call('anilist', 'search', ('frieren', 8), fetch), ['Frieren'])
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(self.refreshes, [])
+
+    @override_settings(PROVIDER_CACHE_TTLS={'anilist': 0})
+    def test_stale_value_is_served_and_refreshed_in_the_background(self):
+        fetch = self.fetcher(['Frieren'], ['Frieren 2'])
+        cached_call('anilist', 'search', ('frieren', 8), fetch)
+
+        # Caducado al instante (TTL 0): se sirve el valor viejo y se refresca una sola vez
+        self.assertEqual(cached_call('anilist', 'search', ('frieren', 8), fetch), ['Frieren'])
+        self.assertEqual(len(self.refreshes), 1)
+        self.wait_for_refreshes()
+        self.assertEqual(fetch.call_count, 2)
+        self.assertEqual(self.cached_value(), ['Frieren 2'])
+
+    @override_settings(PROVIDER_CACHE_TTLS={'anilist': 0})
+    def test_stale_value_survives_a_failed_refresh(self):
+        fetch = self.fetcher(['Frieren'], httpx.ConnectError('caído'), ['Frieren 2'])
+        cached_call('anilist', 'search', ('frieren', 8), fetch)
+
+        with self.assertLogs('entries.provider_cache', 'WARNING'):
+            self.assertEqual(cached_call('anilist', 'search', ('frieren', 8), fetch), ['Frieren'])
+            self.wait_for_refreshes()
+        # El fallo libera el bloqueo del refresco: la siguiente lectura lo vuelve a intentar
+        self.assertEqual(cached_call('anilist', 'search', ('frieren', 8), fetch), ['Frieren'])
+        self.wait_for_refreshes()
+        self.assertEqual(fetch.call_count, 3)
+        self.assertEqual(self.cached_value(), ['Frieren 2'])
+
+    def test_max_entries_evicts_the_least_recently_used(self):
+        small = {
+            **settings.CACHES,
+            'providers': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'providers-eviction-test',
+                'OPTIONS': {'MAX_ENTRIES': 4, 'CULL_FREQUENCY': 2},
+            },
+        }
+        with override_settings(CACHES=small):
+            fetch = mock.Mock(side_effect=lambda: ['valor'])
+            for query in ('a', 'b', 'c', 'd'):
+                cached_call('anilist', 'search', (query, 8), fetch)
+            # Leer 'a' la pone al final de la cola LRU
+            cached_call('anilist', 'search', ('a', 8), fetch)
+            cached_call('anilist', 'search', ('e', 8), fetch)
+            self.assertEqual(fetch.call_count, 5)
+
+            cache = caches['providers']
+            kept = {query for query in 'abcde' if cache.get(cache_key('anilist', 'search', query, 8)) is not None}
+            self.assertEqual(kept, {'a', 'd', 'e'})
+            cache.clear()
+
+
+class ProviderSingleFlightTests(SimpleTestCase):
+    """Peticiones idénticas simultáneas comparten una sola llamada al proveedor."""
+
+    def setUp(self):
+        caches['providers'].clear()
+
+    def coalesced(self, scope='process'):
+        return REGISTRY.get_sample_value(
+            'mylist_provider_coalesced_total', {'provider': 'anilist', 'scope': scope},
+        ) or 0
+
+    def test_concurrent_threads_share_one_call(self):
+        callers = 6
+        before = self.coalesced()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            # Se responde cuando el resto ya está esperando esta llamada
+            deadline = time.monotonic() + 5
+            while self.coalesced() - before < callers - 1 and time.monotonic() < deadline:
+                time.sleep(0.005)
+            return ['Frieren']
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(cached_call('anilist', 'search', ('frieren', 8), fetch)))
+            for _ in range(callers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [['Frieren']] * callers)
+
+    def test_concurrent_coroutines_share_one_call_and_its_error(self):
+        before = self.coalesced()
+        calls = []
+
+        async def afetch():
+            calls.append(1)
+            while self.coalesced() - before < 3:
+                await asyncio.sleep(0.005)
+            raise ConnectionError('caído')
+
+        async def search():
+            return await asyncio.gather(
+                *(acached_call('anilist', 'search', ('bebop', 8), afetch) for _ in range(4)),
+                return_exceptions=True,
+            )
+
+        results = async_to_sync(asyncio.wait_for)(search(), 5)
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(isinstance(result, ConnectionError) for result in results))
+        # El fallo no se queda pegado: la siguiente petición vuelve a llamar
+        self.assertEqual(async_to_sync(acached_call)('anilist', 'search', ('bebop', 8), self.ok), ['ok'])
+
+    async def ok(self):
+        return ['ok']
+
+    def test_cross_worker_lock_waits_for_the_other_workers_result(self):
+        cache = caches['providers']
+        key = cache_key('anilist', 'search', 'naruto', 8)
+        flight = {'CROSS_WORKER': True, 'LOCK_SECONDS': 5, 'WAIT_SECONDS': 5, 'POLL_INTERVAL': 0.01}
+        before = self.coalesced('workers')
+        # Otro worker tiene el bloqueo y publica el resultado un poco después
+        cache.add(f'{key}:fetch', 1, 5)
+        timer = threading.Timer(0.1, lambda: cache.set(key, {'value': ['Naruto'], 'fresh_until': time.time() + 60}))
+        timer.start()
+        self.addCleanup(timer.cancel)
+        with override_settings(PROVIDER_SINGLE_FLIGHT=flight):
+            value = cached_call('anilist', 'search', ('naruto', 8), lambda: self.fail('No debía llamar'))
+        self.assertEqual(value, ['Naruto'])
+        self.assertEqual(self.coalesced('workers') - before, 1)
+
+        # Si el otro worker suelta el bloqueo sin resultado, se llama sin esperar más
+        cache.clear()
+        cache.add(f'{key}:fetch', 1, 5)
+        threading.Timer(0.05, lambda: cache.delete(f'{key}:fetch')).start()
+        with override_settings(PROVIDER_SINGLE_FLIGHT=flight):
+            self.assertEqual(cached_call('anilist', 'search', ('naruto', 8), lambda: ['propio']), ['propio'])
+
+
+CIRCUIT = {'WINDOW_SECONDS': 60, 'MIN_CALLS': 2, 'ERROR_RATE': 0.5, 'OPEN_SECONDS': 0.05, 'HALF_OPEN_CALLS': 1}
+
+
+@override_settings(PROVIDER_CIRCUIT=CIRCUIT)
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        circuit.reset()
+        self.addCleanup(circuit.reset)
+
+    def test_opens_on_error_rate_and_recovers_through_half_open(self):
+        breaker = circuit.breaker('anilist')
+        breaker.record(True)
+        breaker.record(False)
+        self.assertEqual(breaker.state, circuit.OPEN)
+        self.assertFalse(breaker.allow())
+
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, circuit.HALF_OPEN)
+        # Solo una petición de prueba a la vez
+        self.assertFalse(breaker.available())
+        breaker.record(False)
+        self.assertEqual(breaker.state, circuit.OPEN)
+
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        breaker.record(True)
+        self.assertEqual(breaker.state, circuit.CLOSED)
+        self.assertTrue(breaker.available())
+
+    def test_open_circuit_fails_fast_without_calling_the_provider(self):
+        fixtures_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, fixtures_dir)
+        caches['providers'].clear()
+        provider_fixtures.reset_injector()
+        with override_settings(PROVIDER_TRANSPORT=transport_settings('replay', fixtures_dir),
+                               PROVIDER_HTTP={**settings.PROVIDER_HTTP, 'RETRIES': 0}):
+            # Sin fixtures cada búsqueda falla como un error de conexión
+            for query in ('uno', 'dos'):
+                self.assertEqual(AniListAPI.search_anime(query), [])
+            self.assertEqual(circuit.breaker('anilist').state, circuit.OPEN)
+            with self.assertRaises(circuit.CircuitOpen):
+                AniListAPI._fetch_search('tres', 8)
+            with self.assertRaises(httpx.TransportError):
+                async_to_sync(AniListAPI._afetch_search)('tres', 8)
+            # Otro proveedor no se ve afectado
+            self.assertEqual(circuit.breaker('tvmaze').state, circuit.CLOSED)
+
+    def test_cancelled_requests_do_not_count(self):
+        fixtures_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, fixtures_dir)
+        save_bebop_fixtures(fixtures_dir)
+        provider_fixtures.reset_injector()
+        self.addCleanup(provider_fixtures.reset_injector)
+        breaker = circuit.breaker('anilist')
+
+        async def cancelled_searches(count):
+            # Como el plazo de search_anime con un proveedor sano pero lento
+            for _ in range(count):
+                with self.assertRaises(asyncio.TimeoutError):
+                    await asyncio.wait_for(AniListAPI._afetch_search('bebop', 8), 0.01)
+            await transport.get_async_client('anilist').aclose()
+
+        with override_settings(PROVIDER_TRANSPORT=transport_settings('replay', fixtures_dir, LATENCY_MS=1000),
+                               SERVER_MODE='asgi'):
+            async_to_sync(cancelled_searches)(3)
+            self.assertEqual(breaker.state, circuit.CLOSED)
+
+            breaker.record(False)
+            breaker.record(False)
+            time.sleep(0.06)
+            # La prueba en semiabierto cancelada no lo reabre y deja su plaza libre
+            async_to_sync(cancelled_searches)(1)
+            self.assertEqual(breaker.state, circuit.HALF_OPEN)
+            self.assertTrue(breaker.available())
+
+
+@override_settings(PROVIDER_CIRCUIT=CIRCUIT)
+class SearchDegradationTests(TestCase):
+    """Un proveedor caído o colgado no retrasa search_anime: se omite y se indica en skipped_sources."""
+
+    def setUp(self):
+        circuit.reset()
+        self.addCleanup(circuit.reset)
+        caches['providers'].clear()
+        self.client.force_login(User.objects.create_user('degraded', 'degraded@example.com', 'x'))
+
+    def search(self, query):
+        return self.client.get(reverse('search_anime'), {'q': query}).json()
+
+    def test_open_circuit_is_skipped(self):
+        for _ in range(2):
+            circuit.breaker('tvmaze').record(False)
+        cached_call('anilist', 'search', (normalize_query('frieren'), 8),
+                    lambda: [{'external_id': '1', 'title': 'Frieren', 'source': 'anilist'}])
+        data = self.search('frieren')
+        self.assertEqual([item['title'] for item in data['results']], ['Frieren'])
+        self.assertEqual(data['skipped_sources'], ['tvmaze'])
+
+    def test_slow_providers_are_cut_at_the_deadline(self):
+        fixtures_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, fixtures_dir)
+        save_bebop_fixtures(fixtures_dir)
+        provider_fixtures.reset_injector()
+        self.addCleanup(provider_fixtures.reset_injector)
+        with override_settings(PROVIDER_TRANSPORT=transport_settings('replay', fixtures_dir, LATENCY_MS=300),
+                               PROVIDER_SEARCH_DEADLINE=0.1):
+            for query in ('bebop', 'Bebop', 'bebop '):
+                started = time.monotonic()
+                data = self.search(query)
+                self.assertLess(time.monotonic() - started, 0.25)
+                self.assertEqual(data, {'results': [], 'skipped_sources': ['anilist', 'tvmaze']})
+            # Las peticiones siguen en sus hilos y terminan bien: un proveedor sano
+            # pero más lento que el plazo no abre el circuito
+            time.sleep(0.5)
+        for source in ('anilist', 'tvmaze'):
+            self.assertEqual(circuit.breaker(source).state, circuit.CLOSED)
@@ -0,0 +1,311 @@
+"""
+Transporte HTTP compartido para los proveedores externos.
+
+Cada proceso mantiene una ``requests.Session`` por proveedor (y un
+``httpx.AsyncClient`` por proveedor y bucle de eventos para las vistas
+async) con conexiones keep-alive y un pool acotado, de modo que las
+búsquedas reutilizan la conexión TCP+TLS en lugar de abrir una nueva.
+
+Un AsyncClient solo sirve si el bucle vive más que la petición: con
+``SERVER_MODE='asgi'`` el bucle del worker es el mismo para todas. Bajo
+WSGI cada vista async (y cada refresco en segundo plano de
+provider_cache) corre en un bucle nuevo de ``async_to_sync``; ahí
+``arequest`` hace la petición con la Session del proveedor en un hilo,
+que es lo que reutiliza las conexiones en ese modo.
+
+Las peticiones idempotentes se reintentan ante errores de conexión,
+timeouts y respuestas 429/5xx con backoff exponencial y jitter completo.
+Cada proveedor tiene además un cortacircuitos (entries/circuit.py): con el
+circuito abierto la petición falla al instante con un error de conexión.
+
+Con PROVIDER_TRANSPORT['MODE'] en ``record`` o ``replay`` las respuestas se
+graban o se reproducen desde fixtures (ver entries/provider_fixtures.py);
+los reintentos, las métricas y el perfilado funcionan igual en todos los modos.
+"""
+import asyncio
+import contextvars
+import functools
+import random
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from . import metrics, profiling, provider_fixtures
+from .circuit import AsyncCircuitOpenError, CircuitOpenError, breaker
+
+USER_AGENT = 'mylist-app (+https://mylist-app.onrender.com)'
+RETRY_STATUSES = {429, 502, 503, 504}
+# Nunca se espera más que esto por un Retry-After
+MAX_RETRY_AFTER = 5
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()
+# Hilos para arequest cuando el bucle no vive más que la petición. Es del
+# proceso, no del bucle: una llamada que se queda sin plazo sigue aquí hasta
+# su timeout sin retener el cierre del bucle de async_to_sync.
+_sync_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix='provider-sync')
+_short_lived_loop = contextvars.ContextVar('entries_transport_short_lived_loop', default=False)
+
+
+def _config():
+    return settings.PROVIDER_HTTP
+
+
+def get_session(provider: str) -> requests.Session:
+    """Sesión con pool keep-alive de ``provider`` para este proceso"""
+    session = _sessions.get(provider)
+    if session is not None:
+        return session
+    with _sessions_lock:
+        if provider not in _sessions:
+            pool_size = _config()['POOL_SIZE']
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers['User-Agent'] = USER_AGENT
+            _sessions[provider] = session
+        return _sessions[provider]
+
+
+def get_async_client(provider: str) -> httpx.AsyncClient:
+    """
+    Cliente async de ``provider`` para el bucle de eventos actual.
+
+    Un AsyncClient no puede compartirse entre bucles; bajo ASGI hay uno
+    por worker y el cliente se reutiliza en todas las peticiones.
+    """
+    loop = asyncio.get_running_loop()
+    clients = _async_clients.setdefault(loop, {})
+    if provider not in clients:
+        config = _config()
+        clients[provider] = httpx.AsyncClient(
+            timeout=httpx.Timeout(config['READ_TIMEOUT'], connect=config['CONNECT_TIMEOUT']),
+            limits=httpx.Limits(
+                max_connections=config['POOL_SIZE'],
+                max_keepalive_connections=config['POOL_SIZE'],
+            ),
+            headers={'User-Agent': USER_AGENT},
+        )
+    return clients[provider]
+
+
+@contextmanager
+def short_lived_loop():
+    """Marca el bucle actual como de una sola petición: ``arequest`` no le crea AsyncClient"""
+    token = _short_lived_loop.set(True)
+    try:
+        yield
+    finally:
+        _short_lived_loop.reset(token)
+
+
+def _reuses_async_clients() -> bool:
+    return settings.SERVER_MODE == 'asgi' and not _short_lived_loop.get()
+
+
+def _backoff(attempt, retry_after=None):
+    """Espera antes del reintento ``attempt`` (0, 1, ...): full jitter sobre BACKOFF * 2^attempt"""
+    if retry_after:
+        try:
+            return min(float(retry_after), MAX_RETRY_AFTER)
+        except ValueError:
+            pass
+    return random.uniform(0, _config()['BACKOFF'] * (2 ** attempt))
+
+
+def _send(provider, session, method, url, kwargs):
+    mode = provider_fixtures.mode()
+    if mode == 'replay':
+        return provider_fixtures.replay(provider, method, url, kwargs)
+    response = session.request(method, url, **kwargs)
+    if mode == 'record':
+        provider_fixtures.record(
+            provider, method, url, kwargs, response.status_code, response.headers.get('Content-Type'), response.content,
+        )
+    return response
+
+
+async def _asend(provider, client, method, url, kwargs):
+    mode = provider_fixtures.mode()
+    if mode == 'replay':
+        return await provider_fixtures.areplay(provider, method, url, kwargs)
+    response = await client.request(method, url, **kwargs)
+    if mode == 'record':
+        provider_fixtures.record(
+            provider, method, url, kwargs, response.status_code, response.headers.get('Content-Type'), response.content,
+        )
+    return response
+
+
+def _observe(provider, started, outcome):
+    elapsed = time.perf_counter() - started
+    profiling.record_provider_call(elapsed * 1000)
+    metrics.PROVIDER_LATENCY.labels(provider, outcome).observe(elapsed)
+
+
+def _error(provider, kind):
+    metrics.PROVIDER_ERRORS.labels(provider, kind).inc()
+
+
+def _provider_fault(status_code) -> bool:
+    """Si una respuesta de error habla de la salud del proveedor (y cuenta para el circuito)"""
+    return status_code >= 500 or status_code == 429
+
+
+def request(provider: str, method: str, url: str, idempotent: bool = False, **kwargs) -> requests.Response:
+    """
+    Petición HTTP síncrona a un proveedor.
+
+    Args:
+        provider: Nombre del proveedor (elige la sesión)
+        idempotent: Si se puede repetir sin efectos secundarios (se reintenta)
+
+    Returns:
+        Respuesta con estado 2xx
+
+    Raises:
+        requests.exceptions.RequestException si falla tras los reintentos
+    """
+    config = _config()
+    retries = config['RETRIES'] if idempotent else 0
+    kwargs.setdefault('timeout', (config['CONNECT_TIMEOUT'], config['READ_TIMEOUT']))
+    session = get_session(provider)
+    circuit = breaker(provider)
+    if not circuit.allow():
+        _error(provider, 'circuit_open')
+        raise CircuitOpenError(f'Circuito abierto para {provider}')
+
+    # Tiempo total visto por la petición, reintentos y esperas incluidos
+    started = time.perf_counter()
+    outcome = 'error'
+    healthy = False
+    try:
+        for attempt in range(retries + 1):
+            try:
+                response = _send(provider, session, method, url, kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == retries:
+                    raise
+                metrics.PROVIDER_RETRIES.labels(provider).inc()
+                time.sleep(_backoff(attempt))
+                continue
+
+            if response.status_code in RETRY_STATUSES and attempt < retries:
+                response.close()
+                metrics.PROVIDER_RETRIES.labels(provider).inc()
+                time.sleep(_backoff(attempt, response.headers.get('Retry-After')))
+                continue
+            response.raise_for_status()
+            outcome = 'ok'
+            return response
+    except requests.Timeout:
+        _error(provider, 'timeout')
+        raise
+    except requests.ConnectionError:
+        _error(provider, 'connection')
+        raise
+    except requests.HTTPError as e:
+        _error(provider, f'http_{e.response.status_code}')
+        healthy = not _provider_fault(e.response.status_code)
+        raise
+    finally:
+        _observe(provider, started, outcome)
+        circuit.record(healthy or outcome == 'ok')
+
+
+def _as_httpx(response: requests.Response, request: httpx.Request) -> httpx.Response:
+    return httpx.Response(
+        response.status_code, headers=dict(response.headers), content=response.content, request=request,
+    )
+
+
+def _request_as_httpx(provider, method, url, idempotent, kwargs) -> httpx.Response:
+    """``request`` con la respuesta y las excepciones de httpx, para quien espera las de ``arequest``"""
+    request_info = httpx.Request(method, url, params=kwargs.get('params'))
+    try:
+        return _as_httpx(request(provider, method, url, idempotent=idempotent, **kwargs), request_info)
+    except CircuitOpenError as e:
+        raise AsyncCircuitOpenError(str(e)) from e
+    except requests.Timeout as e:
+        raise httpx.TimeoutException(str(e), request=request_info) from e
+    except requests.HTTPError as e:
+        response = _as_httpx(e.response, request_info)
+        raise httpx.HTTPStatusError(str(e), request=request_info, response=response) from e
+    except requests.RequestException as e:
+        raise httpx.ConnectError(str(e), request=request_info) from e
+
+
+async def arequest(provider: str, method: str, url: str, idempotent: bool = False, **kwargs) -> httpx.Response:
+    """
+    Versión asíncrona de ``request``.
+
+    Con un bucle de una sola petición (WSGI, refrescos) la hace ``request``
+    en un hilo, con su pool keep-alive, en lugar de un AsyncClient nuevo.
+
+    Raises:
+        httpx.HTTPError si falla tras los reintentos
+    """
+    if not _reuses_async_clients():
+        call = functools.partial(
+            contextvars.copy_context().run, _request_as_httpx, provider, method, url, idempotent, kwargs,
+        )
+        return await asyncio.get_running_loop().run_in_executor(_sync_pool, call)
+
+    retries = _config()['RETRIES'] if idempotent else 0
+    client = get_async_client(provider)
+    circuit = breaker(provider)
+    if not circuit.allow():
+        _error(provider, 'circuit_open')
+        raise AsyncCircuitOpenError(f'Circuito abierto para {provider}')
+
+    # Tiempo total visto por la petición, reintentos y esperas incluidos
+    started = time.perf_counter()
+    outcome = 'error'
+    healthy = False
+    try:
+        for attempt in range(retries + 1):
+            try:
+                response = await _asend(provider, client, method, url, kwargs)
+            except httpx.TransportError:
+                if attempt == retries:
+                    raise
+                metrics.PROVIDER_RETRIES.labels(provider).inc()
+                await asyncio.sleep(_backoff(attempt))
+                continue
+
+            if response.status_code in RETRY_STATUSES and attempt < retries:
+                metrics.PROVIDER_RETRIES.labels(provider).inc()
+                await asyncio.sleep(_backoff(attempt, response.headers.get('Retry-After')))
+                continue
+            response.raise_for_status()
+            outcome = 'ok'
+            return response
+    except asyncio.CancelledError:
+        # Cortada por quien espera (el plazo de la búsqueda): no dice nada del proveedor
+        outcome = 'cancelled'
+        raise
+    except httpx.TimeoutException:
+        _error(provider, 'timeout')
+        raise
+    except httpx.TransportError:
+        _error(provider, 'connection')
+        raise
+    except httpx.HTTPStatusError as e:
+        _error(provider, f'http_{e.response.status_code}')
+        healthy = not _provider_fault(e.response.status_code)
+        raise
+    finally:
+        _observe(provider, started, outcome)
+        if outcome == 'cancelled':
+            circuit.discard()
+        else:
+            circuit.record(healthy or outcome == 'ok')
@@ -1,19 +1,29 @@
-from django.urls import path
+from django.urls import path, re_path
 from . import views
 
 
 urlpatterns = [
     path('', views.entry_list, name='entry_list'),
+    path('api/entries/', views.entry_list_page, name='entry_list_page'),
+    path('api/entries/bulk/', views.entry_bulk, name='entry_bulk'),
     path('<int:pk>/', views.entry_detail, name='entry_detail'),
     path('<int:pk>/detail-json/', views.entry_detail_json, name='entry_detail_json'),
     path('<int:pk>/update-json/', views.entry_update_json, name='entry_update_json'),
+    path('<int:pk>/progress/', views.entry_progress, name='entry_progress'),
     # path('create/', views.entry_create, name='entry_create'),  # ← COMENTAR O ELIMINAR
     path('<int:pk>/update/', views.entry_update, name='entry_update'),
     path('<int:pk>/delete/', views.entry_delete, name='entry_delete'),
     path('tags/', views.tag_list, name='tag_list'),
+    path('stats/', views.stats_dashboard, name='stats_dashboard'),
+    path('export/<str:fmt>/', views.entry_export, name='entry_export'),
     
     # Búsqueda de anime
     path('search/', views.search_anime_page, name='search_anime_page'),
     path('api/search-anime/', views.search_anime, name='search_anime'),
     path('api/import-anime/', views.import_anime, name='import_anime'),
+    path('api/import-anime/bulk/', views.import_anime_bulk, name='import_anime_bulk'),
+    path('api/import-list/', views.import_list, name='import_list'),
+    
+    # Portadas cacheadas
+    re_path(r'^covers/(?P<digest>[0-9a-f]{64})/(?P<variant>[a-z]+)\.webp$', views.cover_image, name='cover_image'),
 ]
\ No newline at end of file
@@ -1,16 +1,46 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
+from django.core.exceptions import ValidationError
+from django.urls import reverse
+from urllib.parse import urlencode
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q
-from django.views.decorators.http import require_GET
+from django.db import IntegrityError
+from django.db.models import Count
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET
 from .models import Entry, Tag
 from .forms import EntryForm, TagForm
-from django.http import JsonResponse
+from django.core.files.storage import default_storage
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from .api_services import AniListAPI, TVMazeAPI
+from . import catalog, circuit, covers, metrics
+from .bulk_actions import InvalidBulkAction, bulk_delete_entries, bulk_update_entries
+from .decorators import async_login_required
+from .exports import CONTENT_TYPES as EXPORT_CONTENT_TYPES, aiter_export, export_filename, iter_export
+from .fragments import cached_grid, library_version, render_cards
+from .importers import BULK_IMPORT_MAX_ITEMS, InvalidImportItem, bulk_import, entry_from_provider_item
+from . import list_imports
+from .pagination import InvalidCursor, KeysetPaginator
+from .progress import InvalidProgressDelta, increment_progress
+from .search import SEARCH_ORDERING, search_entries
+from .stats import consumption_stats, library_stats
+import asyncio
+import hashlib
 import json
+import time
 
-@login_required
-def entry_list(request):
+ENTRIES_PER_PAGE = 48
+# La ruta de una portada depende solo de su URL de origen: nunca cambia de contenido
+COVER_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def _filtered_entries(request):
+    """Entradas del usuario con los filtros de la querystring aplicados"""
     entries = Entry.objects.filter(user=request.user)
     
     category = request.GET.get('category')
@@ -22,18 +52,88 @@ def entry_list(request):
     if status:
         entries = entries.filter(status=status)
     if search:
-        entries = entries.filter(Q(title__icontains=search) | Q(notes__icontains=search))
+        entries = search_entries(entries, search)
+    return entries
+
+
+def _filters_querystring(request):
+    """Filtros activos como querystring, para enlazar páginas siguientes"""
+    params = {key: request.GET[key] for key in ('category', 'status', 'search') if request.GET.get(key)}
+    return urlencode(params)
+
+
+def _etag(*parts):
+    return '"%s"' % hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def _grid_params(request):
+    return {key: request.GET[key] for key in ('category', 'status', 'search', 'cursor') if key in request.GET}
+
+
+def _library_etag(request, *args, **kwargs):
+    """
+    Validador de la lista: versión de la biblioteca del usuario (sube con
+    cualquier cambio en sus entradas o etiquetas) más los filtros y el
+    cursor. No necesita ninguna consulta.
+    """
+    return _etag(request.user.pk, library_version(request.user), sorted(_grid_params(request).items()))
+
+
+def _entry_updated_at(request, pk):
+    """updated_at de la entrada del usuario (o None), consultado una vez por petición"""
+    cache = request.__dict__.setdefault('_entry_updated_at', {})
+    if pk not in cache:
+        cache[pk] = Entry.objects.filter(pk=pk, user=request.user).values_list('updated_at', flat=True).first()
+    return cache[pk]
+
+
+def _entry_etag(request, pk, updated_at=None):
+    updated_at = updated_at or _entry_updated_at(request, pk)
+    if updated_at is None:
+        return None
+    return _etag(request.user.pk, pk, updated_at.isoformat(), library_version(request.user))
+
+
+def _page_validator(func):
+    """Para páginas HTML: los mensajes flash se pintan con la página, así que con mensajes pendientes no hay 304"""
+    def validator(request, *args, **kwargs):
+        if messages.get_messages(request):
+            return None
+        return func(request, *args, **kwargs)
+    return validator
+
+
+def _entries_page(request):
+    # Con búsqueda se ordena por relevancia; si no, por última actualización
+    ordering = SEARCH_ORDERING if request.GET.get('search') else ('-updated_at', '-id')
+    paginator = KeysetPaginator(_filtered_entries(request), ordering=ordering, per_page=ENTRIES_PER_PAGE)
+    return paginator.page(request.GET.get('cursor'))
+
+
+def _entries_grid(request):
+    """Tarjetas de la página pedida desde la caché de fragmentos; la consulta solo corre en un fallo"""
+    def build():
+        page = _entries_page(request)
+        return {'html': render_cards(page.object_list), 'next_cursor': page.next_cursor, 'count': len(page)}
+    return cached_grid(request.user, _grid_params(request), build)
+
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_page_validator(_library_etag))
+def entry_list(request):
+    try:
+        grid = _entries_grid(request)
+    except (InvalidCursor, ValueError, ValidationError):
+        query = _filters_querystring(request)
+        return redirect(f"{reverse('entry_list')}?{query}" if query else 'entry_list')
     
-    stats = {
-        'total': Entry.objects.filter(user=request.user).count(),
-        'pendiente': Entry.objects.filter(user=request.user, status='pendiente').count(),
-        'en_curso': Entry.objects.filter(user=request.user, status='en_curso').count(),
-        'terminado': Entry.objects.filter(user=request.user, status='terminado').count(),
-        'abandonado': Entry.objects.filter(user=request.user, status='abandonado').count(),
-    }
+    stats = library_stats(request.user)
     
     context = {
-        'entries': entries,
+        'cards_html': grid['html'],
+        'next_cursor': grid['next_cursor'],
+        'filters_query': _filters_querystring(request),
         'stats': stats,
         'categories': Entry.CATEGORY_CHOICES,
         'statuses': Entry.STATUS_CHOICES,
@@ -42,8 +142,29 @@ def entry_list(request):
 
 
 @login_required
+@require_GET
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_library_etag)
+def entry_list_page(request):
+    """Página siguiente de tarjetas en JSON para el scroll infinito de la lista."""
+    try:
+        grid = _entries_grid(request)
+    except (InvalidCursor, ValueError, ValidationError):
+        return JsonResponse({'error': 'Cursor inválido'}, status=400)
+    
+    return JsonResponse({
+        'html': grid['html'],
+        'count': grid['count'],
+        'next_cursor': grid['next_cursor'],
+        'has_next': grid['next_cursor'] is not None,
+    })
+
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_page_validator(_entry_etag), last_modified_func=_page_validator(_entry_updated_at))
 def entry_detail(request, pk):
-    entry = get_object_or_404(Entry, pk=pk, user=request.user)
+    entry = get_object_or_404(Entry.objects.prefetch_related('tags'), pk=pk, user=request.user)
     return render(request, 'entries/entry_detail.html', {'entry': entry})
 
 
@@ -95,7 +216,8 @@ def entry_delete(request, pk):
 
 @login_required
 def tag_list(request):
-    tags = Tag.objects.filter(user=request.user)
+    # El número de entradas de cada etiqueta en la misma consulta
+    tags = Tag.objects.filter(user=request.user).annotate(entries_count=Count('entries'))
     
     if request.method == 'POST':
         form = TagForm(request.POST)
@@ -113,15 +235,64 @@ def tag_list(request):
 
 
 @login_required
-def search_anime(request):
+@require_GET
+def stats_dashboard(request):
+    """Panel de estadísticas de consumo, leído de LibrarySummary"""
+    return render(request, 'entries/stats.html', {'stats': consumption_stats(request.user)})
+
+
+@login_required
+@require_GET
+def entry_export(request, fmt):
+    """Descarga de toda la biblioteca en CSV o JSONL, generada en streaming"""
+    if fmt not in EXPORT_CONTENT_TYPES:
+        raise Http404
+    # Bajo ASGI un iterador síncrono se leería entero antes de enviarse
+    lines = aiter_export(request.user, fmt) if isinstance(request, ASGIRequest) else iter_export(request.user, fmt)
+    response = StreamingHttpResponse(lines, content_type=EXPORT_CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{export_filename(request.user, fmt)}"'
+    response['Cache-Control'] = 'private, no-store'
+    return response
+
+
+def _budgeted(source, afetch, deadline, skipped):
+    """
+    ``afetch`` sin esperar más que el presupuesto del proveedor ni pasar de ``deadline``.
+
+    Con el circuito abierto ni se llama. En ambos casos devuelve [] y
+    añade el proveedor a ``skipped``.
+    """
+    async def fetch():
+        if circuit.breaker(source).available():
+            budget = settings.PROVIDER_SEARCH_BUDGETS.get(source, settings.PROVIDER_SEARCH_DEADLINE)
+            try:
+                return await asyncio.wait_for(afetch(), max(0, min(budget, deadline - time.monotonic())))
+            except asyncio.TimeoutError:
+                reason = 'deadline'
+        else:
+            reason = 'circuit_open'
+        metrics.PROVIDER_SKIPPED.labels(source, reason).inc()
+        skipped.add(source)
+        return []
+    return fetch
+
+
+@async_login_required
+async def search_anime(request):
     """Búsqueda de anime desde AniList API"""
     query = request.GET.get('q', '')
     
     if not query or len(query) < 2:
-        return JsonResponse({'results': []})
-    # Buscar en AniList y TVMaze, combinar resultados
-    results_anilist = AniListAPI.search_anime(query, limit=8)
-    results_tvmaze = TVMazeAPI.search_shows(query, limit=8)
+        return JsonResponse({'results': [], 'skipped_sources': []})
+    # Buscar en AniList y TVMaze a la vez (antes en el catálogo local), combinar resultados;
+    # un proveedor caído o lento no retrasa la respuesta más allá del plazo
+    deadline = time.monotonic() + settings.PROVIDER_SEARCH_DEADLINE
+    skipped = set()
+    found = await catalog.asearch(query, 8, {
+        'anilist': _budgeted('anilist', lambda: AniListAPI.asearch_anime(query, limit=8), deadline, skipped),
+        'tvmaze': _budgeted('tvmaze', lambda: TVMazeAPI.asearch_shows(query, limit=8), deadline, skipped),
+    })
+    results_anilist, results_tvmaze = found['anilist'], found['tvmaze']
 
     # Simple deduplicación: key por (source, external_id)
     seen = set()
@@ -131,18 +302,23 @@ def search_anime(request):
         if key in seen:
             continue
         seen.add(key)
+        # Miniatura local si alguien ya importó esa portada; cover_image queda intacta para importar
+        item['cover_thumb'] = covers.cover_url(item.get('cover_image'), 'grid', fetch=False)
         combined.append(item)
 
-    return JsonResponse({'results': combined})
+    return JsonResponse({'results': combined, 'skipped_sources': [source for source in found if source in skipped]})
 
 
-@login_required
-def entry_update_json(request, pk):
+@async_login_required
+async def entry_update_json(request, pk):
     """Actualizar campos de Entry vía JSON (usado desde el modal)."""
     if request.method != 'POST':
         return JsonResponse({'error': 'Método no permitido'}, status=405)
 
-    entry = get_object_or_404(Entry, pk=pk, user=request.user)
+    try:
+        entry = await Entry.objects.aget(pk=pk, user=request.user)
+    except Entry.DoesNotExist:
+        return JsonResponse({'error': 'No encontrado'}, status=404)
     try:
         data = json.loads(request.body)
         # Campos permitidos para editar desde el modal (solo lo que la UI permite)
@@ -161,7 +337,7 @@ def entry_update_json(request, pk):
                 updated = True
 
         if updated:
-            entry.save()
+            await entry.asave()
             return JsonResponse({'success': True})
         else:
             return JsonResponse({'error': 'No hay cambios'}, status=400)
@@ -171,8 +347,80 @@ def entry_update_json(request, pk):
         return JsonResponse({'error': str(e)}, status=500)
 
 
-@login_required
-def import_anime(request):
+@async_login_required
+async def entry_progress(request, pk):
+    """
+    Suma episodios/capítulos al progreso (``{"delta": N}``, por defecto 1).
+
+    Devuelve los valores nuevos; el estado pasa solo a en curso o a
+    terminado al llegar al total.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método no permitido'}, status=405)
+
+    try:
+        data = json.loads(request.body or b'{}')
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'JSON inválido'}, status=400)
+    delta = data.get('delta', 1) if isinstance(data, dict) else None
+
+    try:
+        result = await sync_to_async(increment_progress)(request.user, pk, delta)
+    except Entry.DoesNotExist:
+        return JsonResponse({'error': 'No encontrado'}, status=404)
+    except InvalidProgressDelta as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'success': True, **result})
+
+
+@async_login_required
+async def entry_bulk(request):
+    """
+    Edita o elimina varias entradas a la vez.
+
+    Espera ``{"ids": [...], "action": "update", "patch": {"status": ...}}``
+    o ``{"ids": [...], "action": "delete"}``; los ids que no son del
+    usuario se ignoran y se devuelven en ``missing``.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método no permitido'}, status=405)
+
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'JSON inválido'}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({'error': 'Datos inválidos'}, status=400)
+
+    action = data.get('action')
+    try:
+        if action == 'update':
+            result = await sync_to_async(bulk_update_entries)(request.user, data.get('ids'), data.get('patch'))
+        elif action == 'delete':
+            result = await sync_to_async(bulk_delete_entries)(request.user, data.get('ids'))
+        else:
+            return JsonResponse({'error': 'Acción no soportada'}, status=400)
+    except InvalidBulkAction as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'success': True, **result})
+
+
+async def _existing_import(user, source, external_id):
+    if not external_id:
+        return None
+    return await Entry.objects.filter(user=user).imported(source, external_id).only('id').afirst()
+
+
+def _already_imported_response(existing):
+    return JsonResponse({
+        'error': 'Este anime ya está en tu lista',
+        'entry_id': existing.id,
+        'redirect_url': f'/entries/{existing.id}/'
+    }, status=400)
+
+
+@async_login_required
+async def import_anime(request):
     """Importa un anime de AniList a la lista del usuario"""
     if request.method != 'POST':
         return JsonResponse({'error': 'Método no permitido'}, status=405)
@@ -184,68 +432,26 @@ def import_anime(request):
         if not anime_data:
             return JsonResponse({'error': 'Datos inválidos'}, status=400)
         
-        # Validar que tenga al menos el título
-        title = anime_data.get('title', '').strip()
-        if not title:
-            return JsonResponse({'error': 'El anime debe tener un título'}, status=400)
-        
-        # Limpiar la descripción de HTML y caracteres especiales
-        import re
-        description = anime_data.get('description', '')
-        if description:
-            # Remover HTML
-            description = re.sub('<[^<]+?>', '', description)
-            # Remover saltos de línea múltiples
-            description = re.sub(r'\n\s*\n', '\n\n', description)
-            # Limitar longitud
-            description = description[:500]
-        
-        # Obtener el número de episodios o duración si existe
-        episodes = anime_data.get('episodes')
-        duration = anime_data.get('duration')
-        if episodes and episodes > 0:
-            progress_total = int(episodes)
-        else:
-            progress_total = None
-
-        # Determinar la fuente y verificar existencia
-        source = anime_data.get('source', 'anilist')
-        existing = Entry.objects.filter(
-            user=request.user,
-            external_id=str(anime_data.get('external_id', '')),
-            external_source=source
-        ).first()
+        try:
+            entry = entry_from_provider_item(request.user, anime_data)
+        except InvalidImportItem as e:
+            return JsonResponse({'error': str(e)}, status=400)
         
+        # Verificar existencia (sondeo del índice único)
+        existing = await _existing_import(request.user, entry.external_source, entry.external_id)
         if existing:
-            return JsonResponse({
-                'error': 'Este anime ya está en tu lista',
-                'entry_id': existing.id,
-                'redirect_url': f'/entries/{existing.id}/'
-            }, status=400)
+            return _already_imported_response(existing)
         
-        # Crear entrada (mapear categoría según la fuente)
-        category = 'anime'
-        platform = 'AniList'
-        if source == 'tvmaze':
-            category = 'serie'
-            platform = 'TVMaze'
-
-        entry = Entry.objects.create(
-            user=request.user,
-            title=title[:255],  # Limitar longitud del título
-            category=category,
-            status='pendiente',
-            external_id=str(anime_data.get('external_id', ''))[:100],
-            external_source=source,
-            external_link=anime_data.get('url', '')[:200],
-            cover_image=anime_data.get('cover_image', '')[:200],
-            notes=description,
-            progress_current=0,
-            progress_total=progress_total,
-            episodes_count=anime_data.get('episodes') or None,
-            duration_minutes=anime_data.get('duration') or None,
-            platform=platform
-        )
+        await catalog.alink_media(entry)
+        try:
+            await entry.asave()
+        except IntegrityError:
+            # Otra petición lo importó entre la comprobación y el insert
+            existing = await _existing_import(request.user, entry.external_source, entry.external_id)
+            if not existing:
+                raise
+            return _already_imported_response(existing)
+        covers.enqueue(entry.cover_image)
         
         messages.success(request, f'¡Anime "{entry.title}" añadido a tu lista!')
         return JsonResponse({
@@ -263,17 +469,129 @@ def import_anime(request):
         return JsonResponse({'error': f'Error inesperado: {str(e)}'}, status=500)
     
 
+@async_login_required
+async def import_anime_bulk(request):
+    """
+    Importa varios resultados de búsqueda en una sola petición.
+
+    Espera ``{"items": [<resultado de búsqueda>, ...]}`` y devuelve un
+    resultado por elemento (creado, ya existente o error).
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método no permitido'}, status=405)
+    
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'JSON inválido'}, status=400)
+    
+    items = data.get('items') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return JsonResponse({'error': 'Datos inválidos'}, status=400)
+    if len(items) > BULK_IMPORT_MAX_ITEMS:
+        return JsonResponse({'error': f'Máximo {BULK_IMPORT_MAX_ITEMS} títulos por petición'}, status=400)
+    
+    results = await sync_to_async(bulk_import)(request.user, items)
+    
+    created = sum(1 for result in results if result['status'] == 'created')
+    if created:
+        messages.success(request, f'¡{created} títulos añadidos a tu lista!')
+    return JsonResponse({
+        'success': True,
+        'created': created,
+        'results': results,
+    })
+
+
+@login_required
+def import_list(request):
+    """
+    Importa una lista exportada de MyAnimeList (XML) o AniList (JSON).
+
+    Recibe el fichero en ``file`` (y opcionalmente ``format``: mal o
+    anilist) y responde en NDJSON con una línea de progreso por lote
+    guardado y una final ``done`` (o ``error``) con los totales.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método no permitido'}, status=405)
+
+    upload = request.FILES.get('file')
+    if upload is None:
+        return JsonResponse({'error': 'Falta el fichero'}, status=400)
+    if upload.size > list_imports.MAX_FILE_BYTES:
+        return JsonResponse({'error': f'El fichero supera {list_imports.MAX_FILE_BYTES // (1024 * 1024)} MB'}, status=400)
+
+    fmt = request.POST.get('format') or None
+    if fmt is not None and fmt not in list_imports.FORMATS:
+        return JsonResponse({'error': 'Formato no soportado'}, status=400)
+    try:
+        fmt = fmt or list_imports.detect_format(upload, upload.name)
+    except (list_imports.InvalidListFile, OSError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    # Igual que la exportación: bajo ASGI un generador síncrono se acumularía entero
+    if isinstance(request, ASGIRequest):
+        async def lines():
+            async for event in list_imports.aimport_list(request.user, upload, fmt):
+                yield json.dumps(event, ensure_ascii=False) + '\n'
+    else:
+        def lines():
+            for event in list_imports.import_list(request.user, upload, fmt):
+                yield json.dumps(event, ensure_ascii=False) + '\n'
+
+    response = StreamingHttpResponse(lines(), content_type='application/x-ndjson; charset=utf-8')
+    response['Cache-Control'] = 'no-store'
+    # Que los proxies (nginx) no retengan el progreso hasta el final
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@require_GET
+def cover_image(request, digest, variant):
+    """Sirve una variante de portada cacheada con cabeceras de caché inmutables."""
+    if variant not in covers.COVER_VARIANTS:
+        raise Http404
+    etag = f'"{digest[:32]}-{variant}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        try:
+            cover = default_storage.open(covers.cover_path(digest, variant))
+        except FileNotFoundError:
+            raise Http404
+        response = FileResponse(cover, content_type='image/webp')
+    response['ETag'] = etag
+    response['Cache-Control'] = COVER_CACHE_CONTROL
+    return response
+
+
 @login_required
 def search_anime_page(request):
     """Página de búsqueda de anime"""
     return render(request, 'entries/search_anime.html')
 
-@login_required
+@async_login_required
 @require_GET
-def entry_detail_json(request, pk):
+@cache_control(private=True, no_cache=True)
+async def entry_detail_json(request, pk):
     """Devuelve datos JSON de una entrada para poblar el modal (solo propietario)."""
+    # Validadores con una consulta mínima; si el navegador tiene la versión actual, 304
+    updated_at = await Entry.objects.filter(pk=pk, user=request.user).values_list('updated_at', flat=True).afirst()
+    if updated_at is None:
+        return JsonResponse({'error': 'No encontrado'}, status=404)
+    etag = _entry_etag(request, pk, updated_at)
+    last_modified = int(updated_at.timestamp())
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = await _entry_detail_json_response(request, pk)
+    if response.status_code in (200, 304):
+        response.headers.setdefault('ETag', etag)
+        response.headers.setdefault('Last-Modified', http_date(last_modified))
+    return response
+
+
+async def _entry_detail_json_response(request, pk):
     try:
-        entry = get_object_or_404(Entry, pk=pk, user=request.user)
+        entry = await Entry.objects.aget(pk=pk, user=request.user)
         # calcular porcentaje
         pct = 0
         if entry.progress_total:
@@ -286,7 +604,7 @@ def entry_detail_json(request, pk):
             'id': entry.id,
             'title': entry.title,
             'description': entry.notes or '',
-            'image_url': entry.cover_image or '',
+            'image_url': covers.cover_url(entry.cover_image, 'detail'),
             'progress_percent': pct,
             'progress_current': entry.progress_current,
             'progress_total': entry.progress_total,
@@ -297,7 +615,7 @@ def entry_detail_json(request, pk):
             'external_link': entry.external_link or '',
         }
         return JsonResponse(data)
-    except Http404:
+    except Entry.DoesNotExist:
         return JsonResponse({'error': 'No encontrado'}, status=404)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
\ No newline at end of file
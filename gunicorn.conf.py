@@ -0,0 +1,36 @@
+"""
+Configuración de gunicorn.
+
+SERVER_MODE=asgi sirve config.asgi con workers de uvicorn: las vistas
+async (búsqueda e importación) esperan a AniList/TVMaze sin bloquear el
+worker, así que pocos procesos atienden cientos de búsquedas a la vez.
+Con SERVER_MODE=wsgi (por defecto) se usan los workers síncronos de siempre.
+
+El puerto sale de $PORT y el número de workers de $WEB_CONCURRENCY.
+"""
+import os
+
+server_mode = os.environ.get('SERVER_MODE', 'wsgi')
+
+if server_mode == 'asgi':
+    wsgi_app = 'config.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+else:
+    wsgi_app = 'config.wsgi:application'
+
+# Métricas de Prometheus compartidas entre workers (entries/metrics.py): cada
+# proceso escribe en este directorio y /metrics agrega todos. Se fija aquí,
+# antes de que los workers importen la app y prometheus_client.
+metrics_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/mylist-metrics')
+
+
+def on_starting(server):
+    # Los ficheros de una ejecución anterior sumarían valores ya vistos
+    import shutil
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
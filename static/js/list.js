@@ -47,32 +47,72 @@ document.addEventListener('DOMContentLoaded', function(){
     modal.setAttribute('aria-hidden','false');
     document.body.style.overflow = 'hidden';
   }
+  // Si se sumó progreso desde el modal, la tarjeta de la rejilla ya no está al día
+  let progressChanged = false;
   function closeModal(){
     modal.classList.add('hidden');
     modal.setAttribute('aria-hidden','true');
     modalContent.innerHTML = '';
     document.body.style.overflow = '';
+    if(progressChanged){
+      progressChanged = false;
+      location.reload();
+    }
   }
   if(modalClose) modalClose.addEventListener('click', closeModal);
   if(modalBackdrop) modalBackdrop.addEventListener('click', closeModal);
   document.addEventListener('keydown', (e)=> { if(e.key === 'Escape') closeModal(); });
 
-  // Click en tarjetas
-  document.querySelectorAll('.entry-card').forEach(card=>{
-    card.addEventListener('click', async ()=> {
-      const id = card.dataset.id;
-      if(!id) return;
+  // Click en tarjetas (delegado: también sirve para las tarjetas añadidas con el scroll infinito)
+  document.addEventListener('click', async (e)=> {
+    const card = e.target.closest('.entry-card');
+    if(!card) return;
+    const id = card.dataset.id;
+    if(!id) return;
+    try {
+      const resp = await fetch(`/entries/${id}/detail-json/`, { headers: { 'X-Requested-With': 'XMLHttpRequest' } });
+      if(!resp.ok) throw new Error('error');
+      const data = await resp.json();
+      const html = buildDetailHtml(data);
+      openModal(html);
+    } catch(e){
+      openModal('<p>No se pudo cargar el detalle.</p>');
+    }
+  });
+
+  // Scroll infinito: pedir la siguiente página al acercarse al final de la lista
+  const entryGrid = document.getElementById('entryGrid');
+  const loadMore = document.getElementById('loadMore');
+  if(entryGrid && loadMore && 'IntersectionObserver' in window){
+    let loading = false;
+    const observer = new IntersectionObserver(async (items)=> {
+      if(loading || !items.some(item => item.isIntersecting)) return;
+      const cursor = loadMore.dataset.nextCursor;
+      if(!cursor) return;
+      loading = true;
       try {
-        const resp = await fetch(`/entries/${id}/detail-json/`, { headers: { 'X-Requested-With': 'XMLHttpRequest' } });
+        const sep = loadMore.dataset.url.includes('?') ? '&' : '?';
+        const resp = await fetch(`${loadMore.dataset.url}${sep}cursor=${encodeURIComponent(cursor)}`, { headers: { 'X-Requested-With': 'XMLHttpRequest' } });
         if(!resp.ok) throw new Error('error');
         const data = await resp.json();
-        const html = buildDetailHtml(data);
-        openModal(html);
-      } catch(e){
-        openModal('<p>No se pudo cargar el detalle.</p>');
+        entryGrid.insertAdjacentHTML('beforeend', data.html);
+        if(data.has_next){
+          loadMore.dataset.nextCursor = data.next_cursor;
+          // Volver a observar para que dispare otra vez si el sentinel sigue visible
+          observer.unobserve(loadMore);
+          observer.observe(loadMore);
+        } else {
+          observer.disconnect();
+          loadMore.remove();
+        }
+      } catch(err){
+        console.error(err);
+      } finally {
+        loading = false;
       }
-    });
-  });
+    }, { rootMargin: '600px 0px' });
+    observer.observe(loadMore);
+  }
 
   function buildDetailHtml(data){
     // Formulario editable dentro del modal
@@ -87,7 +127,10 @@ document.addEventListener('DOMContentLoaded', function(){
             <div style="display:flex;gap:8px;">
               <div style="flex:1;">
                 <label class="block font-semibold">Progreso actual</label>
-                <input type="number" step="1" name="progress_current" value="${escapeHtml(data.progress_current)}" class="w-full px-3 py-2 border rounded">
+                <div style="display:flex;gap:6px;">
+                  <input type="number" step="1" name="progress_current" value="${escapeHtml(data.progress_current)}" class="w-full px-3 py-2 border rounded">
+                  <button id="progressPlusBtn" type="button" class="bg-indigo-600 text-white px-3 py-2 rounded" title="Sumar un episodio">+1</button>
+                </div>
               </div>
               <div style="width:160px;">
                 <label class="block font-semibold">Estado</label>
@@ -128,6 +171,36 @@ document.addEventListener('DOMContentLoaded', function(){
     return cookieValue;
   }
 
+  // +1 episodio: el servidor suma sobre el valor guardado y devuelve progreso y estado nuevos
+  document.addEventListener('click', async function(e){
+    if(!e.target || e.target.id !== 'progressPlusBtn') return;
+    const form = document.getElementById('entryEditForm');
+    if(!form) return;
+    e.target.disabled = true;
+    try{
+      const resp = await fetch(`/entries/${form.dataset.id}/progress/`, {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+          'X-CSRFToken': getCookie('csrftoken')
+        },
+        body: JSON.stringify({delta: 1})
+      });
+      const data = await resp.json();
+      if(resp.ok && data.success){
+        form.querySelector('input[name="progress_current"]').value = data.progress_current;
+        form.querySelector('select[name="status"]').value = data.status;
+        progressChanged = true;
+      } else {
+        alert('Error al guardar: ' + (data.error || 'Error desconocido'));
+      }
+    } catch(err){
+      console.error(err);
+    } finally {
+      e.target.disabled = false;
+    }
+  });
+
   // Delegación: después de abrir modal, atachamos el handler al botón Guardar
   document.addEventListener('click', async function(e){
     if(e.target && e.target.id === 'saveEntryBtn'){
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-18 07:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='library_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
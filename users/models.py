@@ -3,6 +3,8 @@ from django.db import models
 
 class User(AbstractUser):
     email = models.EmailField(unique=True)
+    # Sube con cualquier cambio en las entradas o etiquetas del usuario (entries/fragments.py)
+    library_version = models.PositiveIntegerField(default=0, editable=False)
     
     class Meta:
         db_table = 'users'
\ No newline at end of file
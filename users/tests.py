@@ -1,3 +1,56 @@
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from entries.testing import QueryBudgetMixin
+
+from . import urls as users_urls
+from .models import User
+
+# Consultas máximas y milisegundos de BD por vista de users/urls.py
+VIEW_BUDGETS = {
+    'register': (0, 10),
+    'register:post': (12, 40),
+    'login': (0, 10),
+    'login:post': (9, 30),
+    'logout': (4, 20),
+}
+
+
+class UserViewQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Presupuesto de consultas de registro, login y logout."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('budget', 'budget@example.com', 'clave-segura-123')
+
+    def request(self, budget, method, url, data=None):
+        max_queries, max_db_ms = VIEW_BUDGETS[budget]
+        with self.assertQueryBudget(max_queries, max_db_ms, label=f'{budget} {method.upper()} {url}'):
+            return getattr(self.client, method)(url, data)
+
+    def test_every_route_has_a_budget(self):
+        budgeted = {name.split(':')[0] for name in VIEW_BUDGETS}
+        routes = {pattern.name for pattern in users_urls.urlpatterns}
+        self.assertEqual(routes - budgeted, set(), 'Rutas sin presupuesto de consultas')
+
+    def test_register(self):
+        self.request('register', 'get', reverse('register'))
+        response = self.request('register:post', 'post', reverse('register'), {
+            'username': 'nuevo',
+            'email': 'nuevo@example.com',
+            'password1': 'clave-segura-123',
+            'password2': 'clave-segura-123',
+        })
+        self.assertRedirects(response, reverse('entry_list'), fetch_redirect_response=False)
+
+    def test_login(self):
+        self.request('login', 'get', reverse('login'))
+        response = self.request('login:post', 'post', reverse('login'), {
+            'username': 'budget', 'password': 'clave-segura-123',
+        })
+        self.assertRedirects(response, reverse('entry_list'), fetch_redirect_response=False)
+
+    def test_logout(self):
+        self.client.force_login(self.user)
+        response = self.request('logout', 'get', reverse('logout'))
+        self.assertRedirects(response, reverse('login'))
@@ -1,5 +1,5 @@
 from django.shortcuts import render, redirect
-from django.contrib.auth import login, authenticate, logout
+from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.views.generic import CreateView
@@ -17,9 +17,8 @@ class RegisterView(CreateView):
     def form_valid(self, form):
         response = super().form_valid(form)
         username = form.cleaned_data.get('username')
-        password = form.cleaned_data.get('password1')
-        user = authenticate(username=username, password=password)
-        login(self.request, user)
+        # El usuario recién creado: no hace falta volver a comprobar (y hashear) la contraseña
+        login(self.request, self.object)
         messages.success(self.request, f'¡Bienvenido {username}!')
         return response
 
@@ -32,8 +31,8 @@ def login_view(request):
         form = UserLoginForm(request, data=request.POST)
         if form.is_valid():
             username = form.cleaned_data.get('username')
-            password = form.cleaned_data.get('password')
-            user = authenticate(username=username, password=password)
+            # AuthenticationForm ya autenticó al validar
+            user = form.get_user()
             if user is not None:
                 login(request, user)
                 messages.success(request, f'¡Bienvenido {username}!')